@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import random
+import sys
+from typing import Dict, List, Tuple
+
+import pytest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The scripts import each other as top-level modules; synth_cb_pdf lives with the benchmarks
+sys.path.insert(0, SCRIPTS)
+sys.path.insert(1, os.path.join(SCRIPTS, "bench"))
+
+WORDS = ("the of and to in is that for it as was with be by on not he this are or his from at which but have "
+         "researchers species census function value equation line slope graph text data study reported suggests").split()
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def cb_pages(count: int, seed: int = 0, test: str = "Math") -> List[Tuple[int, str]]:
+    """(page, text) for a synthetic College Board bank, one question per page, as the text backends normalize it."""
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        qid = f"{rng.getrandbits(32):08x}"
+        answer = rng.choice("ABCD")
+        choices = " ".join(f"{letter}. {sentence(rng, rng.randint(4, 10))}" for letter in "ABCD")
+        pages.append((i + 1, f"Question ID {qid} ID: {qid} {sentence(rng, rng.randint(15, 40))} Which choice best answers the question? "
+                             f"{choices} ID: {qid} Answer Correct Answer: {answer} Rationale Choice {answer} is correct. "
+                             f"{sentence(rng, rng.randint(10, 30))} Question Difficulty: {rng.choice(['Easy', 'Medium', 'Hard'])} "
+                             f"Assessment SAT Test {test} Domain Algebra Skill Linear functions Difficulty"))
+    return pages
+
+
+def resplit(pages: List[Tuple[int, str]], seed: int) -> List[Tuple[int, str]]:
+    """The same text cut into more pages at random offsets (inside tokens too), with blank pages mixed in."""
+    rng = random.Random(seed)
+    out: List[Tuple[int, str]] = []
+    for _, text in pages:
+        while text and rng.random() < 0.6:
+            k = rng.randrange(len(text) + 1)
+            out.append((len(out) + 1, text[:k]))
+            text = text[k:]
+            if rng.random() < 0.2:
+                out.append((len(out) + 1, ""))
+        out.append((len(out) + 1, text))
+    return out
+
+
+class NullExporter:
+    """Stands in for ImageExporter: no images, no files."""
+
+    def __init__(self):
+        self.thumbnails: Dict[str, List[str]] = {}
+        self.manifest: Dict[str, List[str]] = {}
+
+    def export(self, qid, pdf_path, page_range):
+        return []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cb():
+    import pdf_extract_cb
+    return pdf_extract_cb
+
+
+@pytest.fixture
+def parse_sat():
+    # parse-sat-questions.py is hyphenated; registered under a name so pool workers can unpickle its functions
+    module = sys.modules.get("parse_sat_questions")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("parse_sat_questions", os.path.join(SCRIPTS, "parse-sat-questions.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["parse_sat_questions"] = module
+        spec.loader.exec_module(module)
+    return module
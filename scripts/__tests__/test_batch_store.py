@@ -0,0 +1,39 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("fitz")
+
+import question_store as qs
+import synth_cb_pdf
+
+# run_batch options as main() builds them for --batch
+OPTS = {"format": "json", "chunk_pages": 16, "cache_dir": None, "cache_max_bytes": 0, "image_format": "png", "max_width": 0,
+        "thumb_width": 0, "debug": False, "parser": "lexer", "backend": "pymupdf", "near_dupes": False, "near_dupe_threshold": 0.8}
+
+
+def test_documents_sharing_qids_are_stored_apart(cb, tmp_path):
+    pdfs = tmp_path / "pdfs"
+    # Same seed and test, so both banks carry the same QIDs
+    qids = synth_cb_pdf.generate(str(pdfs / "bank-a.pdf"), 4)
+    assert synth_cb_pdf.generate(str(pdfs / "bank-b.pdf"), 4) == qids
+    outdir = tmp_path / "out"
+    opts = dict(OPTS, store=f"sqlite:{tmp_path / 'store.db'}")
+    summary = cb.run_batch(cb.load_batch(str(pdfs)), str(outdir), str(tmp_path / "img"), 1, opts)
+    assert summary["store"] == {"path": str(tmp_path / "store.db"), "questions": 8}
+    assert json.loads((outdir / "summary.json").read_text())["store"]["questions"] == 8
+    with qs.SQLiteQuestionStore(str(tmp_path / "store.db")) as store:
+        assert [q["id"] for q in store.query()] == [f"{name}/{qid}" for name in ("bank-a", "bank-b") for qid in qids]
+
+
+def test_store_failure_keeps_the_summary(cb, tmp_path):
+    pdfs = tmp_path / "pdfs"
+    synth_cb_pdf.generate(str(pdfs / "bank.pdf"), 2)
+    outdir = tmp_path / "out"
+    opts = dict(OPTS, store="postgres:nowhere")
+    summary = cb.run_batch(cb.load_batch(str(pdfs)), str(outdir), str(tmp_path / "img"), 1, opts)
+    assert summary["store"]["error"].startswith("ValueError: Unsupported store")
+    written = json.loads((outdir / "summary.json").read_text())
+    assert written["total_questions"] == 2 and "error" in written["store"]
+    assert os.path.exists(summary["documents"][0]["output"])
@@ -0,0 +1,75 @@
+from dataclasses import asdict
+
+import pytest
+
+from conftest import NullExporter, cb_pages, resplit
+
+
+class RecordingState:
+    """Enough of IncrementalState to capture each block's page fingerprint."""
+
+    def __init__(self):
+        self.fingerprints = {}
+
+    def reuse(self, qid, fp):
+        return None
+
+    def record(self, qid, fp):
+        self.fingerprints[qid] = fp
+
+
+def joined(pages):
+    return "".join(f"\n[[PAGE:{p}]]\n{t}\n" for p, t in pages)
+
+
+def parse(cb, text, use_lexer, limit=None):
+    state = RecordingState()
+    questions = [asdict(q) for q in cb.parse_document("Math", text, "bank.pdf", NullExporter(), limit=limit, state=state, use_lexer=use_lexer)]
+    return questions, state.fingerprints
+
+
+def test_lexer_matches_regex(cb):
+    text = joined(cb_pages(40))
+    questions, fingerprints = parse(cb, text, use_lexer=True)
+    assert len(questions) == 40
+    assert all(q["choices"] for q in questions)
+    assert (questions, fingerprints) == parse(cb, text, use_lexer=False)
+    assert parse(cb, text, True, limit=7) == parse(cb, text, False, limit=7)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_lexer_matches_regex_across_page_breaks(cb, seed):
+    # Page markers land inside headers, "Correct Answer" rows and between ID and its colon
+    text = joined(resplit(cb_pages(25, seed), seed))
+    assert parse(cb, text, use_lexer=True) == parse(cb, text, use_lexer=False)
+
+
+def test_answer_header_split_by_page_marker(cb):
+    text = ("\n[[PAGE:1]]\nQuestion ID 0123abcd ID: 0123abcd What is the value of x? A. The line slope. B. The graph value. C. The census data. D. The study text. ID\n"
+            "\n[[PAGE:2]]\n: 0123abcd Answer Correct\n\n[[PAGE:3]]\nAnswer: C Rationale Choice C is correct.\n")
+    (q,), _ = parse(cb, text, use_lexer=True)
+    assert (q["answer"], q["rationale"], q["pages"]) == ("C", "Rationale Choice C is correct.", [2, 3])
+    assert [c["label"] for c in q["choices"]] == ["A", "B", "C", "D"]
+    assert parse(cb, text, use_lexer=False)[0] == [q]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_streamed_pages_match_whole_text(cb, seed):
+    pages = resplit(cb_pages(25, seed), seed)
+    assert parse(cb, iter(pages), use_lexer=True) == parse(cb, cb.join_pages(pages), use_lexer=False)
+
+
+def test_blocks_come_out_as_pages_arrive(cb):
+    pulled = []
+
+    def pages():
+        for page in cb_pages(200):
+            pulled.append(page[0])
+            yield page
+
+    views = cb.iter_block_views(pages())
+    first = next(views)
+    # A block is emitted once the two markers after it are lexed, long before the last page
+    assert first.page_index.page_span(first.s, first.e) == [1, 2]
+    assert len(pulled) <= 4
+    assert sum(1 for _ in views) == 199
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("PIL")
+
+
+@pytest.fixture
+def bank(tmp_path):
+    """A one-page PDF holding a 64px-wide image."""
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 32), 0)
+    pix.set_rect(pix.irect, (200, 30, 30))
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(0, 0, 64, 32), pixmap=pix)
+    path = str(tmp_path / "bank.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_variants_named_by_encoded_width(cb, bank, tmp_path):
+    with cb.ImageExporter(str(tmp_path / "img"), "png", max_width=1200, thumb_width=32) as exporter:
+        (image,) = exporter.export("q1", bank, [1])
+        (thumb,) = exporter.thumbnails["q1"]
+    # Narrower than max_width, so kept at full size under the bare hash; the thumbnail was scaled to 32px
+    assert "-" not in os.path.basename(image)
+    assert thumb.endswith("-32w.png")
+    for web in (image, thumb):
+        assert os.path.exists(os.path.join(str(tmp_path / "img"), "shared", os.path.basename(web)))
+    assert (exporter.written, exporter.failed) == (2, 0)
+
+
+def test_failed_encode_is_dropped(cb, bank, tmp_path, monkeypatch):
+    def broken(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cb, "encode_image", broken)
+    with cb.ImageExporter(str(tmp_path / "img"), "png", max_width=16) as exporter:
+        assert exporter.export("q1", bank, [1]) == []
+        assert exporter.export("q2", bank, [1]) == []
+    assert exporter.manifest == {"q1": [], "q2": []}
+    assert (exporter.written, exporter.failed) == (0, 1)
@@ -0,0 +1,90 @@
+import json
+import os
+
+from conftest import cb_pages
+
+OPTIONS = {"format": "webp", "max_width": 1200, "thumb_width": 0}
+
+
+def recording_exporter(cb, imgdir):
+    """An ImageExporter whose export writes one placeholder image per question and records the qid."""
+
+    class RecordingExporter(cb.ImageExporter):
+        def export(self, qid, pdf_path, page_range):
+            self.exported.append(qid)
+            os.makedirs(self.shared_dir, exist_ok=True)
+            open(os.path.join(self.shared_dir, f"{qid}.webp"), "wb").close()
+            self.manifest[qid] = [f"/qmedia/shared/{qid}.webp"]
+            self.thumbnails[qid] = []
+            return self.manifest[qid]
+
+    exporter = RecordingExporter(str(imgdir))
+    exporter.exported = []
+    return exporter
+
+
+def extract(cb, tmp_path, pages, options=OPTIONS, near_dupes=False):
+    """One --incremental run over pages: (state, exporter), with its output and state written to tmp_path."""
+    out_path = tmp_path / "out.json"
+    state = cb.IncrementalState(str(tmp_path / "out.json.state.json"), str(out_path), options)
+    exporter = recording_exporter(cb, tmp_path / "img")
+    rows = []
+    for q in cb.parse_document("Math", iter(pages), "bank.pdf", exporter, state=state):
+        item = cb.question_to_dict(q)
+        if near_dupes:
+            item["canonical_id"] = q.id
+        state.observe(item)
+        rows.append(item)
+    out_path.write_text(json.dumps(rows))
+    state.save()
+    return state, exporter, rows
+
+
+def test_unchanged_pages_are_carried_over(cb, tmp_path):
+    pages = cb_pages(10)
+    _, _, first = extract(cb, tmp_path, pages)
+    edited = list(pages)
+    edited[3] = (4, edited[3][1].replace("Which choice best answers", "Which choice most accurately answers"))
+    state, exporter, rows = extract(cb, tmp_path, edited)
+    # A block runs up to the next header, so question 3 spans page 4 too: re-parsed, but unchanged
+    assert state.reused == 8
+    assert state.diff() == {"added": [], "changed": [first[3]["id"]], "removed": []}
+    # Only the re-parsed questions export images; carried-over ones keep theirs, and the manifest still covers every question
+    assert exporter.exported == [first[2]["id"], first[3]["id"]]
+    assert [r["images"] for r in rows] == [[f"/qmedia/shared/{r['id']}.webp"] for r in rows]
+    assert exporter.manifest == {r["id"]: r["images"] for r in rows}
+
+
+def test_missing_image_is_exported_again(cb, tmp_path):
+    pages = cb_pages(4)
+    _, _, first = extract(cb, tmp_path, pages)
+    os.remove(tmp_path / "img" / "shared" / f"{first[1]['id']}.webp")
+    state, exporter, rows = extract(cb, tmp_path, pages)
+    assert state.reused == 4
+    assert exporter.exported == [first[1]["id"]]
+    assert rows == first
+
+
+def test_derived_fields_are_not_changes(cb, tmp_path):
+    pages = cb_pages(5)
+    extract(cb, tmp_path, pages, near_dupes=True)
+    state, _, _ = extract(cb, tmp_path, pages)
+    assert state.diff() == {"added": [], "changed": [], "removed": []}
+
+
+def test_image_options_invalidate_state(cb, tmp_path):
+    pages = cb_pages(5)
+    extract(cb, tmp_path, pages)
+    state, _, _ = extract(cb, tmp_path, pages, options=dict(OPTIONS, max_width=800))
+    assert state.reused == 0
+    state, _, _ = extract(cb, tmp_path, pages, options=dict(OPTIONS, max_width=800))
+    assert state.reused == 5
+
+
+def test_added_and_removed(cb, tmp_path):
+    pages = cb_pages(6)
+    _, _, first = extract(cb, tmp_path, pages)
+    state, _, _ = extract(cb, tmp_path, pages[1:])
+    assert state.diff() == {"added": [], "changed": [], "removed": [first[0]["id"]]}
+    state, _, _ = extract(cb, tmp_path, pages)
+    assert state.diff() == {"added": [first[0]["id"]], "changed": [], "removed": []}
@@ -0,0 +1,31 @@
+import json
+import sys
+
+import pytest
+
+pytest.importorskip("fitz")
+
+import synth_cb_pdf
+
+
+def test_crash_keeps_partial_ndjson(cb, tmp_path, monkeypatch):
+    pdf = str(tmp_path / "bank.pdf")
+    qids = synth_cb_pdf.generate(pdf, 6)
+    out = tmp_path / "out.ndjson"
+    serialize = cb.question_to_dict
+    calls = []
+
+    def interrupted(q):
+        calls.append(q.id)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return serialize(q)
+
+    monkeypatch.setattr(cb, "question_to_dict", interrupted)
+    monkeypatch.setattr(sys, "argv", ["pdf_extract_cb.py", "--math", pdf, "--rw", pdf, "--out", str(out), "--imgdir", str(tmp_path / "img"),
+                                      "--format", "ndjson", "--no-cache", "--backend", "pymupdf", "--image-format", "png", "--max-width", "0"])
+    with pytest.raises(KeyboardInterrupt):
+        cb.main()
+    assert not out.exists()
+    [partial] = tmp_path.glob("out.ndjson.*.tmp")
+    assert [json.loads(line)["id"] for line in partial.read_text().splitlines()] == qids[:3]
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """A directory of question files in every supported text format, two of them unparseable."""
+    (tmp_path / "a.csv").write_text("question,options,answer,difficulty\n"
+                                    + "".join(f'"What is {i} + {i}?","[""{i}"", ""{2 * i}""]",B,hard\n' for i in range(5)))
+    (tmp_path / "b.json").write_text(json.dumps([{"question": f"Solve for x: x = {i}", "choices": ["1", "2"], "answer": "A"} for i in range(4)]))
+    (tmp_path / "c.json").write_text(json.dumps({f"op-{i}": {"content": {"question": f"Q{i}", "options": []}, "module": "reading"} for i in range(3)}))
+    (tmp_path / "d.csv").write_text("title\nno question column\n")
+    (tmp_path / "e.json").write_text('[{"question": "cut off')
+    return tmp_path
+
+
+def test_jobs_match_serial(parse_sat, inputs, capsys):
+    sat_parser = parse_sat.SATQuestionParser()
+    serial = parse_sat.collect_questions(sat_parser, inputs, jobs=1)
+    assert len(serial) == 12
+    assert parse_sat.collect_questions(sat_parser, inputs, jobs=2) == serial
+    files = parse_sat.input_files(inputs)
+    assert (list(parse_sat.stream_questions(sat_parser, files, "prepify", jobs=2))
+            == [sat_parser.to_prepify(q) for q in serial])
+
+
+def test_file_errors_are_reported(parse_sat, inputs, capsys):
+    assert parse_sat._parse_file_job(str(inputs / "d.csv")) == {"questions": [], "error": "Error parsing CSV: No question column found in CSV"}
+    assert parse_sat._parse_file_job(str(inputs / "e.json"))["error"].startswith("Error parsing JSON: ")
+    assert parse_sat._parse_file_job(str(inputs / "missing.json"))["error"] == f"File not found: {inputs / 'missing.json'}"
+    with pytest.raises(parse_sat.ParseError):
+        parse_sat.SATQuestionParser().parse_file(str(inputs / "e.json"), raise_errors=True)
+    list(parse_sat.iter_parsed_files(parse_sat.SATQuestionParser(), parse_sat.input_files(inputs), jobs=2))
+    assert "2 failed" in capsys.readouterr().out
+
+
+def test_dedupe_requires_prepify(parse_sat, inputs, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["parse-sat-questions.py", str(inputs), "--format", "raw", "--dedupe"])
+    with pytest.raises(SystemExit) as exc:
+        parse_sat.main()
+    assert exc.value.code == 2
+    assert "--dedupe records canonical_id on Prepify rows" in capsys.readouterr().err
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import pg_copy
+
+from conftest import SCRIPTS
+
+
+def row(qid, question):
+    return {"question_id": qid, "external_id": None, "skill_cd": "", "skill_desc": "", "primary_class_cd": "",
+            "primary_class_cd_desc": "", "difficulty": "M", "module": "math",
+            "content": {"keys": [], "rationale": "", "question": question, "options": ["1", "2\t3"], "correct_answer": "A", "explanation": ""},
+            "program": "SAT", "score_band_range_cd": 5, "active": True, "canonical_id": qid}
+
+
+@pytest.mark.parametrize("fmt", pg_copy.COPY_FORMATS)
+def test_round_trip(tmp_path, fmt):
+    rows = [row("json-0", 'Line one\nline "two" \\ with a NUL\x00'), row("json-1", "")]
+    with pg_copy.CopyWriter(str(tmp_path), fmt) as writer:
+        assert writer.write_many(rows) == 2
+    assert list(pg_copy.read_copy(writer.paths["questions"])) == [pg_copy.table_row(r) for r in rows]
+    assert "DISTINCT" not in open(os.path.join(str(tmp_path), "load.sql")).read()
+
+
+def test_duplicate_keys_write_nothing(tmp_path):
+    with pytest.raises(ValueError, match="Duplicate question_id 'json-0'"):
+        with pg_copy.CopyWriter(str(tmp_path)) as writer:
+            writer.write_many([row("json-0", "a"), row("json-1", "b"), row("json-0", "c")])
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_directory_copy_keeps_every_file(tmp_path, stream):
+    # Each file numbers its rows from 0; the ids parse-sat generates must still be unique across files
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for name in ("a.csv", "b.csv", "c.json"):
+        if name.endswith(".csv"):
+            (inputs / name).write_text("question,options\n" + "".join(f"{name} question {i},1|2\n" for i in range(3)))
+        else:
+            (inputs / name).write_text(json.dumps([{"question": f"{name} question {i}", "options": ["1", "2"]} for i in range(3)]))
+    outdir = tmp_path / "copy"
+    proc = subprocess.run([sys.executable, os.path.join(SCRIPTS, "parse-sat-questions.py"), str(inputs), "-o", str(tmp_path / "out.json"),
+                           "--copy", str(outdir), *(["--stream"] if stream else [])], capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    ids = [r["question_id"] for r in pg_copy.read_copy(str(outdir / "questions.copy"))]
+    assert ids == [f"{prefix}-{i}" for prefix in ("csv-a", "csv-b", "json-c") for i in range(3)]
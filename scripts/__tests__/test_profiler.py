@@ -0,0 +1,17 @@
+import pytest
+
+
+def test_rss_growth_is_charged_to_the_stage_that_raised_the_peak(cb):
+    if cb.resource is None:
+        pytest.skip("peak RSS is not available on this platform")
+    profiler = cb.Profiler()
+    with profiler.stage("load"):
+        held = bytearray(64 * 1024 * 1024)
+        held[::4096] = b"x" * len(held[::4096])
+    del held
+    with profiler.stage("parse"):
+        pass
+    assert profiler.stages["load"]["rss_growth_kb"] >= 48 * 1024
+    # The process peak is unchanged, so the later stage shows no growth rather than repeating it
+    assert profiler.stages["parse"]["rss_growth_kb"] < 8 * 1024
+    assert profiler.to_dict()["peak_rss_kb"] >= profiler.stages["load"]["rss_growth_kb"]
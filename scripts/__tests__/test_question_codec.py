@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+import question_codec as qc
+from question_batch import ColumnarBatch
+
+ROWS = [
+    {"id": "0123abcd", "test": "Math", "domain": "Algebra", "stem": "Solve équation \U0001F600\n\"quoted\"", "answer": None,
+     "choices": [{"label": "A", "text": "1"}, {"label": "B", "text": ""}], "pages": [1, 2], "score": -(1 << 63), "weight": 0.1,
+     "active": True, "draft": False, "images": []},
+    {"id": "4567ef01", "test": "Math", "domain": "Geometry", "stem": "", "answer": "B", "choices": None, "pages": [],
+     "score": (1 << 63) - 1, "weight": -2.5e300, "active": False, "draft": True, "images": ["/qmedia/shared/x.webp"], "extra": {"nested": [[]]}},
+]
+
+
+@pytest.mark.parametrize("fmt", qc.FORMATS)
+def test_round_trip(tmp_path, fmt):
+    path = str(tmp_path / f"out.{fmt}")
+    with qc.open_output(path, fmt) as f:
+        assert qc.write_questions(f, iter(ROWS), fmt, shared=("test", "domain")) == 2
+    assert list(qc.read_questions(path)) == ROWS
+
+
+def test_json_layouts_match_json_dump():
+    pretty, compact = io.StringIO(), io.StringIO()
+    qc.write_questions(pretty, ROWS, "json")
+    qc.write_questions(compact, ROWS, "json-compact")
+    assert pretty.getvalue() == json.dumps(ROWS, ensure_ascii=False, indent=2)
+    assert compact.getvalue() == json.dumps(ROWS, ensure_ascii=False, separators=(",", ":"))
+    for fmt in ("json", "json-compact"):
+        empty = io.StringIO()
+        qc.write_questions(empty, [], fmt)
+        assert json.loads(empty.getvalue()) == []
+
+
+def test_qbin_shares_strings_and_checks_its_end(tmp_path):
+    batch = ColumnarBatch([("id", "value"), ("test", "category")])
+    for i in range(50):
+        batch.append({"id": f"q{i}", "test": "Reading and Writing"})
+    path = str(tmp_path / "out.qbin")
+    with qc.open_output(path, "qbin") as f:
+        qc.write_questions(f, batch, "qbin", shared=("test",))
+    data = open(path, "rb").read()
+    assert data.count(b"Reading and Writing") == 1
+    assert [r["test"] for r in qc.read_questions(path)] == ["Reading and Writing"] * 50
+    open(path, "wb").write(data[:-4])
+    with pytest.raises(ValueError, match="Truncated"):
+        list(qc.read_questions(path))
+
+
+def test_qbin_rejects_unencodable_values():
+    writer = qc.QbinWriter(io.BytesIO())
+    with pytest.raises(ValueError):
+        writer.write({"n": 1 << 63})
+    with pytest.raises(TypeError):
+        writer.write({"when": object()})
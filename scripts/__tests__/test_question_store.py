@@ -0,0 +1,85 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import question_store as qs
+
+from conftest import SCRIPTS
+
+
+def question(qid, choices, images=()):
+    return {"id": qid, "test": "Math", "stem": f"Stem {qid}", "choices": [{"label": label, "text": text} for label, text in zip("ABCD", choices)],
+            "images": list(images), "answer": "A"}
+
+
+def children(path, qid):
+    conn = sqlite3.connect(path)
+    try:
+        return (conn.execute("SELECT position, text FROM choices WHERE question_id = ? ORDER BY position", (qid,)).fetchall(),
+                conn.execute("SELECT path FROM images WHERE question_id = ? ORDER BY position", (qid,)).fetchall())
+    finally:
+        conn.close()
+
+
+def test_reupsert_replaces_children(tmp_path):
+    path = str(tmp_path / "store.db")
+    with qs.SQLiteQuestionStore(path) as store:
+        store.upsert_many([question("a", ["1", "2", "3", "4"], ["/x.webp", "/y.webp"]), question("b", ["5", "6"])])
+    with qs.SQLiteQuestionStore(path) as store:
+        store.upsert(question("a", ["7", "8"]))
+        assert [q["id"] for q in store.query()] == ["a", "b"]
+    assert children(path, "a") == ([(0, "7"), (1, "8")], [])
+    assert children(path, "b") == ([(0, "5"), (1, "6")], [])
+
+
+def test_duplicate_ids_roll_back_the_run(tmp_path):
+    path = str(tmp_path / "store.db")
+    with qs.SQLiteQuestionStore(path) as store:
+        store.upsert(question("a", ["1", "2"]))
+    with pytest.raises(ValueError, match="Duplicate question id 'b'"):
+        with qs.SQLiteQuestionStore(path, batch_size=1) as store:
+            store.upsert_many([question("a", ["9"]), question("b", ["3"]), question("b", ["4"])])
+    with qs.SQLiteQuestionStore(path) as store:
+        assert [q["choices"] for q in store.query()] == [question("a", ["1", "2"])["choices"]]
+
+
+def parse_sat(*args):
+    return subprocess.run([sys.executable, os.path.join(SCRIPTS, "parse-sat-questions.py"), *map(str, args)], capture_output=True, text=True)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_directory_ids_are_namespaced_by_file(tmp_path, stream):
+    # Array items, CSV rows and PDF blocks are numbered per file; the source file keeps them apart
+    inputs = tmp_path / "in"
+    (inputs / "sub").mkdir(parents=True)
+    for name in ("a.json", "b.json", "sub/a.json"):
+        (inputs / name).write_text(json.dumps([{"question": f"{name} question {i}", "options": ["1", "2"]} for i in range(3)]))
+    for name in ("c.csv", "d.csv"):
+        (inputs / name).write_text("question,options\n" + "".join(f"{name} question {i},1|2\n" for i in range(2)))
+    store = tmp_path / "store.db"
+    proc = parse_sat(inputs, "-o", tmp_path / "out.json", "--store", f"sqlite:{store}", *(["--stream"] if stream else []))
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    with qs.SQLiteQuestionStore(str(store)) as s:
+        assert s.count() == 13
+        ids = {q["question_id"] for q in s.query()}
+    assert {"json-a-0", "json-b-2", "json-sub/a-1", "csv-c-0", "csv-d-1"} <= ids
+
+
+def test_aborted_stream_leaves_store_unchanged(tmp_path):
+    # OnePrep keys are global question ids, so two exports repeating one are a genuine duplicate
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for name in ("a.json", "b.json"):
+        (inputs / name).write_text(json.dumps({key: {"content": {"question": f"{name} {key}", "options": ["1", "2"]}} for key in ("q1", "q2")}))
+    store = tmp_path / "store.db"
+    out = tmp_path / "out.json"
+    proc = parse_sat(inputs, "-o", out, "--stream", "--store", f"sqlite:{store}")
+    assert proc.returncode == 1
+    assert "Duplicate question id 'q1'" in proc.stdout
+    assert not out.exists()
+    with qs.SQLiteQuestionStore(str(store)) as s:
+        assert s.count() == 0
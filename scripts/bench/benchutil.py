@@ -0,0 +1,57 @@
+"""Shared helpers for the scripts/bench benchmarks."""
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import pdf_extract_cb as cb  # noqa: E402,F401
+
+
+class NullExporter:
+    """Stands in for ImageExporter so only text parsing is timed."""
+
+    thumbnails: Dict[str, List[str]] = {}
+
+    def export(self, qid, pdf_path, page_range):
+        return []
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return out.stdout.decode().strip()
+    except Exception:
+        return ""
+
+
+class Stopwatch:
+    """Accumulates wall time per named stage."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+
+
+def load_parse_sat():
+    """Import scripts/parse-sat-questions.py (hyphenated, so not importable by name)."""
+    import importlib.util
+
+    module = sys.modules.get("parse_sat_questions")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("parse_sat_questions", os.path.join(ROOT, "scripts", "parse-sat-questions.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["parse_sat_questions"] = module
+        spec.loader.exec_module(module)
+    return module
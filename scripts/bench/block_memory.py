@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Peak memory of parse_document as the number of questions grows.
+
+For each size a synthetic Math bank (synth_cb_pdf) is extracted once to a
+plain text file. Each parser path then runs in a fresh process that loads
+the text and parses every block, discarding the questions. Two numbers are
+reported per path:
+
+  rss_growth_kb    peak RSS after parsing minus peak RSS once the text is loaded
+                   (0 when parsing never exceeds the peak reached while loading)
+  traced_peak_kb   tracemalloc peak during a second parse (Python allocations only)
+
+"views" is the default streaming block-view path; "regex" is the original
+whole-document path (--parser regex).
+
+Usage:
+  python3 scripts/bench/block_memory.py --sizes 50,500,5000 [--out memory.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from benchutil import NullExporter, cb, git_commit
+from synth_cb_pdf import cached_pdf
+
+
+def child(text_path: str, path: str) -> None:
+    with open(text_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    use_lexer = path == "views"
+    rss_loaded = cb.peak_rss_kb()
+    count = sum(1 for _ in cb.parse_document("Math", text, text_path, NullExporter(), use_lexer=use_lexer))
+    rss_parsed = cb.peak_rss_kb()
+    tracemalloc.start()
+    for _ in cb.parse_document("Math", text, text_path, NullExporter(), use_lexer=use_lexer):
+        pass
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({"questions": count, "text_chars": len(text), "rss_loaded_kb": rss_loaded,
+                      "rss_growth_kb": rss_parsed - rss_loaded, "traced_peak_kb": traced_peak // 1024}))
+
+
+def text_file(workdir: str, questions: int) -> str:
+    pdf = cached_pdf(workdir, questions, "Math")
+    path = pdf[:-4] + ".txt"
+    if not os.path.exists(path):
+        text = cb.build_texts([("Math", pdf)])["Math"]["text"]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="parse_document peak memory by question count")
+    ap.add_argument("--sizes", default="50,500,5000")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdf_extract_cb_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=2, metavar=("TEXT", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    print(f"{'questions':>9}{'text MB':>9}{'path':>7}{'RSS growth MB':>15}{'traced peak MB':>16}{'bytes/question':>16}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        text_path = text_file(args.workdir, size)
+        for path in ("views", "regex"):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", text_path, path],
+                                 check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            r = json.loads(out.stdout.decode().strip().splitlines()[-1])
+            r["path"] = path
+            results.append(r)
+            print(f"{r['questions']:>9}{r['text_chars'] / 1e6:>9.2f}{path:>7}{r['rss_growth_kb'] / 1024:>15.2f}"
+                  f"{r['traced_peak_kb'] / 1024:>16.2f}{1024 * r['traced_peak_kb'] // max(r['questions'], 1):>16}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""CSV ingestion throughput for parse-sat-questions.py parse_csv.
+
+Writes (or reuses) a synthetic partner export at each size with every
+recognised column, a mix of JSON and comma-separated options, blank cells
+and assorted difficulty/module spellings. Each path runs in a fresh process
+that parses the file and reports rows/s and peak RSS:
+
+  iterrows   the previous implementation (read_csv + df.iterrows), kept here
+  chunked    SATQuestionParser.parse_csv (column-wise, chunked)
+  stream     SATQuestionParser.iter_csv_chunks, each chunk discarded after
+             use (what a streaming consumer sees)
+
+iterrows and chunked must produce the same questions; the first size is checked
+in-process before timing.
+
+Usage:
+  python3 scripts/bench/csv_ingest.py --sizes 10000,100000,1000000 [--out csv.json]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutil import git_commit, load_parse_sat
+
+PATHS = ("iterrows", "chunked", "stream")
+
+
+def legacy_parse_csv(csv_path: str):
+    # parse_csv as it was before column-wise chunked ingestion
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    question_col = next((c for c in ['question', 'content', 'text', 'problem'] if c in df.columns), None)
+    options_col = next((c for c in ['options', 'choices', 'answers'] if c in df.columns), None)
+    answer_col = next((c for c in ['correct_answer', 'answer', 'solution'] if c in df.columns), None)
+    difficulty_col = next((c for c in ['difficulty', 'level'] if c in df.columns), None)
+    module_col = next((c for c in ['module', 'subject', 'category'] if c in df.columns), None)
+    questions = []
+    for index, row in df.iterrows():
+        options = []
+        if options_col and pd.notna(row[options_col]) and isinstance(row[options_col], str):
+            try:
+                options = json.loads(row[options_col])
+            except Exception:
+                options = [opt.strip() for opt in row[options_col].split(',') if opt.strip()]
+        correct_answer = str(row[answer_col]) if answer_col and pd.notna(row[answer_col]) else ""
+        difficulty = 'M'
+        if difficulty_col and pd.notna(row[difficulty_col]):
+            diff = str(row[difficulty_col]).upper()
+            if diff in ['E', 'EASY', '1']:
+                difficulty = 'E'
+            elif diff in ['H', 'HARD', '3']:
+                difficulty = 'H'
+        module = 'math'
+        if module_col and pd.notna(row[module_col]):
+            mod = str(row[module_col]).lower()
+            if 'reading' in mod:
+                module = 'reading'
+            elif 'writing' in mod:
+                module = 'writing'
+        questions.append({'id': f'csv-{index}', 'question': str(row[question_col]), 'options': options,
+                          'correct_answer': correct_answer, 'explanation': '', 'difficulty': difficulty,
+                          'module': module, 'source': 'csv'})
+    return questions
+
+
+def synth_csv(workdir: str, rows: int, seed: int = 0) -> str:
+    path = os.path.join(workdir, f"synth-s{seed}-{rows}.csv")
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    words = "the slope of line value graph equation text passage author claim data study percent circle".split()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["question", "options", "correct_answer", "difficulty", "module", "notes"])
+        for i in range(rows):
+            choices = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 5))) for _ in range(4)]
+            kind = i % 4
+            options = json.dumps(choices) if kind < 2 else (", ".join(choices) if kind == 2 else "")
+            w.writerow([
+                " ".join(rng.choice(words) for _ in range(rng.randint(10, 40))) + "?",
+                options,
+                rng.choice("ABCD") if i % 7 else "",
+                rng.choice(["Easy", "E", "medium", "Hard", "h", "1", "3", ""]),
+                rng.choice(["Math", "Reading and Writing", "writing", "reading", "SAT Math", ""]),
+                " ".join(rng.choice(words) for _ in range(5)),
+            ])
+    os.replace(tmp, path)
+    return path
+
+
+def parse(path: str, csv_path: str):
+    if path == "iterrows":
+        return legacy_parse_csv(csv_path)
+    parser = load_parse_sat().SATQuestionParser()
+    if path == "stream":
+        return sum(len(chunk) for chunk in parser.iter_csv_chunks(csv_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parser.parse_csv(csv_path)
+
+
+def child(csv_path: str, path: str) -> None:
+    load_parse_sat()
+    import pandas  # noqa: F401  (import cost is not ingestion cost)
+
+    started = time.perf_counter()
+    parsed = parse(path, csv_path)
+    count = parsed if isinstance(parsed, int) else len(parsed)
+    seconds = time.perf_counter() - started
+    from pdf_extract_cb import peak_rss_kb
+    print(json.dumps({"rows": count, "seconds": seconds, "peak_rss_kb": peak_rss_kb()}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="parse_csv rows/s: iterrows vs chunked column-wise")
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=2, metavar=("CSV", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    first = synth_csv(args.workdir, sizes[0])
+    if parse("iterrows", first) != parse("chunked", first):
+        print(f"OUTPUT DIFFERS on {first}", file=sys.stderr)
+        sys.exit(1)
+
+    results = []
+    print(f"{'rows':>9}{'path':>10}{'seconds':>10}{'rows/s':>11}{'peak RSS MB':>13}")
+    for size in sizes:
+        csv_path = synth_csv(args.workdir, size)
+        for path in PATHS:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", csv_path, path],
+                                 check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            r = json.loads(out.stdout.decode().strip().splitlines()[-1])
+            r.update(path=path, csv_bytes=os.path.getsize(csv_path))
+            results.append(r)
+            print(f"{r['rows']:>9}{path:>10}{r['seconds']:>10.2f}{r['rows'] / r['seconds']:>11.0f}{r['peak_rss_kb'] / 1024:>13.1f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Per-stage timing for pdf_extract_cb on synthetic question banks.
+
+Generates (or reuses) synthetic PDFs with synth_cb_pdf at each size, then
+times the pipeline stages separately:
+
+  extract    page text via build_texts (no text cache)
+  split      iter_block_views + marker-stripped block text
+  labels     extract_labels on every block
+  choices    parse_choices_block, falling back to parse_choices_inline
+  parse      parse_document end to end, without images
+  images     ImageExporter.export for every block, including encoding
+  serialize  question_to_dict + JSON array as the CLI writes it
+
+Results go to a JSON file that --compare can diff against a previous run.
+
+Usage:
+  python3 scripts/bench/extract_stages.py --sizes 50,500,5000 --out bench.json [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchutil import NullExporter, Stopwatch, cb, git_commit
+from synth_cb_pdf import GENERATOR_VERSION, cached_pdf
+
+STAGES = ["extract", "split", "labels", "choices", "parse", "images", "serialize"]
+
+
+def choice_text(page_index, qid: str, s: int, e: int) -> str:
+    # Stem/choice region as parse_block builds it (untimed preparation)
+    clean = page_index.strip_markers(s, e)
+    until = re.split(re.compile(rf"ID\s*:\s*{re.escape(qid)}\s*Answer", re.I), clean, maxsplit=1)[0]
+    return "\n".join(l for l in until.splitlines() if l.strip() and not re.match(r"^(Figure|Table)\b", l, re.I))
+
+
+def run_size(questions: int, test: str, workdir: str, backend: str, image_format: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    pdf = cached_pdf(workdir, questions, test)
+    generate_s = time.perf_counter() - started
+    sw = Stopwatch()
+
+    with sw.stage("extract"):
+        docs = cb.build_texts([(test, pdf)], backend=backend)
+    text = docs[test]["text"]
+
+    with sw.stage("split"):
+        blocks = list(cb.iter_block_views(text))
+        clean = [v.page_index.strip_markers(v.s, v.e) for v in blocks]
+
+    with sw.stage("labels"):
+        for block in clean:
+            cb.extract_labels(block)
+
+    pres = [(v.qid, choice_text(v.page_index, v.qid, v.s, v.e)) for v in blocks]
+    mcq = 0
+    with sw.stage("choices"):
+        for qid, pre in pres:
+            choices = cb.parse_choices_block(pre) or cb.parse_choices_inline(qid, pre, False)
+            mcq += choices is not None and len(choices) == 4
+
+    with sw.stage("parse"):
+        parsed = list(cb.parse_document(test, text, pdf, NullExporter()))
+
+    imgdir = tempfile.mkdtemp(prefix="bench-img-")
+    try:
+        with sw.stage("images"):
+            with cb.ImageExporter(imgdir, fmt=image_format) as exporter:
+                for v in blocks:
+                    exporter.export(v.qid, pdf, v.page_index.page_span(v.s, v.e))
+        images = {"written": exporter.written, "reused": exporter.reused, "failed": exporter.failed}
+    finally:
+        shutil.rmtree(imgdir, ignore_errors=True)
+
+    with sw.stage("serialize"):
+        payload = json.dumps([cb.question_to_dict(q) for q in parsed], ensure_ascii=False, indent=2)
+
+    return {
+        "questions": questions,
+        "test": test,
+        "pages": len(docs[test]["timings"]),
+        "pdf_bytes": os.path.getsize(pdf),
+        "text_chars": len(text),
+        "generate_seconds": round(generate_s, 4),
+        "stages": {name: round(sw.seconds[name], 4) for name in STAGES},
+        "counts": {"blocks": len(blocks), "parsed": len(parsed), "mcq": mcq, "json_bytes": len(payload.encode("utf-8")), "images": images},
+    }
+
+
+def print_table(results: List[Dict[str, Any]], previous: Dict[int, Dict[str, Any]]) -> None:
+    print(f"{'questions':>9} " + "".join(f"{name:>11}" for name in STAGES))
+    for r in results:
+        row = f"{r['questions']:>9} " + "".join(f"{r['stages'][name]:>10.3f}s" for name in STAGES)
+        print(row)
+        old = previous.get(r["questions"])
+        if old:
+            ratios = [r["stages"][n] / old["stages"][n] if old["stages"].get(n) else float("nan") for n in STAGES]
+            print(f"{'vs prev':>9} " + "".join(f"{x:>10.2f}x" for x in ratios))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-stage pdf_extract_cb benchmark on synthetic PDFs")
+    ap.add_argument("--sizes", default="50,500,5000", help="Comma-separated question counts")
+    ap.add_argument("--test", choices=["Math", "Reading and Writing"], default="Math")
+    ap.add_argument("--backend", choices=["auto"] + list(cb.TEXT_BACKENDS), default="auto")
+    ap.add_argument("--image-format", choices=["webp", "png"], default="webp")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdf_extract_cb_bench"), help="Where generated PDFs are kept between runs")
+    ap.add_argument("--out", default="pdf_extract_cb_bench.json", help="JSON results path")
+    ap.add_argument("--compare", help="Previous results JSON to print per-stage ratios against")
+    args = ap.parse_args()
+
+    previous: Dict[int, Dict[str, Any]] = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = {r["questions"]: r for r in json.load(f)["results"]}
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        r = run_size(size, args.test, args.workdir, args.backend, args.image_format)
+        if r["counts"]["parsed"] != size:
+            print(f"[warn] parsed {r['counts']['parsed']} of {size} questions", file=sys.stderr)
+        results.append(r)
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "backend": args.backend,
+        "text_backends": cb.text_backends(args.backend),
+        "image_format": args.image_format,
+        "generator_version": GENERATOR_VERSION,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_table(results, previous)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
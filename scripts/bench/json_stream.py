@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Memory and time of converting large OnePrep JSON dumps.
+
+Writes (or reuses) a synthetic OnePrep dump ({question_id: question_data})
+at each size, then converts it to Prepify format in a fresh process per
+path:
+
+  load     parse_json + convert_to_prepify_format + save_to_json (whole dump in memory)
+  stream   iter_json -> to_prepify -> save_stream_to_json (--stream)
+
+RSS growth is peak RSS after the conversion minus peak RSS before it, so
+interpreter and import overhead is excluded. Both paths must write
+byte-identical output.
+
+Usage:
+  python3 scripts/bench/json_stream.py --sizes 10000,100000 [--out json.json]
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutil import cb, git_commit, load_parse_sat
+
+PATHS = ("load", "stream")
+
+
+def synth_dump(workdir: str, questions: int, seed: int = 0) -> str:
+    path = os.path.join(workdir, f"oneprep-s{seed}-{questions}.json")
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    words = "the slope of line value graph equation text passage author claim data study percent circle".split()
+
+    def text(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("{")
+        for i in range(questions):
+            question = {
+                "difficulty": rng.choice("EMH"),
+                "module": rng.choice(["math", "reading", "writing"]),
+                "content": {
+                    "question": text(rng.randint(20, 120)),
+                    "options": [text(rng.randint(1, 8)) for _ in range(4)],
+                    "correct_answer": rng.choice("ABCD"),
+                    "explanation": text(rng.randint(30, 150)),
+                    "keys": [f"k{rng.randint(0, 999)}"],
+                },
+            }
+            f.write(("," if i else "") + json.dumps(f"oneprep-{i:07d}") + ":" + json.dumps(question))
+        f.write("}")
+    os.replace(tmp, path)
+    return path
+
+
+def child(dump: str, path: str, out: str) -> None:
+    parser = load_parse_sat().SATQuestionParser()
+    rss_before = cb.peak_rss_kb()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if path == "load":
+            questions = parser.convert_to_prepify_format(parser.parse_json(dump))
+            parser.save_to_json(questions, out)
+            count = len(questions)
+        else:
+            count = parser.save_stream_to_json((parser.to_prepify(q) for q in parser.iter_json(dump)), out)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"questions": count, "seconds": seconds, "rss_growth_kb": cb.peak_rss_kb() - rss_before}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="OnePrep JSON conversion: whole-dump load vs streaming")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=3, metavar=("DUMP", "PATH", "OUT"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    ok = True
+    print(f"{'questions':>9}{'dump MB':>9}{'path':>8}{'seconds':>9}{'RSS growth MB':>15}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        dump = synth_dump(args.workdir, size)
+        outputs = {}
+        for path in PATHS:
+            outputs[path] = os.path.join(args.workdir, f"out-{path}-{size}.json")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", dump, path, outputs[path]],
+                                  check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            r = json.loads(proc.stdout.decode().strip().splitlines()[-1])
+            r.update(path=path, dump_bytes=os.path.getsize(dump))
+            results.append(r)
+            print(f"{r['questions']:>9}{r['dump_bytes'] / 1e6:>9.1f}{path:>8}{r['seconds']:>9.2f}{r['rss_growth_kb'] / 1024:>15.1f}")
+        same = filecmp.cmp(outputs["load"], outputs["stream"], shallow=False)
+        ok = ok and same
+        if not same:
+            print(f"OUTPUT DIFFERS at {size}", file=sys.stderr)
+        for out in outputs.values():
+            os.remove(out)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Near-duplicate clustering (question_dedupe.NearDuplicateIndex) at scale.
+
+Generates a deterministic synthetic question set where a share of the
+questions are edited copies of earlier ones: PDF-style split words
+("r epresented"), a few substituted words, smart quotes and re-wrapped
+whitespace. The planted source of each copy is the ground truth.
+
+Reported per size:
+  seconds, questions/s   indexing time (signatures + LSH + verification)
+  comparisons            candidate signatures verified
+  recall                 planted copies clustered with their source
+  false merges           independent questions put in another cluster
+
+The pairwise baseline computes exact shingle-set Jaccard for every pair of
+a --pairwise-sample subset and extrapolates its n^2 cost to the full size.
+
+Usage:
+  python3 scripts/bench/near_dupes.py --sizes 10000,100000 [--out dupes.json]
+"""
+import argparse
+import json
+import random
+import string
+import time
+from typing import List, Optional, Tuple
+
+import benchutil  # puts scripts/ on sys.path for question_dedupe
+
+import question_dedupe as qd
+
+
+def vocabulary(rng: random.Random, size: int = 5000) -> List[str]:
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10))) for _ in range(size)]
+
+
+def perturb(rng: random.Random, text: str, words: List[str]) -> str:
+    tokens = text.split(" ")
+    for _ in range(rng.randint(0, 2)):
+        tokens[rng.randrange(len(tokens))] = rng.choice(words)
+    for _ in range(rng.randint(0, 4)):
+        i = rng.randrange(len(tokens))
+        t = tokens[i]
+        if len(t) > 3:
+            cut = rng.randint(1, len(t) - 1)
+            tokens[i] = t[:cut] + " " + t[cut:]
+    out = " ".join(tokens).replace("'", "’")
+    return out.replace(". ", ".\n") if rng.random() < 0.5 else out
+
+
+def synth_questions(n: int, dup_share: float, seed: int = 0) -> Tuple[List[Tuple[str, str]], List[Optional[int]]]:
+    """(qid, text) pairs and, per question, the index of the question it copies (None if original)."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    items: List[Tuple[str, str]] = []
+    source: List[Optional[int]] = []
+    originals: List[int] = []
+    for i in range(n):
+        if originals and rng.random() < dup_share:
+            j = rng.choice(originals)
+            items.append((f"q{i:07d}", perturb(rng, items[j][1], words)))
+            source.append(j)
+            continue
+        stem = " ".join(rng.choice(words) for _ in range(rng.randint(30, 90))) + "'s value?"
+        choices = [" ".join(rng.choice(words) for _ in range(rng.randint(2, 12))) for _ in range(4)]
+        items.append((f"q{i:07d}", qd.question_text(stem, choices)))
+        source.append(None)
+        originals.append(i)
+    return items, source
+
+
+def shingle_set(text: str) -> set:
+    normalized = qd.NORMALIZE_RE.sub("", text.lower())
+    k = qd.SHINGLE_BYTES
+    return {normalized[i:i + k] for i in range(max(len(normalized) - k + 1, 1))}
+
+
+def pairwise_seconds(items: List[Tuple[str, str]], sample: int, threshold: float) -> float:
+    sets = [shingle_set(text) for _, text in items[:sample]]
+    started = time.perf_counter()
+    for i in range(len(sets)):
+        a = sets[i]
+        for j in range(i):
+            b = sets[j]
+            inter = len(a & b)
+            if inter and inter / (len(a) + len(b) - inter) >= threshold:
+                pass
+    return time.perf_counter() - started
+
+
+def main():
+    ap = argparse.ArgumentParser(description="MinHash/LSH near-duplicate clustering benchmark")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--dup-share", type=float, default=0.1, help="Fraction of questions that are edited copies")
+    ap.add_argument("--threshold", type=float, default=0.8)
+    ap.add_argument("--pairwise-sample", type=int, default=2000)
+    ap.add_argument("--out", help="Optional JSON results path")
+    args = ap.parse_args()
+
+    results = []
+    print(f"{'questions':>9}{'seconds':>9}{'q/s':>8}{'comparisons':>13}{'recall':>8}{'false merges':>14}{'pairwise est. s':>17}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        items, source = synth_questions(size, args.dup_share)
+        index = qd.NearDuplicateIndex(threshold=args.threshold)
+        started = time.perf_counter()
+        canonical = [index.add(qid, text) for qid, text in items]
+        seconds = time.perf_counter() - started
+
+        planted = [i for i, s in enumerate(source) if s is not None]
+        found = sum(canonical[i] == items[source[i]][0] for i in planted)
+        false_merges = sum(canonical[i] != items[i][0] for i, s in enumerate(source) if s is None)
+        sample = min(args.pairwise_sample, size)
+        pairwise = pairwise_seconds(items, sample, args.threshold) * (size / sample) ** 2
+        r = {
+            "questions": size,
+            "seconds": round(seconds, 3),
+            "comparisons": index.comparisons,
+            "planted": len(planted),
+            "recall": round(found / max(len(planted), 1), 4),
+            "false_merges": false_merges,
+            "clusters": len(index.clusters()),
+            "pairwise_sample": sample,
+            "pairwise_estimated_seconds": round(pairwise, 1),
+        }
+        results.append(r)
+        print(f"{size:>9}{seconds:>9.2f}{size / seconds:>8.0f}{index.comparisons:>13}{r['recall']:>8.3f}{false_merges:>14}{pairwise:>17.0f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": benchutil.git_commit(), "threshold": args.threshold, "dup_share": args.dup_share, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Question segmentation in parse-sat-questions.py parse_pdf.
+
+Extracts the data/pdfs samples once with PyPDF2 (page texts are cached in
+the work directory), then times segmentation alone on the cached pages:
+
+  regex     the previous per-page loop: three lazy DOTALL question patterns,
+            a lazy option pattern and a re.sub per match, kept here
+  segment   segment_pages + SATQuestionParser._parse_pdf_segment
+
+Reported per sample: questions, distinct ids, milliseconds (best of
+--repeat). A scaling run then puts every page of the first sample on a
+single page, repeated 1, 2, 4 and 8 times, to show how each path grows
+with page length.
+
+Usage:
+  python3 scripts/bench/pdf_segment.py [--pdfs data/pdfs/*.pdf] [--repeat 5]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from benchutil import ROOT, git_commit, load_parse_sat
+
+
+def legacy_segment(pages):
+    # parse_pdf's question loop as it was before the single-pass segmenter
+    questions = []
+    for text in pages:
+        question_patterns = [
+            r'Question\s+(\d+)\.?\s*(.*?)(?=Question|\Z)',
+            r'(\d+)\.\s*(.*?)(?=\d+\.|\Z)',
+            r'Problem\s+(\d+)\.?\s*(.*?)(?=Problem|\Z)'
+        ]
+        for pattern in question_patterns:
+            for match in re.finditer(pattern, text, re.DOTALL | re.IGNORECASE):
+                question_text = match.group(2).strip()
+                options = [m.group(2).strip() for m in re.finditer(r'([A-D])[\.\)]\s*(.*?)(?=[A-D][\.\)]|\Z)', question_text, re.DOTALL)]
+                clean_question = re.sub(r'[A-D][\.\)].*?(?=[A-D][\.\)]|\Z)', '', question_text, flags=re.DOTALL).strip()
+                if clean_question and len(clean_question) > 10:
+                    questions.append({'id': f'pdf-{match.group(1)}', 'question': clean_question, 'options': options})
+    return questions
+
+
+def new_segment(module, parser, pages):
+    questions = (parser._parse_pdf_segment(key, body) for key, body in module.segment_pages(pages))
+    return [q for q in questions if q]
+
+
+def page_texts(workdir: str, pdf_path: str):
+    with open(pdf_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    cache = os.path.join(workdir, f"pypdf2-{digest}.json")
+    if os.path.exists(cache):
+        with open(cache, "r", encoding="utf-8") as f:
+            return json.load(f)
+    import PyPDF2
+
+    with open(pdf_path, "rb") as f:
+        pages = [page.extract_text() or "" for page in PyPDF2.PdfReader(f).pages]
+    with open(cache, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    return pages
+
+
+def best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="parse_pdf segmentation: per-page regex loop vs single-pass segmenter")
+    ap.add_argument("--pdfs", nargs="*", default=sorted(glob.glob(os.path.join(ROOT, "data", "pdfs", "*.pdf"))))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    module = load_parse_sat()
+    parser = module.SATQuestionParser()
+    results = []
+
+    print(f"{'sample':<30}{'pages':>6}{'path':>9}{'questions':>10}{'ids':>6}{'ms':>10}")
+    samples = [(os.path.basename(p), page_texts(args.workdir, p)) for p in args.pdfs]
+    for name, pages in samples:
+        for path, fn in (("regex", lambda: legacy_segment(pages)), ("segment", lambda: new_segment(module, parser, pages))):
+            questions, ms = best_ms(fn, args.repeat)
+            ids = len({q["id"] for q in questions})
+            results.append({"sample": name, "pages": len(pages), "path": path, "questions": len(questions), "ids": ids, "ms": round(ms, 2)})
+            print(f"{name[:29]:<30}{len(pages):>6}{path:>9}{len(questions):>10}{ids:>6}{ms:>10.1f}")
+
+    if samples:
+        name, pages = samples[0]
+        print(f"\nAll pages of {name} on one page, repeated:")
+        print(f"{'copies':>6}{'chars':>10}{'regex ms':>10}{'segment ms':>12}")
+        for copies in (1, 2, 4, 8):
+            page = ["\n".join(pages) * copies]
+            _, regex_ms = best_ms(lambda: legacy_segment(page), 1)
+            _, segment_ms = best_ms(lambda: new_segment(module, parser, page), args.repeat)
+            results.append({"sample": name, "copies": copies, "chars": len(page[0]), "regex_ms": round(regex_ms, 2), "segment_ms": round(segment_ms, 2)})
+            print(f"{copies:>6}{len(page[0]):>10}{regex_ms:>10.1f}{segment_ms:>12.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Cost of writing Prepify rows as PostgreSQL COPY streams (pg_copy.CopyWriter).
+
+Converts a synthetic OnePrep dump (shared with json_stream.py) to Prepify
+rows once, then times writing them as:
+
+  json       save_stream_to_json, the array the JS importers upsert in batches
+  copy-text  COPY text format stream + load.sql
+  copy-csv   COPY CSV format stream + load.sql
+
+and decodes each COPY stream with read_copy, which must give back every
+row (table columns only). Reported: seconds (best of --repeat), output MB,
+rows/s and the round-trip check. Loading into PostgreSQL is not measured
+here; no server is needed.
+
+Usage:
+  python3 scripts/bench/pg_copy_export.py --sizes 10000,100000 [--out copy.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchutil import git_commit, load_parse_sat
+
+import pg_copy
+from json_stream import synth_dump
+
+
+def best_seconds(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prepify rows as JSON vs PostgreSQL COPY streams")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    parser = load_parse_sat().SATQuestionParser()
+    results = []
+    ok = True
+    print(f"{'questions':>9}{'path':>11}{'seconds':>9}{'rows/s':>9}{'MB':>8}{'round trip':>12}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = parser.convert_to_prepify_format(parser.parse_json(synth_dump(args.workdir, size)))
+        expected = [pg_copy.table_row(row) for row in rows]
+        outdir = os.path.join(args.workdir, f"copy-{size}")
+        json_path = os.path.join(outdir, "questions.json")
+        os.makedirs(outdir, exist_ok=True)
+        paths = {
+            "json": (lambda: parser.save_stream_to_json(iter(rows), json_path), json_path),
+            "copy-text": (lambda: parser.save_to_copy(rows, os.path.join(outdir, "text"), "text"), os.path.join(outdir, "text", "questions.copy")),
+            "copy-csv": (lambda: parser.save_to_copy(rows, os.path.join(outdir, "csv"), "csv"), os.path.join(outdir, "csv", "questions.csv")),
+        }
+        for name, (fn, out_path) in paths.items():
+            seconds = best_seconds(fn, args.repeat)
+            check = "-"
+            if name != "json":
+                same = list(pg_copy.read_copy(out_path)) == expected
+                check = "ok" if same else "MISMATCH"
+                ok = ok and same
+            r = {"questions": size, "path": name, "seconds": round(seconds, 3), "bytes": os.path.getsize(out_path), "round_trip": check}
+            results.append(r)
+            print(f"{size:>9}{name:>11}{seconds:>9.2f}{size / seconds:>9.0f}{r['bytes'] / 1e6:>8.1f}{check:>12}")
+        shutil.rmtree(outdir)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Sequential pdf_extract_cb run vs the --pipeline asyncio pipeline.
+
+Runs the CLI end to end on synthetic banks (synth_cb_pdf; Math at each
+--sizes plus a 50-question R&W PDF) in a fresh process per run, with no
+text cache and an empty image directory so every run extracts text and
+encodes images:
+
+  sequential       the default loop
+  pipeline q=N     --pipeline --queue-size N, for each --queue-sizes N
+
+Reported: wall seconds (best of --repeat), peak RSS and, for pipeline
+runs, each stage's busy seconds and mean input queue depth from
+--pipeline-stats. Every run must write the same JSON output.
+
+Usage:
+  python3 scripts/bench/pipeline.py --sizes 500,5000 --queue-sizes 1,8,64 [--out pipeline.json]
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutil import cb, git_commit
+from synth_cb_pdf import cached_pdf
+
+
+def child(argv) -> None:
+    sys.argv = ["pdf_extract_cb.py"] + argv
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        cb.main()
+    print(json.dumps({"seconds": time.perf_counter() - started, "peak_rss_kb": cb.peak_rss_kb()}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="pdf_extract_cb: sequential loop vs --pipeline")
+    ap.add_argument("--sizes", default="500,5000", help="Math questions per run (R&W stays at 50)")
+    ap.add_argument("--queue-sizes", default="1,8,64")
+    ap.add_argument("--repeat", type=int, default=2)
+    ap.add_argument("--image-format", choices=["webp", "png"], default="webp")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdf_extract_cb_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child is not None:
+        child(args.child)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    rw_pdf = cached_pdf(args.workdir, 50, "Reading and Writing")
+    modes = [("sequential", None)] + [(f"pipeline q={n}", int(n)) for n in args.queue_sizes.split(",") if n.strip()]
+    results = []
+    ok = True
+    print(f"{'math':>6}{'mode':>15}{'seconds':>9}{'RSS MB':>8}  stage busy s / mean queue depth")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        math_pdf = cached_pdf(args.workdir, size, "Math")
+        outputs = {}
+        for mode, queue_size in modes:
+            best = None
+            for _ in range(args.repeat):
+                tmp = tempfile.mkdtemp(prefix="bench-pipeline-")
+                out = os.path.join(tmp, "out.json")
+                stats_path = os.path.join(tmp, "stats.json")
+                argv = ["--math", math_pdf, "--rw", rw_pdf, "--out", out, "--imgdir", os.path.join(tmp, "img"), "--no-cache",
+                        "--expected-math", "0", "--image-format", args.image_format]
+                if queue_size is not None:
+                    argv += ["--pipeline", "--queue-size", str(queue_size), "--pipeline-stats", stats_path]
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *argv], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                r = json.loads(proc.stdout.decode().strip().splitlines()[-1])
+                if queue_size is not None:
+                    with open(stats_path, "r", encoding="utf-8") as f:
+                        r["pipeline"] = json.load(f)
+                if best is None or r["seconds"] < best["seconds"]:
+                    best = r
+                    outputs[mode] = os.path.join(args.workdir, f"pipeline-out-{size}-{len(outputs)}.json")
+                    shutil.copyfile(out, outputs[mode])
+                shutil.rmtree(tmp, ignore_errors=True)
+            best.update(math=size, mode=mode, queue_size=queue_size)
+            results.append(best)
+            stages = ""
+            if "pipeline" in best:
+                stages = "  ".join(f"{name} {st['busy']:.2f}/{st['mean_depth']:.1f}" for name, st in best["pipeline"]["stages"].items())
+            print(f"{size:>6}{mode:>15}{best['seconds']:>9.2f}{best['peak_rss_kb'] / 1024:>8.0f}  {stages}")
+        first = outputs["sequential"]
+        for mode, path in outputs.items():
+            same = filecmp.cmp(first, path, shallow=False)
+            ok = ok and same
+            if not same:
+                print(f"OUTPUT DIFFERS: {mode} at {size}", file=sys.stderr)
+        for path in outputs.values():
+            os.remove(path)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "cpus": os.cpu_count(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Memory of holding N extracted questions in each representation.
+
+CB questions: the synthetic 5000-question Math bank (synth_cb_pdf) is
+parsed once; N questions are then produced from it with fresh string
+objects for every field, as separate parses would, and kept as:
+
+  legacy     the previous CBQuestion/Choice dataclasses (per-instance
+             __dict__, categorical strings not interned), kept here
+  slots      CBQuestion/Choice as now (__slots__ on Python 3.10+,
+             categorical fields interned as parse_block does)
+  dicts      question_to_dict rows, what run() kept for --format json
+  batch      ColumnarBatch(CB_BATCH_SCHEMA), what run() keeps now
+
+Prepify rows: a synthetic OnePrep dump (json_stream.synth_dump) is parsed
+once, then converted with convert_to_prepify_format (dicts) or
+convert_to_prepify_batch (batch). Only the converted rows are counted.
+
+Each path runs in a fresh process. Reported: traced MB (tracemalloc,
+Python allocations retained by the representation), bytes per question,
+build seconds (untraced) and seconds to write the JSON array (json.dump for lists,
+write_json for batches); both writers must produce the same bytes.
+
+Usage:
+  python3 scripts/bench/question_memory.py --sizes 10000,100000 [--out memory.json]
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from benchutil import NullExporter, cb, git_commit, load_parse_sat
+from block_memory import text_file
+from json_stream import synth_dump
+
+CB_PATHS = ("legacy", "slots", "dicts", "batch")
+PREPIFY_PATHS = ("dicts", "batch")
+
+
+@dataclass
+class LegacyChoice:
+    label: str
+    text: str
+
+
+@dataclass
+class LegacyCBQuestion:
+    id: str
+    assessment: str
+    test: str
+    domain: Optional[str]
+    skill: Optional[str]
+    difficulty: str
+    number: Optional[int]
+    stem: str
+    choices: Optional[List[LegacyChoice]]
+    answer: Optional[str]
+    rationale: Optional[str]
+    images: List[str]
+    pages: List[int]
+    thumbnails: List[str] = field(default_factory=list)
+
+
+def fresh(s):
+    # A new string object with the same value, like one sliced out of a new parse
+    return None if s is None else (s + ".")[:-1]
+
+
+def fresh_fields(q, i: int) -> dict:
+    return dict(
+        id=f"{q.id}-{i}", assessment=fresh(q.assessment), test=fresh(q.test), domain=fresh(q.domain), skill=fresh(q.skill),
+        difficulty=fresh(q.difficulty), number=q.number, stem=fresh(q.stem), answer=fresh(q.answer), rationale=fresh(q.rationale),
+        images=[fresh(x) for x in q.images], pages=list(q.pages), thumbnails=[fresh(x) for x in q.thumbnails],
+    )
+
+
+def cb_questions(workdir: str) -> list:
+    text_path = text_file(workdir, 5000)
+    with open(text_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return list(cb.parse_document("Math", text, text_path, NullExporter()))
+
+
+def build_cb(path: str, template: list, n: int):
+    out = [] if path != "batch" else cb.ColumnarBatch(cb.CB_BATCH_SCHEMA)
+    for i in range(n):
+        q = template[i % len(template)]
+        values = fresh_fields(q, i)
+        choices = None if q.choices is None else [(fresh(c.label), fresh(c.text)) for c in q.choices]
+        if path == "legacy":
+            out.append(LegacyCBQuestion(choices=None if choices is None else [LegacyChoice(l, t) for l, t in choices], **values))
+            continue
+        if path != "dicts":
+            for key in ("assessment", "test", "domain", "skill", "difficulty"):
+                values[key] = cb.intern_or_none(values[key])
+        question = cb.CBQuestion(choices=None if choices is None else [cb.Choice(l, t) for l, t in choices], **values)
+        out.append(question if path == "slots" else cb.question_to_dict(question))
+    return out
+
+
+def build_prepify(path: str, parser, raw: list):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parser.convert_to_prepify_batch(raw) if path == "batch" else parser.convert_to_prepify_format(raw)
+
+
+def write_json(container) -> bytes:
+    buf = io.StringIO()
+    if isinstance(container, cb.ColumnarBatch):
+        container.write_json(buf)
+    else:
+        json.dump(container, buf, ensure_ascii=False, indent=2)
+    return buf.getvalue().encode("utf-8")
+
+
+def child(kind: str, path: str, size: int, workdir: str) -> None:
+    if kind == "cb":
+        template = cb_questions(workdir)
+        parser = raw = None
+    else:
+        parser = load_parse_sat().SATQuestionParser()
+        with contextlib.redirect_stdout(io.StringIO()):
+            raw = parser.parse_json(synth_dump(workdir, size))
+    build = (lambda: build_cb(path, template, size)) if kind == "cb" else (lambda: build_prepify(path, parser, raw))
+    # Timed untraced first; tracemalloc slows allocation-heavy builds several-fold
+    started = time.perf_counter()
+    container = build()
+    build_seconds = time.perf_counter() - started
+    del container
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    container = build()
+    traced = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    r = {"questions": len(container), "traced_bytes": traced, "build_seconds": build_seconds}
+    if path in ("dicts", "batch"):
+        started = time.perf_counter()
+        data = write_json(container)
+        r["write_seconds"] = time.perf_counter() - started
+        r["json_sha1"] = hashlib.sha1(data).hexdigest()
+    print(json.dumps(r))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Question model memory: dataclasses vs slots vs dict rows vs columnar batches")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdf_extract_cb_bench"), help="Synthetic CB PDFs (shared with the other CB benchmarks)")
+    ap.add_argument("--prepify-workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"), help="Synthetic OnePrep dumps (shared with json_stream.py)")
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=4, metavar=("KIND", "PATH", "SIZE", "WORKDIR"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        kind, path, size, workdir = args.child
+        child(kind, path, int(size), workdir)
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.makedirs(args.prepify_workdir, exist_ok=True)
+    results = []
+    ok = True
+    print(f"{'rows':>6}{'questions':>10}{'path':>8}{'traced MB':>11}{'B/question':>12}{'build s':>9}{'write s':>9}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        for kind, paths, workdir in (("cb", CB_PATHS, args.workdir), ("prepify", PREPIFY_PATHS, args.prepify_workdir)):
+            digests = set()
+            for path in paths:
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, path, str(size), workdir],
+                                      check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                r = json.loads(proc.stdout.decode().strip().splitlines()[-1])
+                r.update(kind=kind, path=path)
+                results.append(r)
+                if "json_sha1" in r:
+                    digests.add(r["json_sha1"])
+                write = f"{r['write_seconds']:>9.2f}" if "write_seconds" in r else f"{'-':>9}"
+                print(f"{kind:>6}{r['questions']:>10}{path:>8}{r['traced_bytes'] / 2 ** 20:>11.1f}{r['traced_bytes'] / r['questions']:>12.0f}{r['build_seconds']:>9.2f}{write}")
+            if len(digests) > 1:
+                ok = False
+                print(f"JSON DIFFERS between {kind} dicts and batch at {size}", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "python": sys.version.split()[0], "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
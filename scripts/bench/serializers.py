@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Speed and size of each question_codec output format.
+
+CB questions: question_memory's synthetic bank (5000 parsed Math
+questions, replicated with fresh strings up to each size) as slotted
+CBQuestion objects, encoded as:
+
+  asdict+json   the previous serializer: dataclasses.asdict per question
+                (kept here), json.dump(indent=2)
+  json          question_to_dict + question_codec "json" (same bytes)
+  json-compact  question_to_dict + "json-compact"
+  qbin          question_to_dict + "qbin"
+
+Prepify rows: convert_to_prepify_format over a synthetic OnePrep dump
+(json_stream.synth_dump), encoded as json, json-compact and qbin.
+
+Each output goes to a file and is read back with question_codec.read_questions
+(json.load for the JSON arrays); the rows must come back unchanged.
+Reported: encode and decode seconds (best of --repeat), output MB and
+rows/s for encoding.
+
+Usage:
+  python3 scripts/bench/serializers.py --sizes 10000,100000 [--out serializers.json]
+"""
+import argparse
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchutil import cb, git_commit, load_parse_sat
+from json_stream import synth_dump
+from question_memory import build_cb, cb_questions
+
+import question_codec
+
+CB_SHARED = cb.CB_SHARED_FIELDS
+
+
+def asdict_row(q) -> dict:
+    # pdf_extract_cb.question_to_dict before it read the slots directly
+    item = dataclasses.asdict(q)
+    if q.choices is not None:
+        item["choices"] = [dataclasses.asdict(c) for c in q.choices]
+    return item
+
+
+def best_seconds(fn, repeat):
+    """Best time over repeat calls, and the last call's result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def encoder(path: str, fmt: str, rows_fn, shared):
+    def run():
+        with question_codec.open_output(path, fmt) as f:
+            question_codec.write_questions(f, rows_fn(), fmt, shared)
+    return run
+
+
+def measure(kind: str, size: int, paths, expected, repeat: int, workdir: str):
+    results = []
+    ok = True
+    for name, fmt, rows_fn, shared in paths:
+        out_path = os.path.join(workdir, f"serializers-{kind}-{size}.{fmt}")
+        if name == "asdict+json":
+            def encode():
+                with open(out_path, "w", encoding="utf-8") as f:
+                    json.dump([asdict_row(q) for q in rows_fn()], f, ensure_ascii=False, indent=2)
+        else:
+            encode = encoder(out_path, fmt, rows_fn, shared)
+        seconds, _ = best_seconds(encode, repeat)
+        decode_seconds, decoded = best_seconds(lambda: list(question_codec.read_questions(out_path)), repeat)
+        same = decoded == expected
+        ok = ok and same
+        r = {"kind": kind, "questions": size, "path": name, "encode_seconds": round(seconds, 3), "decode_seconds": round(decode_seconds, 3),
+             "bytes": os.path.getsize(out_path), "round_trip": "ok" if same else "MISMATCH"}
+        results.append(r)
+        print(f"{kind:>8}{size:>10}{name:>14}{seconds:>9.2f}{size / seconds:>9.0f}{decode_seconds:>9.2f}{r['bytes'] / 1e6:>8.1f}{r['round_trip']:>11}")
+        os.remove(out_path)
+    return results, ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description="question_codec formats: encode/decode speed and size")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdf_extract_cb_bench"), help="Synthetic CB PDFs (shared with the other CB benchmarks)")
+    ap.add_argument("--prepify-workdir", default=os.path.join(tempfile.gettempdir(), "parse_sat_bench"), help="Synthetic OnePrep dumps (shared with json_stream.py)")
+    ap.add_argument("--out", help="Optional JSON results path")
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.makedirs(args.prepify_workdir, exist_ok=True)
+    template = cb_questions(args.workdir)
+    parse_sat = load_parse_sat()
+    parser = parse_sat.SATQuestionParser()
+    results = []
+    ok = True
+    print(f"{'rows':>8}{'questions':>10}{'path':>14}{'encode s':>9}{'rows/s':>9}{'decode s':>9}{'MB':>8}{'round trip':>11}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        questions = build_cb("slots", template, size)
+        expected = [cb.question_to_dict(q) for q in questions]
+        paths = [("asdict+json", "json", lambda: questions, CB_SHARED)]
+        paths += [(fmt, fmt, lambda: (cb.question_to_dict(q) for q in questions), CB_SHARED) for fmt in question_codec.FORMATS]
+        r, same = measure("cb", size, paths, expected, args.repeat, args.workdir)
+        results += r
+        ok = ok and same
+        del questions, expected
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = parser.convert_to_prepify_format(parser.parse_json(synth_dump(args.prepify_workdir, size)))
+        paths = [(fmt, fmt, lambda: rows, parse_sat.QBIN_SHARED_FIELDS) for fmt in question_codec.FORMATS]
+        r, same = measure("prepify", size, paths, rows, args.repeat, args.workdir)
+        results += r
+        ok = ok and same
+        del rows
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
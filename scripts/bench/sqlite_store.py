@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""SQLite question store (question_store.SQLiteQuestionStore, --store).
+
+Builds a deterministic synthetic set of CB-style questions (stem, four
+choices, image references, test/domain/skill/difficulty) and measures,
+each in a fresh process:
+
+  upsert     questions/s into a new store at --batch questions per
+             flush, and at 1 per flush for comparison (one transaction,
+             committed on close, either way)
+             (questions are generated before the clock starts)
+  reupsert   questions/s upserting the same ids again (a re-run)
+  query      ms to fetch one skill's questions through the index, vs
+             json.load of the whole array plus a filter
+  export     seconds and RSS growth of export_json; the exported file
+             must equal json.dump of the same questions byte for byte
+
+Usage:
+  python3 scripts/bench/sqlite_store.py --sizes 10000,100000 [--out store.json]
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutil import cb, git_commit  # benchutil also puts scripts/ on sys.path
+
+import question_store as qs
+
+SKILLS = [f"skill-{i:02d}" for i in range(30)]
+DOMAINS = ["Algebra", "Advanced Math", "Geometry and Trigonometry", "Problem-Solving and Data Analysis",
+           "Craft and Structure", "Information and Ideas", "Expression of Ideas", "Standard English Conventions"]
+
+
+def synth_questions(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = "the slope of line value graph equation text passage author claim data study percent circle".split()
+
+    def text(k):
+        return " ".join(rng.choice(words) for _ in range(k))
+
+    for i in range(n):
+        test = rng.choice(["Math", "Reading and Writing"])
+        yield {
+            "id": f"{i:08x}",
+            "test": test,
+            "domain": rng.choice(DOMAINS),
+            "skill": rng.choice(SKILLS),
+            "difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+            "stem": text(rng.randint(20, 120)),
+            "choices": [{"label": label, "text": text(rng.randint(1, 8))} for label in "ABCD"],
+            "answer": rng.choice("ABCD"),
+            "rationale": text(rng.randint(30, 150)),
+            "images": [f"/qmedia/{i:08x}-{j}.webp" for j in range(rng.choice([0, 0, 1, 2]))],
+            "pages": [rng.randint(1, 500)],
+        }
+
+
+def child(path: str, size: int, db: str, source: str, batch: int) -> None:
+    # Generated up front so upsert timings cover only the store
+    items = list(synth_questions(size)) if path in ("upsert", "reupsert") else None
+    rss_before = cb.peak_rss_kb()
+    started = time.perf_counter()
+    r = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        if path in ("upsert", "reupsert"):
+            with qs.SQLiteQuestionStore(db, batch_size=batch) as store:
+                store.upsert_many(items)
+            r["questions"] = store.upserted
+        elif path == "query-sqlite":
+            with qs.SQLiteQuestionStore(db) as store:
+                r["questions"] = sum(1 for _ in store.query(skill=SKILLS[0]))
+        elif path == "query-json":
+            with open(source, "r", encoding="utf-8") as f:
+                r["questions"] = sum(1 for q in json.load(f) if q["skill"] == SKILLS[0])
+        elif path == "export":
+            with qs.SQLiteQuestionStore(db) as store:
+                r["questions"] = store.export_json(f"{db}.export.json")
+    r.update(seconds=time.perf_counter() - started, rss_growth_kb=cb.peak_rss_kb() - rss_before)
+    print(json.dumps(r))
+
+
+def run_child(*argv) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *map(str, argv)],
+                          check=True, stdout=subprocess.PIPE)
+    return json.loads(proc.stdout.decode().strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SQLite question store: upserts, indexed queries and streaming export")
+    ap.add_argument("--sizes", default="10000,100000")
+    ap.add_argument("--batch", type=int, default=qs.DEFAULT_BATCH, help="Questions per flush")
+    ap.add_argument("--unbatched-max", type=int, default=10000, help="Largest size also timed at 1 question per flush")
+    ap.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "question_store_bench"))
+    ap.add_argument("--out", help="Optional JSON results path")
+    ap.add_argument("--child", nargs=5, metavar=("PATH", "SIZE", "DB", "SOURCE", "BATCH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        path, size, db, source, batch = args.child
+        child(path, int(size), db, source, int(batch))
+        return
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+    ok = True
+    print(f"{'questions':>9}{'path':>14}{'batch':>7}{'seconds':>9}{'q/s':>9}{'matched':>9}{'RSS growth MB':>15}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        source = os.path.join(args.workdir, f"questions-{size}.json")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(list(synth_questions(size)), f, ensure_ascii=False, indent=2)
+        db = os.path.join(args.workdir, f"store-{size}.db")
+        runs = []
+        if size <= args.unbatched_max:
+            runs.append(("upsert", 1, f"{db}.unbatched"))
+        runs += [("upsert", args.batch, db), ("reupsert", args.batch, db),
+                 ("query-sqlite", args.batch, db), ("query-json", args.batch, db), ("export", args.batch, db)]
+        for stale in (db, f"{db}.unbatched"):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(stale + suffix):
+                    os.remove(stale + suffix)
+        for path, batch, target in runs:
+            r = run_child(path, size, target, source, batch)
+            r.update(size=size, path=path, batch=batch)
+            results.append(r)
+            rate = r["questions"] / r["seconds"] if path in ("upsert", "reupsert") else 0
+            print(f"{size:>9}{path:>14}{batch:>7}{r['seconds']:>9.2f}{rate:>9.0f}{r['questions']:>9}{r['rss_growth_kb'] / 1024:>15.1f}")
+        same = filecmp.cmp(source, f"{db}.export.json", shallow=False)
+        ok = ok and same
+        if not same:
+            print(f"EXPORT DIFFERS at {size}", file=sys.stderr)
+        results.append({"size": size, "db_bytes": os.path.getsize(db), "json_bytes": os.path.getsize(source)})
+        print(f"{size:>9} store {os.path.getsize(db) / 1e6:.1f} MB, JSON {os.path.getsize(source) / 1e6:.1f} MB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Generate synthetic College Board style question-bank PDFs for benchmarks.
+
+Each question gets its own page laid out like the 50M/50RW exports: a
+"Question ID" header, the stem, A-D choices, the "ID: <qid> Answer"
+section with "Correct Answer", the vertical Assessment/Test/Domain/Skill/
+Difficulty label column and a rationale. Every third question embeds a
+figure; one in three of those comes from a small shared pool, so image
+export sees both new and repeated images. Output is deterministic for a
+given (count, test, seed).
+
+Usage:
+  python3 scripts/bench/synth_cb_pdf.py --questions 500 --test Math --out /tmp/synth-500M.pdf
+"""
+import argparse
+import hashlib
+import os
+import random
+from typing import List
+
+try:
+    import fitz  # PyMuPDF
+except Exception:
+    fitz = None
+
+# Bump when the layout changes so cached benchmark PDFs are regenerated
+GENERATOR_VERSION = "2"
+
+DOMAINS = {
+    "Math": [
+        ("Algebra", ["Linear functions", "Systems of two linear equations in two variables"]),
+        ("Advanced Math", ["Nonlinear functions", "Equivalent expressions"]),
+        ("Problem-Solving and Data Analysis", ["Percentages", "Probability and conditional probability"]),
+        ("Geometry and Trigonometry", ["Right triangles and trigonometry", "Circles"]),
+    ],
+    "Reading and Writing": [
+        ("Information and Ideas", ["Inferences", "Central Ideas and Details"]),
+        ("Craft and Structure", ["Words in Context", "Text Structure and Purpose"]),
+        ("Expression of Ideas", ["Transitions", "Rhetorical Synthesis"]),
+        ("Standard English Conventions", ["Boundaries", "Form, Structure, and Sense"]),
+    ],
+}
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+WORDS = ("the of and to in is that for it as was with be by on not he this are or his from at which but have an they "
+         "researchers species census function value equation line slope graph text data study reported suggests").split()
+FIGURE_POOL = 12
+
+
+def qid_for(seed: int, test: str, i: int) -> str:
+    return hashlib.sha1(f"{seed}:{test}:{i}".encode()).hexdigest()[:8]
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+
+def figure(index: int):
+    # Bar chart-ish pixmap; the same index always draws the same pattern
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 320, 200), 0)
+    pix.clear_with(255)
+    rng = random.Random(index)
+    for b in range(8):
+        height = rng.randint(20, 190)
+        color = (rng.randint(0, 200), rng.randint(0, 200), rng.randint(0, 200))
+        pix.set_rect(fitz.IRect(10 + b * 38, 200 - height, 40 + b * 38, 200), color)
+    return pix
+
+
+def generate(out_path: str, questions: int, test: str = "Math", seed: int = 0) -> List[str]:
+    """Write the PDF and return its QIDs in order."""
+    if fitz is None:
+        raise RuntimeError("PyMuPDF is required to generate benchmark PDFs. Please install via: pip install PyMuPDF")
+    rng = random.Random(f"{seed}:{test}")
+    shared = [figure(i) for i in range(FIGURE_POOL)]
+    doc = fitz.open()
+    qids: List[str] = []
+    for i in range(questions):
+        qid = qid_for(seed, test, i)
+        qids.append(qid)
+        domain, skills = rng.choice(DOMAINS[test])
+        answer = rng.choice("ABCD")
+        page = doc.new_page(width=612, height=792)
+        y = 40
+        head = f"Question ID {qid}\nID: {qid}\n{sentence(rng, rng.randint(30, 90))}\nWhich choice best answers the question?"
+        rect = fitz.Rect(40, y, 572, y + 220)
+        page.insert_textbox(rect, head, fontsize=10, fontname="helv")
+        y += 230
+        if i % 3 == 0:
+            n = i // 3
+            pix = shared[(n // 3) % FIGURE_POOL] if n % 3 == 0 else figure(FIGURE_POOL + i)
+            page.insert_image(fitz.Rect(146, y, 466, y + 200), pixmap=pix)
+            y += 210
+        choices = "\n".join(f"{letter}. \n{sentence(rng, rng.randint(6, 18))}" for letter in "ABCD")
+        page.insert_textbox(fitz.Rect(40, y, 572, y + 160), choices, fontsize=10, fontname="helv")
+        y += 170
+        tail = (f"ID: {qid} Answer\nCorrect Answer: {answer}\nRationale\n"
+                f"Choice {answer} is correct. {sentence(rng, rng.randint(20, 60))}\n"
+                f"Question Difficulty: {rng.choice(DIFFICULTIES)}")
+        page.insert_textbox(fitz.Rect(40, y, 440, 780), tail, fontsize=9, fontname="helv")
+        labels = f"Assessment\nSAT\nTest\n{test}\nDomain\n{domain}\nSkill\n{rng.choice(skills)}\nDifficulty"
+        page.insert_textbox(fitz.Rect(450, y, 572, 780), labels, fontsize=8, fontname="helv")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    doc.save(out_path, garbage=3, deflate=True)
+    doc.close()
+    return qids
+
+
+def cached_pdf(workdir: str, questions: int, test: str, seed: int = 0) -> str:
+    """Path of a generated PDF in workdir, generating it on first use."""
+    tag = "M" if test == "Math" else "RW"
+    path = os.path.join(workdir, f"synth-v{GENERATOR_VERSION}-s{seed}-{questions}{tag}.pdf")
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        generate(tmp, questions, test, seed)
+        os.replace(tmp, path)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic question-bank PDF")
+    ap.add_argument("--questions", type=int, default=50)
+    ap.add_argument("--test", choices=list(DOMAINS), default="Math")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args()
+    qids = generate(args.out, args.questions, args.test, args.seed)
+    print(f"Wrote {len(qids)} questions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,206 +4,450 @@ SAT Question Parser for Prepify
 Parses SAT questions from various sources (PDFs, CSVs, JSON) and converts them to Prepify format.
 """
 
+import time
+
+_START = time.perf_counter()
+
 import json
 import csv
 import re
 import sys
 import os
+import contextlib
+import importlib
+import io
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import argparse
 
-try:
-    import PyPDF2
-    import pandas as pd
-except ImportError:
-    print("❌ Missing required packages. Install with:")
-    print("pip install PyPDF2 pandas")
-    sys.exit(1)
+from question_batch import ColumnarBatch
+from question_codec import FORMATS as OUTPUT_FORMATS, open_output, open_writer, shared_fields, write_questions
+
+# PyPDF2 and pandas are imported on first use by parse_pdf / parse_csv, so
+# converting JSON never pays for them. Seconds spent importing each one:
+IMPORT_TIMES: Dict[str, float] = {}
+
+
+def _require(module_name: str, pip_name: str):
+    """
+    Import an optional dependency on first use, recording how long it took
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        print("❌ Missing required package. Install with:")
+        print(f"pip install {pip_name}")
+        return None
+    IMPORT_TIMES[module_name] = time.perf_counter() - started
+    return module
+
+# CSV column names recognised by parse_csv, in order of preference
+CSV_QUESTION_COLS = ['question', 'content', 'text', 'problem']
+CSV_OPTION_COLS = ['options', 'choices', 'answers']
+CSV_ANSWER_COLS = ['correct_answer', 'answer', 'solution']
+CSV_DIFFICULTY_COLS = ['difficulty', 'level']
+CSV_MODULE_COLS = ['module', 'subject', 'category']
+CSV_DIFFICULTY_CODES = {'E': 'E', 'EASY': 'E', '1': 'E', 'H': 'H', 'HARD': 'H', '3': 'H'}
+CSV_CHUNK_ROWS = 50_000
+
+# Columns of to_prepify rows for question_batch.ColumnarBatch; canonical_id is added by --dedupe
+PREPIFY_BATCH_SCHEMA = [
+    ('question_id', 'value'), ('external_id', 'category'), ('skill_cd', 'category'), ('skill_desc', 'category'),
+    ('primary_class_cd', 'category'), ('primary_class_cd_desc', 'category'), ('difficulty', 'category'),
+    ('module', 'category'),
+    ('content', 'record', ('keys', 'rationale', 'question', 'options', 'correct_answer', 'explanation')),
+    ('program', 'category'), ('score_band_range_cd', 'category'), ('active', 'category'), ('canonical_id', 'value'),
+]
+# Fields whose values --output-format qbin stores once per file (Prepify categories plus raw 'source')
+QBIN_SHARED_FIELDS = shared_fields(PREPIFY_BATCH_SCHEMA) + ('source',)
+
+# First characters a JSON document can start with; anything else goes straight to the comma split
+_JSON_START = frozenset('[{"-0123456789tfn')
+
+
+def _parse_options(value) -> Any:
+    """
+    Parse an options cell: JSON if it is JSON, otherwise comma-separated
+    """
+    if not isinstance(value, str):
+        return []
+    if value.lstrip()[:1] in _JSON_START:
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return [opt.strip() for opt in value.split(',') if opt.strip()]
+
+JSON_CHUNK_CHARS = 1 << 20
+_JSON_WS = ' \t\n\r'
+_JSON_DELIMITERS = frozenset(',]}' + _JSON_WS)
+_json_decoder = json.JSONDecoder()
+
+
+def iter_json_items(json_path: str, chunk_chars: int = JSON_CHUNK_CHARS) -> Iterator[tuple]:
+    """
+    Incrementally read a top-level JSON object or array.
+    
+    Yields (key, value) for each member of an object and (index, value) for
+    each element of an array, decoding one member at a time from a rolling
+    buffer, so memory stays proportional to the largest member rather than
+    the whole file. Yields nothing for any other top-level value. Raises
+    ValueError on malformed JSON.
+    """
+    with open(json_path, 'r', encoding='utf-8') as file:
+        buf = ''
+        pos = 0
+        eof = False
+        
+        def more() -> bool:
+            # Append the next chunk (at least as large as the buffer, so re-decoding a long member stays linear)
+            nonlocal buf, pos, eof
+            if eof:
+                return False
+            data = file.read(max(chunk_chars, len(buf) - pos))
+            if not data:
+                eof = True
+                return False
+            buf = buf[pos:] + data
+            pos = 0
+            return True
+        
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _JSON_WS:
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not more():
+                    return ''
+        
+        def decode() -> Any:
+            nonlocal pos
+            peek()
+            while True:
+                try:
+                    value, end = _json_decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if more():
+                        continue
+                    raise
+                # A number or literal only ends at a delimiter; without one it may continue in the next chunk
+                if not isinstance(value, (str, list, dict)) and (end == len(buf) or buf[end] not in _JSON_DELIMITERS) and more():
+                    continue
+                pos = end
+                return value
+        
+        def expect(chars: str) -> str:
+            nonlocal pos
+            ch = peek()
+            if not ch or ch not in chars:
+                raise ValueError(f"Expected one of {chars!r} at offset {file.tell()} (found {ch or 'end of file'!r})")
+            pos += 1
+            return ch
+        
+        opener = peek()
+        if opener not in ('{', '['):
+            return
+        pos += 1
+        closer = '}' if opener == '{' else ']'
+        if peek() == closer:
+            return
+        index = 0
+        while True:
+            if opener == '{':
+                key = decode()
+                expect(':')
+            else:
+                key = index
+            yield key, decode()
+            index += 1
+            if expect(',' + closer) == closer:
+                return
+
+
+# Question starts: "Question 12", "Problem 12", "Question ID 3f5a3602" or a bare "12." at the start of a line
+PDF_QUESTION_START_RE = re.compile(
+    r'^[ \t]*(?:(?:Question|Problem)[ \t]+(?:ID[ \t]+(?P<qid>[0-9A-Za-z]+(?:[ \t][0-9A-Za-z]+)*)[ \t]*$|(?P<num>\d+)\.?)|(?P<bare>\d{1,3})\.(?=\s))',
+    re.IGNORECASE | re.MULTILINE)
+# Choice labels at the start of a line, or anywhere after whitespace for choices laid out inline
+PDF_OPTION_RE = re.compile(r'^[ \t]*([A-D])[\.\)][ \t]*', re.MULTILINE)
+PDF_INLINE_OPTION_RE = re.compile(r'(?<!\S)([A-D])[\.\)][ \t]*')
+PDF_ANSWER_SECTION_RE = re.compile(r'^[ \t]*(?:ID:[^\n]*?[ \t]Answer\b|Correct Answer\b|Answer Explanation\b|Rationale\b)', re.IGNORECASE | re.MULTILINE)
+# PyPDF2 sometimes breaks words with spaces ("Corr ect A nswer: BAssessment")
+PDF_CORRECT_ANSWER_RE = re.compile(r'C ?o ?r ?r ?e ?c ?t[ \t]+A ?n ?s ?w ?e ?r ?:[ \t]*([^\n]*?)(?:A ?s ?s ?e ?s ?s ?m ?e ?n ?t)?[ \t]*$', re.IGNORECASE | re.MULTILINE)
+PDF_ID_LINE_RE = re.compile(r'^\s*ID:[^\n]*(?:\n|$)')
+
+
+def _option_sequence(pattern: re.Pattern, text: str) -> List[re.Match]:
+    """
+    Option label matches that read A, B, C, D in order (at least two of them)
+    """
+    sequence = []
+    for m in pattern.finditer(text):
+        if m.group(1) == 'A' and len(sequence) == 1:
+            # A later "A" before any "B" is the real first choice ("Plan A. ... A) ...")
+            sequence[0] = m
+        elif m.group(1) == 'ABCD'[len(sequence)]:
+            sequence.append(m)
+            if len(sequence) == 4:
+                break
+    return sequence if len(sequence) >= 2 else []
+
+
+def segment_pages(pages: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Split a stream of page texts into (question key, question text) segments.
+    
+    Pages are joined into one continuous stream, so a question runs from its
+    start line to the next question start on whichever page that is. Each
+    page is scanned once: only the text of the still-open question is kept
+    between pages. The first start found fixes the style for the document:
+    once a "Question"/"Problem" header has been seen bare "12." lines are
+    ordinary text, and vice versa.
+    """
+    pending = ''
+    key = None
+    labelled = None
+    for page in pages:
+        scan_from = len(pending)
+        pending += page if page.endswith('\n') else page + '\n'
+        start = 0
+        for m in PDF_QUESTION_START_RE.finditer(pending, scan_from):
+            is_labelled = m.group('bare') is None
+            if labelled is None:
+                labelled = is_labelled
+            elif is_labelled != labelled:
+                continue
+            if key is not None:
+                yield key, pending[start:m.start()]
+            key = re.sub(r'\s+', '', m.group('qid')) if m.group('qid') else m.group('num') or m.group('bare')
+            start = m.end()
+        if key is None:
+            pending = ''
+        else:
+            pending = pending[start:]
+    if key is not None:
+        yield key, pending
+
+def source_name(file_path: Path, root: Optional[Path] = None) -> str:
+    """
+    Namespace for the ids generated for a file: its path under root without the extension, or its stem
+    """
+    relative = file_path.relative_to(root) if root is not None and root in file_path.parents else Path(file_path.name)
+    return relative.with_suffix('').as_posix()
+
+class ParseError(Exception):
+    """
+    A file that could not be parsed, raised by parse_file(..., raise_errors=True)
+    """
 
 class SATQuestionParser:
     def __init__(self):
         self.questions = []
         
-    def parse_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
+    def _failed(self, message: str, raise_errors: bool) -> List[Dict[str, Any]]:
         """
-        Parse SAT questions from PDF files (Bluebook format)
+        A file that could not be parsed: raise ParseError, or print the failure and return no questions
         """
+        if raise_errors:
+            raise ParseError(message)
+        print(f"❌ {message}")
+        return []
+    
+    def parse_pdf(self, pdf_path: str, raise_errors: bool = False, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Parse SAT questions from PDF files (Bluebook format); ids are pdf-<source>-<question key>
+        """
+        source = source or source_name(Path(pdf_path))
         print(f"📖 Parsing PDF: {pdf_path}")
         
-        questions = []
+        PyPDF2 = _require('PyPDF2', 'PyPDF2')
+        if PyPDF2 is None:
+            # _require has printed how to install it
+            if raise_errors:
+                raise ParseError('Missing required package: pip install PyPDF2')
+            return []
         
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                
-                current_question = {}
-                current_text = ""
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    current_text += text + "\n"
-                    
-                    # Look for question patterns
-                    question_patterns = [
-                        r'Question\s+(\d+)\.?\s*(.*?)(?=Question|\Z)',
-                        r'(\d+)\.\s*(.*?)(?=\d+\.|\Z)',
-                        r'Problem\s+(\d+)\.?\s*(.*?)(?=Problem|\Z)'
-                    ]
-                    
-                    for pattern in question_patterns:
-                        matches = re.finditer(pattern, text, re.DOTALL | re.IGNORECASE)
-                        for match in matches:
-                            question_num = match.group(1)
-                            question_text = match.group(2).strip()
-                            
-                            # Extract options (A, B, C, D)
-                            options = []
-                            option_pattern = r'([A-D])[\.\)]\s*(.*?)(?=[A-D][\.\)]|\Z)'
-                            option_matches = re.finditer(option_pattern, question_text, re.DOTALL)
-                            
-                            for opt_match in option_matches:
-                                option_letter = opt_match.group(1)
-                                option_text = opt_match.group(2).strip()
-                                options.append(option_text)
-                            
-                            # Clean question text (remove options)
-                            clean_question = re.sub(r'[A-D][\.\)].*?(?=[A-D][\.\)]|\Z)', '', question_text, flags=re.DOTALL).strip()
-                            
-                            if clean_question and len(clean_question) > 10:
-                                questions.append({
-                                    'id': f'pdf-{question_num}',
-                                    'question': clean_question,
-                                    'options': options,
-                                    'correct_answer': '',  # Will need manual review
-                                    'explanation': '',
-                                    'difficulty': 'M',
-                                    'module': 'math',  # Default, will need classification
-                                    'source': 'pdf'
-                                })
+                pages = (page.extract_text() or '' for page in pdf_reader.pages)
+                questions = [self._parse_pdf_segment(f'{source}-{key}', body) for key, body in segment_pages(pages)]
+                questions = [question for question in questions if question]
                 
                 print(f"✅ Extracted {len(questions)} questions from PDF")
                 return questions
                 
         except Exception as e:
-            print(f"❌ Error parsing PDF: {e}")
-            return []
+            return self._failed(f"Error parsing PDF: {e}", raise_errors)
+    
+    def _parse_pdf_segment(self, key: str, body: str) -> Optional[Dict[str, Any]]:
+        """Parse one segmented PDF question (None if too short to be a question)"""
+        # Stem and options end where an answer section starts
+        answer_section = PDF_ANSWER_SECTION_RE.search(body)
+        question_part = body[:answer_section.start()] if answer_section else body
+        
+        # Extract options (A, B, C, D), each running to the next option
+        option_starts = _option_sequence(PDF_OPTION_RE, question_part) or _option_sequence(PDF_INLINE_OPTION_RE, question_part)
+        options = [
+            question_part[m.end():(option_starts[i + 1].start() if i + 1 < len(option_starts) else len(question_part))].strip()
+            for i, m in enumerate(option_starts)
+        ]
+        
+        # Clean question text (remove options)
+        clean_question = question_part[:option_starts[0].start()] if option_starts else question_part
+        clean_question = PDF_ID_LINE_RE.sub('', clean_question, count=1).strip()
+        if len(clean_question) <= 10:
+            return None
+        
+        correct = PDF_CORRECT_ANSWER_RE.search(body, answer_section.start()) if answer_section else None
+        return {
+            'id': f'pdf-{key}',
+            'question': clean_question,
+            'options': options,
+            'correct_answer': correct.group(1).strip() if correct else '',  # Empty needs manual review
+            'explanation': '',
+            'difficulty': 'M',
+            'module': 'math',  # Default, will need classification
+            'source': 'pdf'
+        }
     
-    def parse_csv(self, csv_path: str) -> List[Dict[str, Any]]:
+    def parse_csv(self, csv_path: str, chunksize: int = CSV_CHUNK_ROWS, raise_errors: bool = False, source: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Parse SAT questions from CSV files
         """
         print(f"📖 Parsing CSV: {csv_path}")
         
+        if _require('pandas', 'pandas') is None:
+            # _require has printed how to install it
+            if raise_errors:
+                raise ParseError('Missing required package: pip install pandas')
+            return []
+        
         questions = []
         
         try:
-            df = pd.read_csv(csv_path)
+            for chunk in self.iter_csv_chunks(csv_path, chunksize, source):
+                questions.extend(chunk)
             
-            # Common column names
-            question_cols = ['question', 'content', 'text', 'problem']
-            option_cols = ['options', 'choices', 'answers']
-            answer_cols = ['correct_answer', 'answer', 'solution']
-            difficulty_cols = ['difficulty', 'level']
-            module_cols = ['module', 'subject', 'category']
+            print(f"✅ Extracted {len(questions)} questions from CSV")
+            return questions
             
-            # Find actual column names
-            question_col = next((col for col in question_cols if col in df.columns), None)
-            options_col = next((col for col in option_cols if col in df.columns), None)
-            answer_col = next((col for col in answer_cols if col in df.columns), None)
-            difficulty_col = next((col for col in difficulty_cols if col in df.columns), None)
-            module_col = next((col for col in module_cols if col in df.columns), None)
+        except Exception as e:
+            return self._failed(f"Error parsing CSV: {e}", raise_errors)
+    
+    def iter_csv_chunks(self, csv_path: str, chunksize: int = CSV_CHUNK_ROWS, source: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield parsed CSV questions one chunk of rows at a time.
+        
+        Only the recognised columns are read, and each chunk is mapped column
+        by column, so memory is bounded by the chunk size, not the file size.
+        Cells are read as strings so values do not depend on per-chunk type
+        inference. Ids are csv-<source>-<row>.
+        """
+        source = source or source_name(Path(csv_path))
+        pd = _require('pandas', 'pandas')
+        if pd is None:
+            return
+        
+        header = pd.read_csv(csv_path, nrows=0).columns
+        
+        # Find actual column names
+        question_col = next((col for col in CSV_QUESTION_COLS if col in header), None)
+        options_col = next((col for col in CSV_OPTION_COLS if col in header), None)
+        answer_col = next((col for col in CSV_ANSWER_COLS if col in header), None)
+        difficulty_col = next((col for col in CSV_DIFFICULTY_COLS if col in header), None)
+        module_col = next((col for col in CSV_MODULE_COLS if col in header), None)
+        
+        if not question_col:
+            raise ValueError("No question column found in CSV")
+        
+        usecols = [col for col in (question_col, options_col, answer_col, difficulty_col, module_col) if col]
+        reader = pd.read_csv(csv_path, usecols=usecols, dtype=str, chunksize=chunksize)
+        for df in reader:
+            n = len(df)
+            ids = [f'csv-{source}-{index}' for index in df.index]
+            question_texts = df[question_col].astype(str).tolist()
             
-            if not question_col:
-                print("❌ No question column found in CSV")
-                return []
+            # Parse options
+            if options_col:
+                options = [_parse_options(value) for value in df[options_col].tolist()]
+            else:
+                options = [[] for _ in range(n)]
             
-            for index, row in df.iterrows():
-                question_text = str(row[question_col])
-                
-                # Parse options
-                options = []
-                if options_col and pd.notna(row[options_col]):
-                    if isinstance(row[options_col], str):
-                        # Try to parse JSON or comma-separated
-                        try:
-                            options = json.loads(row[options_col])
-                        except:
-                            options = [opt.strip() for opt in row[options_col].split(',') if opt.strip()]
-                    elif isinstance(row[options_col], list):
-                        options = row[options_col]
-                
-                # Get correct answer
-                correct_answer = ""
-                if answer_col and pd.notna(row[answer_col]):
-                    correct_answer = str(row[answer_col])
-                
-                # Get difficulty
-                difficulty = 'M'
-                if difficulty_col and pd.notna(row[difficulty_col]):
-                    diff = str(row[difficulty_col]).upper()
-                    if diff in ['E', 'EASY', '1']:
-                        difficulty = 'E'
-                    elif diff in ['H', 'HARD', '3']:
-                        difficulty = 'H'
-                
-                # Get module
-                module = 'math'
-                if module_col and pd.notna(row[module_col]):
-                    mod = str(row[module_col]).lower()
-                    if 'reading' in mod:
-                        module = 'reading'
-                    elif 'writing' in mod:
-                        module = 'writing'
-                    elif 'math' in mod:
-                        module = 'math'
-                
-                questions.append({
-                    'id': f'csv-{index}',
+            # Get correct answer
+            if answer_col:
+                correct_answers = df[answer_col].fillna('').tolist()
+            else:
+                correct_answers = [''] * n
+            
+            # Get difficulty
+            if difficulty_col:
+                difficulties = df[difficulty_col].str.upper().map(CSV_DIFFICULTY_CODES).fillna('M').tolist()
+            else:
+                difficulties = ['M'] * n
+            
+            # Get module
+            if module_col:
+                mod = df[module_col].str.lower()
+                modules = (pd.Series('math', index=df.index)
+                           .mask(mod.str.contains('writing', regex=False, na=False), 'writing')
+                           .mask(mod.str.contains('reading', regex=False, na=False), 'reading')
+                           .tolist())
+            else:
+                modules = ['math'] * n
+            
+            yield [
+                {
+                    'id': qid,
                     'question': question_text,
-                    'options': options,
+                    'options': opts,
                     'correct_answer': correct_answer,
                     'explanation': '',
                     'difficulty': difficulty,
                     'module': module,
                     'source': 'csv'
-                })
-            
-            print(f"✅ Extracted {len(questions)} questions from CSV")
-            return questions
-            
-        except Exception as e:
-            print(f"❌ Error parsing CSV: {e}")
-            return []
+                }
+                for qid, question_text, opts, correct_answer, difficulty, module
+                in zip(ids, question_texts, options, correct_answers, difficulties, modules)
+            ]
     
-    def parse_json(self, json_path: str) -> List[Dict[str, Any]]:
+    def parse_json(self, json_path: str, raise_errors: bool = False, source: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Parse SAT questions from JSON files
         """
         print(f"📖 Parsing JSON: {json_path}")
         
         try:
-            with open(json_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-            
-            questions = []
-            
-            # Handle different JSON structures
-            if isinstance(data, dict):
-                # OnePrep format
-                for question_id, question_data in data.items():
-                    questions.append(self._parse_oneprep_question(question_id, question_data))
-            elif isinstance(data, list):
-                # Array format
-                for i, question_data in enumerate(data):
-                    questions.append(self._parse_generic_question(f'json-{i}', question_data))
+            questions = list(self.iter_json(json_path, source))
             
             print(f"✅ Extracted {len(questions)} questions from JSON")
             return questions
             
         except Exception as e:
-            print(f"❌ Error parsing JSON: {e}")
-            return []
+            return self._failed(f"Error parsing JSON: {e}", raise_errors)
+    
+    def iter_json(self, json_path: str, source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield parsed JSON questions one at a time without loading the whole file
+        """
+        source = source or source_name(Path(json_path))
+        # Handle different JSON structures
+        for key, question_data in iter_json_items(json_path):
+            if isinstance(key, str):
+                # OnePrep format
+                yield self._parse_oneprep_question(key, question_data)
+            else:
+                # Array format
+                yield self._parse_generic_question(f'json-{source}-{key}', question_data)
     
     def _parse_oneprep_question(self, question_id: str, question_data: Dict[str, Any]) -> Dict[str, Any]:
         """Parse OnePrep format question"""
@@ -233,103 +477,506 @@ class SATQuestionParser:
             'source': 'json'
         }
     
-    def convert_to_prepify_format(self, questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def convert_to_prepify_format(self, questions: List[Dict[str, Any]], dedupe=None) -> List[Dict[str, Any]]:
         """
         Convert parsed questions to Prepify format
         """
         print("🔄 Converting to Prepify format...")
         
-        prepify_questions = []
+        return [self.to_prepify(question, dedupe) for question in questions]
+    
+    def convert_to_prepify_batch(self, questions: Iterable[Dict[str, Any]], dedupe=None) -> ColumnarBatch:
+        """
+        Convert parsed questions to Prepify format, stored column by column.
+        
+        Holds the same rows as convert_to_prepify_format without a dict per
+        question; save_to_json, save_to_store and save_to_copy read it directly.
+        """
+        print("🔄 Converting to Prepify format...")
         
+        batch = ColumnarBatch(PREPIFY_BATCH_SCHEMA)
         for question in questions:
-            prepify_question = {
-                'question_id': question['id'],
-                'external_id': None,
-                'skill_cd': '',
-                'skill_desc': '',
-                'primary_class_cd': '',
-                'primary_class_cd_desc': '',
-                'difficulty': question['difficulty'],
-                'module': question['module'],
-                'content': {
-                    'keys': [],
-                    'rationale': '',
-                    'question': question['question'],
-                    'options': question['options'],
-                    'correct_answer': question['correct_answer'],
-                    'explanation': question['explanation']
-                },
-                'program': 'SAT',
-                'score_band_range_cd': 5,
-                'active': True
-            }
-            
-            prepify_questions.append(prepify_question)
+            batch.append(self.to_prepify(question, dedupe))
+        return batch
+    
+    def to_prepify(self, question: Dict[str, Any], dedupe=None) -> Dict[str, Any]:
+        """
+        Convert one parsed question to Prepify format.
         
-        return prepify_questions
+        With a question_dedupe.NearDuplicateIndex, the question is indexed and
+        its cluster's canonical id is recorded as canonical_id.
+        """
+        prepify_question = {
+            'question_id': question['id'],
+            'external_id': None,
+            'skill_cd': '',
+            'skill_desc': '',
+            'primary_class_cd': '',
+            'primary_class_cd_desc': '',
+            'difficulty': question['difficulty'],
+            'module': question['module'],
+            'content': {
+                'keys': [],
+                'rationale': '',
+                'question': question['question'],
+                'options': question['options'],
+                'correct_answer': question['correct_answer'],
+                'explanation': question['explanation']
+            },
+            'program': 'SAT',
+            'score_band_range_cd': 5,
+            'active': True
+        }
+        if dedupe is not None:
+            from question_dedupe import question_text
+            prepify_question['canonical_id'] = dedupe.add(question['id'], question_text(question['question'], question['options']))
+        return prepify_question
     
-    def save_to_json(self, questions: List[Dict[str, Any]], output_path: str):
+    def save_to_json(self, questions: "List[Dict[str, Any]] | ColumnarBatch", output_path: str, output_format: str = 'json'):
         """
-        Save questions to JSON file
+        Save questions (a list, or a ColumnarBatch written row by row) as a JSON array, or in
+        another question_codec format (json-compact, qbin)
         """
         print(f"💾 Saving {len(questions)} questions to {output_path}")
         
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        with open(output_path, 'w', encoding='utf-8') as file:
-            json.dump(questions, file, indent=2, ensure_ascii=False)
+        with open_output(output_path, output_format) as file:
+            write_questions(file, questions, output_format, QBIN_SHARED_FIELDS)
         
         print(f"✅ Saved questions to {output_path}")
     
-    def parse_file(self, file_path: str) -> List[Dict[str, Any]]:
+    def save_stream_to_json(self, questions: Iterator[Dict[str, Any]], output_path: str, output_format: str = 'json') -> int:
+        """
+        Write questions to a file as they arrive, in the same layout as save_to_json.
+        
+        The output is written to a temporary file that replaces output_path only
+        once the stream is exhausted; nothing is written for an empty stream.
+        Returns the number of questions written.
+        """
+        print(f"💾 Streaming questions to {output_path}")
+        
+        # Create output directory if it doesn't exist
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        count = 0
+        try:
+            with open_output(tmp_path, output_format) as file:
+                writer = open_writer(file, output_format, QBIN_SHARED_FIELDS)
+                for question in questions:
+                    writer.write(question)
+                count = writer.close()
+            if count:
+                os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        if count:
+            print(f"✅ Saved {count} questions to {output_path}")
+        return count
+    
+    def save_to_store(self, questions: Iterable[Dict[str, Any]], store) -> int:
+        """
+        Upsert questions into a question_store.SQLiteQuestionStore in batches; closing the store commits them
+        """
+        print(f"🗄️  Upserting questions into {store.path}")
+        before = store.upserted
+        store.upsert_many(questions)
+        store.flush()
+        count = store.upserted - before
+        print(f"✅ Stored {count} questions in {store.path}")
+        return count
+    
+    def save_to_copy(self, questions: Iterable[Dict[str, Any]], outdir: str, copy_format: str = 'text') -> int:
+        """
+        Write Prepify questions as PostgreSQL COPY streams plus load.sql (see pg_copy.py)
+        """
+        from pg_copy import CopyWriter
+        print(f"🐘 Writing {copy_format} COPY streams to {outdir}")
+        with CopyWriter(outdir, copy_format) as writer:
+            count = writer.write_many(questions)
+        print(f"✅ Wrote {count} rows to {writer.paths['questions']}")
+        return count
+    
+    def parse_file(self, file_path: str, raise_errors: bool = False, source: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Parse a file based on its extension
+        Parse a file based on its extension.
+        
+        A file that cannot be parsed yields no questions and a ❌ message, or
+        raises ParseError when raise_errors is set. Generated ids include
+        source (default: the file's stem) so files parsed together do not
+        repeat them.
         """
         file_path = Path(file_path)
         
         if not file_path.exists():
-            print(f"❌ File not found: {file_path}")
-            return []
+            return self._failed(f"File not found: {file_path}", raise_errors)
         
         if file_path.suffix.lower() == '.pdf':
-            return self.parse_pdf(str(file_path))
+            return self.parse_pdf(str(file_path), raise_errors=raise_errors, source=source)
         elif file_path.suffix.lower() == '.csv':
-            return self.parse_csv(str(file_path))
+            return self.parse_csv(str(file_path), raise_errors=raise_errors, source=source)
         elif file_path.suffix.lower() == '.json':
-            return self.parse_json(str(file_path))
+            return self.parse_json(str(file_path), raise_errors=raise_errors, source=source)
         else:
-            print(f"❌ Unsupported file type: {file_path.suffix}")
-            return []
+            return self._failed(f"Unsupported file type: {file_path.suffix}", raise_errors)
+    
+    def iter_file(self, file_path: str, source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield questions from a file one at a time; JSON and CSV are read incrementally
+        """
+        suffix = Path(file_path).suffix.lower()
+        if suffix not in ('.json', '.csv') or not Path(file_path).exists():
+            yield from self.parse_file(file_path, source=source)
+            return
+        
+        print(f"📖 Streaming {suffix[1:].upper()}: {file_path}")
+        count = 0
+        try:
+            if suffix == '.json':
+                for question in self.iter_json(file_path, source):
+                    count += 1
+                    yield question
+            else:
+                for chunk in self.iter_csv_chunks(file_path, source=source):
+                    count += len(chunk)
+                    yield from chunk
+        except Exception as e:
+            print(f"❌ Error parsing {suffix[1:].upper()}: {e}")
+            raise
+        print(f"✅ Extracted {count} questions from {suffix[1:].upper()}")
+
+def collect_questions(sat_parser: SATQuestionParser, input_path: Path, jobs: int = 1) -> Optional[List[Dict[str, Any]]]:
+    """
+    Parse a file, or every supported file under a directory (None if the input does not exist)
+    """
+    files = input_files(input_path)
+    if files is None:
+        return None
+    
+    all_questions = []
+    for file_path, questions in iter_parsed_files(sat_parser, files, jobs, input_path):
+        all_questions.extend(questions)
+    
+    return all_questions
+
+def input_files(input_path: Path) -> Optional[List[Path]]:
+    """
+    The file itself, or every supported file under a directory in sorted order (None if the input does not exist)
+    """
+    if input_path.is_file():
+        # Single file
+        return [input_path]
+    if input_path.is_dir():
+        # Directory - parse all supported files
+        return sorted(file_path for file_path in input_path.rglob('*') if file_path.suffix.lower() in ['.pdf', '.csv', '.json'])
+    return None
+
+def stream_questions(sat_parser: SATQuestionParser, files: List[Path], output_format: str, jobs: int = 1, dedupe=None, root: Optional[Path] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Questions from every file in order, converted one at a time; ids are namespaced by each file's path under root
+    """
+    if jobs > 1:
+        parsed = (question for _, questions in iter_parsed_files(sat_parser, files, jobs, root) for question in questions)
+    else:
+        parsed = (question for file_path in files for question in sat_parser.iter_file(str(file_path), source_name(file_path, root)))
+    for question in parsed:
+        yield sat_parser.to_prepify(question, dedupe) if output_format == 'prepify' else question
+
+def _parse_file_job(file_path: str, source: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pool worker: parse one file, keeping its messages out of the shared terminal
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            questions = SATQuestionParser().parse_file(file_path, raise_errors=True, source=source)
+    except ParseError as e:
+        return {'questions': [], 'error': str(e)}
+    except Exception as e:
+        return {'questions': [], 'error': f'{type(e).__name__}: {e}'}
+    return {'questions': questions, 'error': None}
+
+class FileProgress:
+    """
+    Per-file progress lines with a running files/s rate
+    """
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed: List[Tuple[str, str]] = []
+        self.started = time.perf_counter()
+        # Updated from the pool's result thread and the main thread
+        self._lock = threading.Lock()
+    
+    def update(self, file_path: str, result: Dict[str, Any]):
+        with self._lock:
+            self.done += 1
+            rate = self.done / max(time.perf_counter() - self.started, 1e-9)
+            name = Path(file_path).name
+            if result['error']:
+                self.failed.append((file_path, result['error']))
+                print(f"❌ [{self.done}/{self.total}] {name}: {result['error']} ({rate:.1f} files/s)")
+            else:
+                print(f"📄 [{self.done}/{self.total}] {name}: {len(result['questions'])} questions ({rate:.1f} files/s)")
+    
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        print(f"📦 Parsed {self.done} files in {elapsed:.1f}s ({self.done / max(elapsed, 1e-9):.1f} files/s), {len(self.failed)} failed")
+        for file_path, error in self.failed:
+            print(f"   ❌ {file_path}: {error}")
+
+def iter_parsed_files(sat_parser: SATQuestionParser, files: List[Path], jobs: int = 1, root: Optional[Path] = None) -> Iterator[Tuple[Path, List[Dict[str, Any]]]]:
+    """
+    Yield (file, questions) in file order, parsing in a pool of `jobs` processes when jobs > 1.
+    Generated ids are namespaced by each file's path under root (see source_name).
+    
+    Results are merged in the order of `files` whatever order workers finish
+    in. A file that raises, or whose worker crashes, contributes no questions
+    and is listed in the summary instead of aborting the run. A crash breaks
+    the whole pool, so the files it took down are re-run one at a time in a
+    single-worker pool, where a second crash can only be that file's.
+    """
+    if jobs <= 1:
+        for file_path in files:
+            yield file_path, sat_parser.parse_file(str(file_path), source=source_name(file_path, root))
+        return
+    
+    progress = FileProgress(len(files))
+    
+    def on_done(file_path: str, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            progress.update(file_path, future.result())
+    
+    retry_pool = None
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for file_path in files:
+            future = pool.submit(_parse_file_job, str(file_path), source_name(file_path, root))
+            future.add_done_callback(lambda future, file_path=str(file_path): on_done(file_path, future))
+            futures.append(future)
+        for file_path, future in zip(files, futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                retry_pool = retry_pool or ProcessPoolExecutor(max_workers=1)
+                try:
+                    result = retry_pool.submit(_parse_file_job, str(file_path), source_name(file_path, root)).result()
+                except BrokenProcessPool:
+                    result = {'questions': [], 'error': 'worker process crashed'}
+                    retry_pool.shutdown()
+                    retry_pool = None
+                progress.update(str(file_path), result)
+            except Exception as e:
+                result = {'questions': [], 'error': f'{type(e).__name__}: {e}'}
+                progress.update(str(file_path), result)
+            yield file_path, result['questions']
+    if retry_pool is not None:
+        retry_pool.shutdown()
+    progress.summary()
+
+def serve(sat_parser: SATQuestionParser, default_format: str, default_output_format: str = 'json'):
+    """
+    Persistent mode: handle many inputs in one process.
+    
+    Reads one request per stdin line, either a bare input path or a JSON
+    object {"input": ..., "output": ..., "format": ..., "output_format": ...}, and answers each with
+    one JSON line on stdout. Without "output" the questions are returned in the
+    response. Progress messages go to stderr.
+    """
+    print(json.dumps({'ready': True, 'startup_ms': round(1000 * (time.perf_counter() - _START), 1)}), flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line) if line.startswith('{') else {'input': line}
+        except json.JSONDecodeError as e:
+            print(json.dumps({'ok': False, 'error': f'Invalid request: {e}'}), flush=True)
+            continue
+        started = time.perf_counter()
+        imported_before = set(IMPORT_TIMES)
+        response: Dict[str, Any] = {'input': request.get('input')}
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                questions = collect_questions(sat_parser, Path(request['input']))
+                if questions is None:
+                    raise FileNotFoundError(f"Input not found: {request['input']}")
+                if request.get('format', default_format) == 'prepify':
+                    questions = sat_parser.convert_to_prepify_format(questions)
+                if request.get('output'):
+                    sat_parser.save_to_json(questions, request['output'], request.get('output_format', default_output_format))
+            response.update(ok=True, count=len(questions))
+            if request.get('output'):
+                response['output'] = request['output']
+            else:
+                response['questions'] = questions
+        except Exception as e:
+            response.update(ok=False, error=str(e))
+        response['seconds'] = round(time.perf_counter() - started, 4)
+        response['imports'] = {name: round(t, 4) for name, t in IMPORT_TIMES.items() if name not in imported_before}
+        print(json.dumps(response, ensure_ascii=False), flush=True)
+
+def near_duplicate_index(threshold: float):
+    """
+    A question_dedupe.NearDuplicateIndex (needs numpy), or None with a message when unavailable
+    """
+    try:
+        from question_dedupe import NearDuplicateIndex
+        return NearDuplicateIndex(threshold=threshold)
+    except (ImportError, RuntimeError) as e:
+        print(f"❌ Near-duplicate detection unavailable: {e}")
+        return None
+
+def open_question_store(spec: str):
+    """
+    The question_store.SQLiteQuestionStore named by --store, or None with a message when it cannot be opened
+    """
+    try:
+        from question_store import open_store
+        return open_store(spec)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ Cannot open store: {e}")
+        return None
+
+def tee_questions(questions: Iterator[Dict[str, Any]], sinks: List[Callable[[Dict[str, Any]], None]]) -> Iterator[Dict[str, Any]]:
+    """
+    Pass questions through unchanged while handing each to every sink (store upsert, COPY writer)
+    """
+    for question in questions:
+        for sink in sinks:
+            sink(question)
+        yield question
+
+def report_near_duplicates(dedupe):
+    """
+    Summarise the clusters found by --dedupe
+    """
+    clusters = dedupe.clusters()
+    print(f"🔁 Near-duplicates: {dedupe.duplicates} of {len(dedupe.ids)} questions folded into {len(clusters)} clusters")
+
+def report_timings():
+    """
+    Print startup and lazy import timings to stderr
+    """
+    imports = ', '.join(f'{name} {1000 * t:.0f} ms' for name, t in IMPORT_TIMES.items()) or 'none'
+    print(f"⏱️  Total {1000 * (time.perf_counter() - _START):.0f} ms since startup; lazy imports: {imports}", file=sys.stderr)
 
 def main():
     parser = argparse.ArgumentParser(description='Parse SAT questions from various sources')
-    parser.add_argument('input', help='Input file or directory')
+    parser.add_argument('input', nargs='?', help='Input file or directory')
     parser.add_argument('-o', '--output', default='scripts/data/parsed-questions.json', 
-                       help='Output JSON file path')
+                       help='Output file path (a JSON array unless --output-format says otherwise)')
     parser.add_argument('--format', choices=['prepify', 'raw'], default='prepify',
                        help='Output format')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='json',
+                       help='Encoding of the output file: indented JSON array, compact JSON array, or qbin binary records (see scripts/question_codec.py)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Parse files in N worker processes (0 = one per CPU)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Parse and write one question at a time (JSON and CSV inputs are read incrementally)')
+    parser.add_argument('--dedupe', action='store_true',
+                       help='Cluster near-duplicate questions (MinHash/LSH) and record each one\'s canonical_id (prepify format)')
+    parser.add_argument('--dedupe-threshold', type=float, default=0.8,
+                       help='Estimated Jaccard similarity at which two questions are near-duplicates')
+    parser.add_argument('--store', metavar='sqlite:PATH',
+                       help='Also upsert questions into an indexed SQLite store (see scripts/question_store.py)')
+    parser.add_argument('--copy', metavar='DIR',
+                       help='Also write PostgreSQL COPY streams and a load.sql for the questions table (prepify format)')
+    parser.add_argument('--copy-format', choices=['text', 'csv'], default='text',
+                       help='COPY stream format for --copy')
+    parser.add_argument('--serve', action='store_true',
+                       help='Persistent mode: read one input (path or JSON request) per stdin line, answer with JSON lines')
+    parser.add_argument('--timings', action='store_true',
+                       help='Report startup and dependency import time on stderr')
     
     args = parser.parse_args()
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.timings:
+        print(f"⏱️  Startup {1000 * (time.perf_counter() - _START):.0f} ms (imports and argument parsing)", file=sys.stderr)
+    
+    if args.serve:
+        # serve() answers each request on its own; these act on a whole run
+        unsupported = [flag for flag, value in (('--dedupe', args.dedupe), ('--store', args.store), ('--copy', args.copy)) if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --serve")
+    if args.dedupe and args.format != 'prepify':
+        # canonical_id is only recorded on Prepify rows, so raw output would silently ignore it
+        parser.error('--dedupe records canonical_id on Prepify rows; use it with --format prepify')
     
     # Initialize parser
     sat_parser = SATQuestionParser()
+    dedupe = None
+    if args.dedupe:
+        dedupe = near_duplicate_index(args.dedupe_threshold)
+        if dedupe is None:
+            sys.exit(1)
+    
+    if args.serve:
+        serve(sat_parser, args.format, args.output_format)
+        if args.timings:
+            report_timings()
+        return
+    if not args.input:
+        parser.error('input is required unless --serve is given')
+    if args.copy and args.format != 'prepify':
+        parser.error('--copy writes Prepify rows; use it with --format prepify')
+    store = None
+    if args.store:
+        store = open_question_store(args.store)
+        if store is None:
+            sys.exit(1)
     
     # Parse input
     input_path = Path(args.input)
-    all_questions = []
-    
-    if input_path.is_file():
-        # Single file
-        questions = sat_parser.parse_file(str(input_path))
-        all_questions.extend(questions)
-    elif input_path.is_dir():
-        # Directory - parse all supported files
-        for file_path in input_path.rglob('*'):
-            if file_path.suffix.lower() in ['.pdf', '.csv', '.json']:
-                questions = sat_parser.parse_file(str(file_path))
-                all_questions.extend(questions)
-    else:
+    if args.stream:
+        files = input_files(input_path)
+        if files is None:
+            print(f"❌ Input not found: {input_path}")
+            sys.exit(1)
+        questions = stream_questions(sat_parser, files, args.format, args.jobs, dedupe, input_path)
+        copy_writer = None
+        sinks = []
+        if store is not None:
+            sinks.append(store.upsert)
+        if args.copy:
+            from pg_copy import CopyWriter
+            copy_writer = CopyWriter(args.copy, args.copy_format)
+            sinks.append(copy_writer.write)
+        if sinks:
+            questions = tee_questions(questions, sinks)
+        try:
+            count = sat_parser.save_stream_to_json(questions, args.output, args.output_format)
+        except Exception as e:
+            if copy_writer is not None:
+                copy_writer.close(commit=False)
+            if store is not None:
+                store.close(commit=False)
+            print(f"❌ Streaming aborted, {args.output} left unchanged: {e}")
+            sys.exit(1)
+        if store is not None:
+            store.close()
+        if copy_writer is not None:
+            copy_writer.close(commit=count > 0)
+        if not count:
+            print("❌ No questions found!")
+            sys.exit(1)
+        if dedupe is not None and args.format == 'prepify':
+            report_near_duplicates(dedupe)
+        print(f"\n🎉 Successfully parsed {count} questions!")
+        print(f"📁 Output saved to: {args.output}")
+        if store is not None:
+            print(f"🗄️  Stored {store.upserted} questions in {store.path}")
+        if copy_writer is not None:
+            print(f"🐘 COPY streams and load.sql written to {args.copy}")
+        if args.timings:
+            report_timings()
+        return
+    all_questions = collect_questions(sat_parser, input_path, args.jobs)
+    if all_questions is None:
         print(f"❌ Input not found: {input_path}")
         sys.exit(1)
     
@@ -341,13 +988,30 @@ def main():
     
     # Convert to Prepify format if requested
     if args.format == 'prepify':
-        all_questions = sat_parser.convert_to_prepify_format(all_questions)
+        all_questions = sat_parser.convert_to_prepify_batch(all_questions, dedupe)
+        if dedupe is not None:
+            report_near_duplicates(dedupe)
     
     # Save to output file
-    sat_parser.save_to_json(all_questions, args.output)
+    sat_parser.save_to_json(all_questions, args.output, args.output_format)
+    if store is not None:
+        try:
+            with store:
+                sat_parser.save_to_store(all_questions, store)
+        except ValueError as e:
+            print(f"❌ Store not updated: {e}")
+            sys.exit(1)
+    if args.copy:
+        try:
+            sat_parser.save_to_copy(all_questions, args.copy, args.copy_format)
+        except ValueError as e:
+            print(f"❌ COPY streams not written: {e}")
+            sys.exit(1)
     
     print(f"\n🎉 Successfully parsed {len(all_questions)} questions!")
     print(f"📁 Output saved to: {args.output}")
+    if args.timings:
+        report_timings()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
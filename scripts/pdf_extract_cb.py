@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import codecs
+import hashlib
+import io
 import json
 import os
+import queue
 import re
+import shutil
 import sys
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Tuple, Dict, Any
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import List, Optional, Tuple, Dict, Any, Iterable, Iterator, Deque, Union
 import subprocess
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from question_batch import ColumnarBatch
+from question_codec import open_output, open_writer, read_questions, shared_fields, write_questions
 
 try:
     import pdfplumber  # type: ignore
@@ -19,6 +35,19 @@ try:
 except Exception:
     fitz = None
 
+# Optional: WebP/optimized PNG encoding and downscaling of exported images
+try:
+    from PIL import Image, features as pil_features
+except Exception:
+    Image = None
+    pil_features = None
+
+# Optional: peak RSS for --profile (not available on Windows)
+try:
+    import resource
+except Exception:
+    resource = None
+
 
 # Match question headers but avoid matching the answer section header
 # Group1: from "Question ID <id>", Group2: from "ID: <id>" not followed by "Answer"
@@ -28,6 +57,34 @@ ANS_RE = re.compile(r'ID\s*:\s*([0-9a-f]{8})\s*Answer[\s\S]{0,300}?Correct\s*Ans
 CHOICES_RE = re.compile(r'(?m)^(?:\(?([A-D])\)?[\.)]\s+)(.+?)(?=\n\(?[A-D]\)?[\.)]\s+|\nID\s*:|\nCorrect\s*Answer|\Z)', re.S)
 LABEL_RE = re.compile(r"\b(Assessment|Test|Domain|Skill|Difficulty)\b", re.I)
 TOK_INLINE = re.compile(r'(?<![A-Za-z0-9])(?:\(?([A-D])\)?[.)])\s+', re.I)
+PAGE_MARKER_RE = re.compile(r"\[\[PAGE:(\d+)\]\]")
+# Whitespace that may also cross a page marker (markers become newlines in block text)
+_WS = r"(?:\s|\[\[PAGE:\d+\]\])*"
+# One alternation for lex_tokens (driven by iter_block_views); the qid branch is QID_RE plus an optional answer suffix,
+# or an ANS_RE answer header whose "ID: <qid>" a page marker splits (not a QID_RE header).
+# Every branch consumes its first character through the leading class so the scan can skip
+# ahead on that class instead of trying each branch at every offset.
+TOKEN_RE = re.compile(
+    r"[\[QqIiCc](?:"
+    r"(?P<page>(?<=\[)\[PAGE:(?P<pno>\d+)\]\])"
+    r"|(?P<qid>(?:(?<=[Qq])uestion\s+(?P<kw>ID)|(?<=[Ii])(?<!\w\w)D)(?:\s*(?P<sep>[:\-])\s*(?P<qid_id>[0-9a-f]{8})\b(?P<ans>" + _WS + r"Answer)?"
+    r"|" + _WS + r":" + _WS + r"(?P<split_id>[0-9a-f]{8})\b" + _WS + r"Answer))"
+    r"|(?P<correct>(?<=[Cc])orrect" + _WS + r"Answer" + _WS + r":" + _WS + r"(?P<val>[A-D0-9\.\-/]+))"
+    r")",
+    re.I,
+)
+# Cheap per-block checks: no match means extract_labels (which only reads the block's head) or the
+# choice parsers cannot match either. CHOICE_HINT_RE opens on the label so the scan can skip ahead
+# on it; the lookbehind then rejects a label glued to the word before it.
+LABEL_HINT_RE = re.compile(r"assessment|\b(?:test|domain|skill|difficulty)\b\s*:", re.I)
+CHOICE_HINT_RE = re.compile(r"[A-D](?<![A-Za-z0-9].)\)?[.)]\s", re.I)
+LINE_BREAK_RE = re.compile(r"[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+# Bump whenever page text extraction/normalization changes so cached pages are not reused
+EXTRACTOR_VERSION = "2"
+# Bump whenever block parsing changes so incremental runs re-parse every question
+PARSER_VERSION = "2"
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "prepify", "pdf_extract_cb")
 
 
 def normalize_text(s: str) -> str:
@@ -60,13 +117,17 @@ def map_difficulty(raw: str) -> str:
     return "Medium"
 
 
-@dataclass
+# __slots__ instances (no per-object __dict__) where dataclasses support it (Python 3.10+)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class Choice:
     label: str
     text: str
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class CBQuestion:
     id: str
     assessment: str
@@ -81,6 +142,28 @@ class CBQuestion:
     rationale: Optional[str]
     images: List[str]
     pages: List[int]
+    thumbnails: List[str] = field(default_factory=list)
+
+
+# Output row keys in declaration order (the JSON layout the importer reads)
+CB_ROW_FIELDS = tuple(f.name for f in fields(CBQuestion))
+CB_QUESTION_FIELDS = frozenset(CB_ROW_FIELDS)
+# Columns of question_to_dict rows for question_batch.ColumnarBatch; canonical_id is added by --near-dupes
+CB_BATCH_SCHEMA = [
+    ("id", "value"), ("assessment", "category"), ("test", "category"), ("domain", "category"), ("skill", "category"),
+    ("difficulty", "category"), ("number", "category"), ("stem", "value"), ("choices", "records", ("label", "text")),
+    ("answer", "category"), ("rationale", "value"), ("images", "list"), ("pages", "list"), ("thumbnails", "list"),
+    ("canonical_id", "value"),
+]
+# Fields whose values --format qbin stores once per file
+CB_SHARED_FIELDS = shared_fields(CB_BATCH_SCHEMA)
+# --format -> extension of --batch per-document outputs
+OUTPUT_EXTENSIONS = {"json": "json", "json-compact": "json", "qbin": "qbin", "ndjson": "ndjson"}
+
+
+def intern_or_none(value: Optional[str]) -> Optional[str]:
+    """Intern a categorical string so every question shares one copy."""
+    return sys.intern(value) if value is not None else None
 
 
 def group_lines(words: List[Dict[str, Any]]) -> List[str]:
@@ -119,75 +202,662 @@ def extract_page_lines(pl_page) -> List[str]:
     return lines
 
 
-def get_page_text(pl_page, pno: int, fitz_doc=None) -> str:
-    # Gather text from both pdfplumber and fitz, then merge
-    plumber_text = ""
-    try:
-        plumber_text = pl_page.extract_text(layout=True) or ""
-    except Exception:
-        plumber_text = ""
-
-    fitz_text = ""
-    if fitz_doc is not None:
+def count_pages(pdf_path: str) -> int:
+    if fitz is not None:
         try:
-            page = fitz_doc[pno - 1]
-            blocks = page.get_text("blocks")  # list of (x0,y0,x1,y1, text, block_no, ...)
-            blocks_sorted = sorted(blocks, key=lambda b: (b[1], b[0]))
-            fitz_text = "\n".join([b[4] for b in blocks_sorted if b[4]])
+            with fitz.open(pdf_path) as doc:
+                return len(doc)
         except Exception:
-            fitz_text = ""
+            pass
+    if pdfplumber is not None:
+        with pdfplumber.open(pdf_path) as pl:
+            return len(pl.pages)
+    proc = subprocess.run(['pdfinfo', pdf_path], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    m = re.search(r"^Pages:\s*(\d+)", proc.stdout.decode('utf-8', errors='ignore'), re.M)
+    return int(m.group(1)) if m else 0
+
+
+def page_chunks(n_pages: int, chunk_size: int) -> List[Tuple[int, int]]:
+    # Inclusive 1-based (first, last) ranges covering every page
+    chunk_size = max(1, chunk_size)
+    return [(first, min(first + chunk_size - 1, n_pages)) for first in range(1, n_pages + 1, chunk_size)]
+
+
+def iter_pdftotext_pages(pdf_path: str, first: int, last: int, bufsize: int = 1 << 16) -> Iterator[Tuple[int, str]]:
+    """Yield raw pdftotext output for pages first..last one page at a time, split on form feeds."""
+    proc = subprocess.Popen([
+        'pdftotext', '-layout', '-f', str(first), '-l', str(last), pdf_path, '-'  # output to stdout with layout
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    pno = first
+    pending: List[str] = []
+    try:
+        while True:
+            data = proc.stdout.read1(bufsize)
+            if not data:
+                break
+            # Form feed terminates each page
+            *done, rest = decoder.decode(data).split('\f')
+            for part in done:
+                pending.append(part)
+                yield pno, "".join(pending)
+                pending = []
+                pno += 1
+            pending.append(rest)
+        tail = "".join(pending) + decoder.decode(b'', final=True)
+        if tail.strip() and pno <= last:
+            yield pno, tail
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, 'pdftotext')
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
 
-    page_text = plumber_text + ("\n" if plumber_text and fitz_text else "") + fitz_text
-    # Normalize hyphenated line breaks word-\nword -> wordword
-    page_text = re.sub(r"(\w)-\n(\w)", r"\1\2", page_text)
-    return page_text
 
+class TextBackend:
+    """Turns pages first..last into (page, text) for iter_page_range; text is None for a blank page."""
 
-def build_document_text(math_path: str, rw_path: str) -> Dict[str, Dict[str, Any]]:
-    docs: Dict[str, Dict[str, Any]] = {}
-    for test_name, pdf_path in [("Math", math_path), ("Reading and Writing", rw_path)]:
-        doc_str_parts: List[str] = []
-        fitz_doc = None
-        if fitz is not None:
-            try:
-                fitz_doc = fitz.open(pdf_path)
-            except Exception:
-                fitz_doc = None
-        # First try pdftotext for robust text
-        text_by_pages: List[str] = []
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    def iter_pages(self, pdf_path: str, first: int, last: int) -> Iterator[Tuple[int, Optional[str]]]:
+        raise NotImplementedError
+
+
+class PdftotextBackend(TextBackend):
+    name = "pdftotext"
+
+    def available(self) -> bool:
+        return shutil.which("pdftotext") is not None
+
+    def iter_pages(self, pdf_path: str, first: int, last: int) -> Iterator[Tuple[int, Optional[str]]]:
+        for pno, part in iter_pdftotext_pages(pdf_path, first, last):
+            yield pno, normalize_text(part) if part.strip() else None
+
+
+class PdfplumberBackend(TextBackend):
+    name = "pdfplumber"
+
+    def available(self) -> bool:
+        return pdfplumber is not None
+
+    def iter_pages(self, pdf_path: str, first: int, last: int) -> Iterator[Tuple[int, Optional[str]]]:
+        with pdfplumber.open(pdf_path) as pl:
+            for pno in range(first, last + 1):
+                txt = pl.pages[pno - 1].extract_text(layout=True) or ""
+                # Normalize hyphenated line breaks word-\nword -> wordword
+                yield pno, normalize_text(re.sub(r"(\w)-\n(\w)", r"\1\2", txt))
+
+
+class PyMuPDFBackend(TextBackend):
+    """Word-level PyMuPDF engine: one get_text("words") call per page, lines rebuilt with group_lines."""
+
+    name = "pymupdf"
+
+    def available(self) -> bool:
+        return fitz is not None
+
+    @staticmethod
+    def page_words(page) -> List[Dict[str, Any]]:
+        words: List[Dict[str, Any]] = []
+        line_numbers: Dict[Tuple[int, int], int] = {}
+        for x0, y0, x1, y1, text, block_no, line_no, _ in page.get_text("words"):
+            # Number lines in reading order across blocks
+            line = line_numbers.setdefault((block_no, line_no), len(line_numbers))
+            words.append({"text": text, "x0": x0, "x1": x1, "top": y0, "bottom": y1, "line_number": line})
+        return words
+
+    def iter_words(self, pdf_path: str, first: int, last: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        with fitz.open(pdf_path) as doc:
+            for pno in range(first, last + 1):
+                yield pno, self.page_words(doc[pno - 1])
+
+    def iter_pages(self, pdf_path: str, first: int, last: int) -> Iterator[Tuple[int, Optional[str]]]:
+        for pno, words in self.iter_words(pdf_path, first, last):
+            yield pno, normalize_text("\n".join(group_lines(words)))
+
+
+TEXT_BACKENDS: Dict[str, TextBackend] = {b.name: b for b in (PdftotextBackend(), PyMuPDFBackend(), PdfplumberBackend())}
+
+
+def text_backends(backend: str = "auto") -> List[str]:
+    # Backends iter_page_range may use, in the order it tries them
+    if backend != "auto":
+        return [backend]
+    return [name for name, b in TEXT_BACKENDS.items() if b.available()]
+
+
+def iter_page_range(pdf_path: str, first: int, last: int, backend: str = "auto") -> Iterator[Tuple[int, Optional[str], str, float]]:
+    """Yield normalized (page, text, backend, seconds) for pages first..last; "auto" falls through to the next backend."""
+    names = text_backends(backend)
+    if not names:
+        raise RuntimeError("No text backend available (install poppler-utils, PyMuPDF or pdfplumber)")
+    done = first - 1
+    for i, name in enumerate(names):
+        blanks: List[Tuple[int, float]] = []
+        pages = TEXT_BACKENDS[name].iter_pages(pdf_path, done + 1, last)
         try:
-            proc = subprocess.run([
-                'pdftotext', '-layout', pdf_path, '-'  # output to stdout with layout
-            ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            raw = proc.stdout.decode('utf-8', errors='ignore')
-            # Split by form feed to detect pages
-            parts = raw.split('\f')
-            for idx, part in enumerate(parts, start=1):
-                if not part.strip():
+            while True:
+                started = time.perf_counter()
+                try:
+                    pno, txt = next(pages)
+                except StopIteration:
+                    break
+                seconds = time.perf_counter() - started
+                if txt is None:
+                    blanks.append((pno, seconds))
                     continue
-                text_by_pages.append(part)
+                # Leading blanks are only reported once the backend proves useful
+                for bno, bsec in blanks:
+                    yield bno, None, name, bsec
+                blanks = []
+                done = pno
+                yield pno, txt, name, seconds
         except Exception:
-            text_by_pages = []
-
-        if not text_by_pages:
-            # Fallback to pdfplumber/PyMuPDF merge
-            with pdfplumber.open(pdf_path) as pl:
-                for pno, pl_page in enumerate(pl.pages, start=1):
-                    marker = f"\n[[PAGE:{pno}]]\n"
-                    doc_str_parts.append(marker)
-                    txt = get_page_text(pl_page, pno, fitz_doc)
-                    txt = normalize_text(txt)
-                    doc_str_parts.append(txt + "\n")
-        else:
-            for pno, part in enumerate(text_by_pages, start=1):
-                marker = f"\n[[PAGE:{pno}]]\n"
-                doc_str_parts.append(marker)
-                doc_str_parts.append(normalize_text(part) + "\n")
-        full_text = "".join(doc_str_parts)
-        docs[test_name] = {"text": full_text, "pdf_path": pdf_path}
+            if i == len(names) - 1:
+                raise
+            continue
+        finally:
+            pages.close()
+        if done >= first:
+            for bno, bsec in blanks:
+                yield bno, None, name, bsec
+            return
+    # Every backend came up blank: report the pages so they are cached as skipped
+    for pno in range(done + 1, last + 1):
+        yield pno, None, names[-1], 0.0
+
+
+def extract_page_range(pdf_path: str, first: int, last: int, backend: str = "auto") -> List[Tuple[int, Optional[str], str, float]]:
+    """Process-pool task wrapper around iter_page_range."""
+    return list(iter_page_range(pdf_path, first, last, backend))
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class PageTextCache:
+    """On-disk cache of extracted page text per PDF hash and backend, evicted LRU by mtime."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _dir(self, sha: str, backend: str) -> str:
+        return os.path.join(self.root, sha[:2], sha, f"{backend}-v{EXTRACTOR_VERSION}")
+
+    def get(self, sha: str, pno: int, backends: List[str]) -> Optional[Tuple[Optional[str], str]]:
+        for backend in backends:
+            base = os.path.join(self._dir(sha, backend), str(pno))
+            for path, skip in ((base + ".txt", False), (base + ".skip", True)):
+                try:
+                    if skip:
+                        os.utime(path)
+                        return None, backend
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                    os.utime(path)
+                    return text, backend
+                except OSError:
+                    continue
+        return None
+
+    def get_range(self, sha: str, first: int, last: int, backends: List[str]) -> Optional[List[Tuple[int, Optional[str], str, Optional[float]]]]:
+        # Same tuples as iter_page_range; seconds is None as nothing was extracted
+        pages: List[Tuple[int, Optional[str], str, Optional[float]]] = []
+        for pno in range(first, last + 1):
+            hit = self.get(sha, pno, backends)
+            if hit is None:
+                self.misses += 1
+                return None
+            pages.append((pno, hit[0], hit[1], None))
+        self.hits += 1
+        return pages
+
+    def put(self, sha: str, pno: int, text: Optional[str], backend: str) -> None:
+        d = self._dir(sha, backend)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f"{pno}.skip" if text is None else f"{pno}.txt")
+        # Write-then-rename so concurrent runs never read a partial entry
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text or "")
+        os.replace(tmp, path)
+
+    def evict(self) -> None:
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        # Oldest access first
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def iter_document_pages(sources: List[Tuple[str, str]], workers: int = 1, chunk_pages: int = 16, cache: Optional[PageTextCache] = None, backend: str = "auto") -> Iterator[Tuple[str, int, Optional[str], str, Optional[float]]]:
+    """Yield (name, page, text, backend, seconds) for every page of every (name, pdf_path) source, in order."""
+    tasks: List[Tuple[str, str, str, int, int]] = []
+    for name, pdf_path in sources:
+        sha = sha256_file(pdf_path) if cache is not None else ""
+        for first, last in page_chunks(count_pages(pdf_path), chunk_pages):
+            tasks.append((name, pdf_path, sha, first, last))
+    backends = text_backends(backend)
+
+    def cached(sha: str, first: int, last: int) -> Optional[List[Tuple[int, Optional[str], str, Optional[float]]]]:
+        return cache.get_range(sha, first, last, backends) if cache is not None else None
+
+    def emit(name: str, sha: str, pages: Iterable[Tuple[int, Optional[str], str, Optional[float]]], store: bool) -> Iterator[Tuple[str, int, Optional[str], str, Optional[float]]]:
+        for pno, txt, used, seconds in pages:
+            if store and cache is not None:
+                cache.put(sha, pno, txt, used)
+            yield name, pno, txt, used, seconds
+
+    if workers <= 1 or len(tasks) <= 1:
+        for name, pdf_path, sha, first, last in tasks:
+            hit = cached(sha, first, last)
+            if hit is not None:
+                yield from emit(name, sha, hit, False)
+            else:
+                yield from emit(name, sha, iter_page_range(pdf_path, first, last, backend), True)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def schedule(task: Tuple[str, str, str, int, int]) -> Tuple[str, str, Any]:
+            name, pdf_path, sha, first, last = task
+            hit = cached(sha, first, last)
+            if hit is not None:
+                return name, sha, hit
+            return name, sha, pool.submit(extract_page_range, pdf_path, first, last, backend)
+
+        remaining = iter(tasks)
+        in_flight: Deque[Tuple[str, str, Any]] = deque()
+        for task in islice(remaining, 2 * workers):
+            in_flight.append(schedule(task))
+        while in_flight:
+            name, sha, pending = in_flight.popleft()
+            is_future = isinstance(pending, Future)
+            pages = pending.result() if is_future else pending
+            nxt = next(remaining, None)
+            if nxt is not None:
+                in_flight.append(schedule(nxt))
+            yield from emit(name, sha, pages, is_future)
+
+
+def join_pages(pages: Iterable[Tuple[int, str]]) -> str:
+    """[[PAGE:n]]-marked document text from its non-blank (page, text) pairs."""
+    return "".join(f"\n[[PAGE:{pno}]]\n{txt}\n" for pno, txt in pages)
+
+
+def stream_texts(sources: List[Tuple[str, str]], workers: int = 1, chunk_pages: int = 16, cache: Optional[PageTextCache] = None, backend: str = "auto", docs: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Tuple[str, Iterator[Tuple[int, str]]]]:
+    """Yield (name, pages) for each (name, pdf_path) source in order, pages coming straight off iter_document_pages."""
+    docs = {} if docs is None else docs
+    it = iter_document_pages(sources, workers=workers, chunk_pages=chunk_pages, cache=cache, backend=backend)
+    head = [next(it, None)]
+
+    def pages(name: str) -> Iterator[Tuple[int, str]]:
+        timings = docs[name]["timings"]
+        while head[0] is not None and head[0][0] == name:
+            _, pno, txt, used, seconds = head[0]
+            head[0] = next(it, None)
+            if seconds is not None:
+                timings.append({"page": pno, "backend": used, "seconds": seconds})
+            if txt is not None:
+                yield pno, txt
+
+    try:
+        for name, pdf_path in sources:
+            docs[name] = {"pdf_path": pdf_path, "timings": []}
+            yield name, pages(name)
+            for _ in pages(name):
+                pass
+    finally:
+        it.close()
+    if cache is not None:
+        cache.evict()
+
+
+def build_texts(sources: List[Tuple[str, str]], workers: int = 1, chunk_pages: int = 16, cache: Optional[PageTextCache] = None, backend: str = "auto") -> Dict[str, Dict[str, Any]]:
+    """Assemble [[PAGE:n]]-marked text and page timings for each (name, pdf_path) source, keyed by name."""
+    docs: Dict[str, Dict[str, Any]] = {}
+    for name, pages in stream_texts(sources, workers=workers, chunk_pages=chunk_pages, cache=cache, backend=backend, docs=docs):
+        docs[name]["text"] = join_pages(pages)
     return docs
 
 
+def build_document_text(math_path: str, rw_path: str, workers: int = 1, chunk_pages: int = 16, cache: Optional[PageTextCache] = None, backend: str = "auto") -> Dict[str, Dict[str, Any]]:
+    return build_texts([("Math", math_path), ("Reading and Writing", rw_path)], workers=workers, chunk_pages=chunk_pages, cache=cache, backend=backend)
+
+
+def summarize_timings(docs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-backend page count, total and slowest page time from build_texts timings."""
+    stats: Dict[str, Dict[str, Any]] = {}
+    for name, doc in docs.items():
+        for t in doc.get("timings", []):
+            st = stats.setdefault(t["backend"], {"pages": 0, "seconds": 0.0, "slowest": None})
+            st["pages"] += 1
+            st["seconds"] += t["seconds"]
+            if st["slowest"] is None or t["seconds"] > st["slowest"]["seconds"]:
+                st["slowest"] = {"document": name, "page": t["page"], "seconds": t["seconds"]}
+    return stats
+
+
+class PageIndex:
+    """Sorted offsets of the [[PAGE:n]] markers in one document text."""
+
+    def __init__(self, text: str, markers: Optional[List[Tuple[int, int, int]]] = None):
+        self.text = text
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.pages: List[int] = []
+        if markers is None:
+            markers = [(m.start(), m.end(), int(m.group(1))) for m in PAGE_MARKER_RE.finditer(text)]
+        # Running total of characters removed when markers become newlines
+        self._removed: List[int] = [0]
+        for start, end, pno in markers:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.pages.append(pno)
+            self._removed.append(self._removed[-1] + end - start - 1)
+        self._by_page = {pno: i for i, pno in enumerate(self.pages)}
+
+    def _inside(self, s: int, e: int) -> Tuple[int, int]:
+        # Index range of markers lying entirely within [s, e)
+        return bisect_left(self.starts, s), bisect_right(self.ends, e)
+
+    def page_span(self, s: int, e: int) -> List[int]:
+        lo, hi = self._inside(s, e)
+        pgs = self.pages[lo:hi]
+        if not pgs:
+            # derive from nearest markers around block bounds
+            pgs = []
+            if lo > 0:
+                pgs.append(self.pages[lo - 1])
+            nxt = bisect_left(self.starts, e)
+            if nxt < len(self.pages):
+                pgs.append(self.pages[nxt])
+        return sorted(set(pgs))
+
+    def strip_markers(self, s: int, e: int) -> str:
+        # Text of [s, e) with each marker replaced by a newline
+        lo, hi = self._inside(s, e)
+        parts: List[str] = []
+        pos = s
+        for i in range(lo, hi):
+            parts.append(self.text[pos:self.starts[i]])
+            parts.append("\n")
+            pos = self.ends[i]
+        parts.append(self.text[pos:e])
+        return "".join(parts)
+
+    def clean_head(self, s: int, e: int, n: int) -> str:
+        # strip_markers(s, e)[:n], copying at most n characters of the block
+        lo, hi = self._inside(s, e)
+        parts: List[str] = []
+        size = 0
+        pos = s
+        for i in range(lo, hi):
+            take = min(self.starts[i], pos + n - size)
+            parts.append(self.text[pos:take])
+            size += take - pos
+            if size >= n:
+                return "".join(parts)
+            parts.append("\n")
+            size += 1
+            pos = self.ends[i]
+            if size >= n:
+                return "".join(parts)
+        parts.append(self.text[pos:min(e, pos + n - size)])
+        return "".join(parts)
+
+    def first_line(self, s: int, e: int) -> str:
+        # First line of strip_markers(s, e); a marker ends the line like the newline it becomes
+        m = LINE_BREAK_RE.search(self.text, s, e)
+        end = m.start() if m else e
+        lo, hi = self._inside(s, e)
+        if lo < hi:
+            end = min(end, self.starts[lo])
+        return self.text[s:end]
+
+    def clean_len(self, s: int, e: int) -> int:
+        # Length of strip_markers(s, e) without building it
+        lo, hi = self._inside(s, e)
+        return (e - s) - (self._removed[max(hi, lo)] - self._removed[lo])
+
+    def fingerprint(self, pages: List[int]) -> str:
+        """Hash of the given pages' text, used to spot changed blocks between runs."""
+        h = hashlib.sha256()
+        for pno in pages:
+            h.update(f"[[PAGE:{pno}]]".encode())
+            i = self._by_page.get(pno)
+            if i is not None:
+                end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.text)
+                h.update(self.text[self.ends[i]:end].encode("utf-8"))
+        return h.hexdigest()
+
+
+@dataclass
+class Token:
+    kind: str  # page | qid | answer | correct
+    start: int
+    end: int
+    value: str = ""  # page number, QID or correct-answer value
+    anchor: int = 0  # answer: offset of "ID"; correct: offset where the rationale starts
+    header: bool = False  # qid/answer: also a QID_RE header, so it starts a block
+
+
+def _markers_in(text: str, s: int, e: int, base: int = 0) -> List[Tuple[int, int, int]]:
+    # Markers swallowed by the marker-tolerant whitespace of a token
+    if "[[" not in text[s:e]:
+        return []
+    return [(base + m.start(), base + m.end(), int(m.group(1))) for m in PAGE_MARKER_RE.finditer(text, s, e)]
+
+
+def lex_tokens(text: str, pos: int = 0, base: int = 0) -> Iterator[Tuple[Token, List[Tuple[int, int, int]]]]:
+    """Scan text once with TOKEN_RE from pos, yielding each token with the page markers it covers."""
+    for m in TOKEN_RE.finditer(text, pos):
+        kind = m.lastgroup
+        start, end = base + m.start(), base + m.end()
+        if kind == "page":
+            yield Token("page", start, end, m.group("pno")), [(start, end, int(m.group("pno")))]
+            continue
+        carried: List[Tuple[int, int, int]] = []
+        if kind == "qid":
+            anchor = base + m.start("kw") if m.group("kw") else start
+            if m.group("split_id") is not None:
+                tok = Token("answer", start, end, m.group("split_id"), anchor)
+                carried = _markers_in(text, m.start(), m.end(), base)
+            elif m.group("ans") is not None and m.group("sep") == ":":
+                tok = Token("answer", start, end, m.group("qid_id"), anchor, header=True)
+            else:
+                tok = Token("qid", start, end, m.group("qid_id"), header=True)
+            if m.group("ans"):
+                carried = _markers_in(text, m.start("ans"), m.end("ans"), base)
+        else:
+            tok = Token("correct", start, end, m.group("val"), end)
+            carried = _markers_in(text, m.start(), m.start("val"), base)
+        yield tok, carried
+
+
+class BlockView:
+    """One question block over the unreleased document text, with the tokens and page markers it needs."""
+
+    __slots__ = ("qid", "s", "e", "tokens", "page_index", "_starts")
+
+    def __init__(self, qid: str, s: int, e: int, tokens: List[Token], page_index: PageIndex):
+        self.qid = qid
+        self.s = s
+        self.e = e
+        self.tokens = tokens
+        self.page_index = page_index
+        self._starts = [t.start for t in tokens]
+
+    def between(self, s: int, e: int) -> List[Token]:
+        return self.tokens[bisect_left(self._starts, s):bisect_left(self._starts, e)]
+
+
+# Characters kept before a retained offset for the lookbehinds of TOKEN_RE and the block hint regexes
+_LOOKBEHIND = 2
+
+
+class PageStream:
+    """The unreleased tail of one document's [[PAGE:n]]-marked text, fed a page at a time."""
+
+    def __init__(self, text: str = "", final: bool = True):
+        self.text = text
+        self.base = 0
+        self.safe = len(text) if final else 0
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.text)
+
+    def add_page(self, pno: int, txt: str) -> None:
+        start = self.end
+        self.text += f"\n[[PAGE:{pno}]]\n{txt}\n"
+        if txt.strip():
+            # Every TOKEN_RE branch stops at text it cannot use, so tokens before this page are final
+            self.safe = start
+
+    def finish(self) -> None:
+        self.safe = self.end
+
+    def release(self, offset: int) -> None:
+        # Drop the text before offset
+        if offset > self.base:
+            self.text = self.text[offset - self.base:]
+            self.base = offset
+
+
+def iter_block_views(source: Union[str, Iterable[Tuple[int, str]]], limit: Optional[int] = None) -> Iterator[BlockView]:
+    """Stream the blocks select_blocks would pick, lexing the text only once."""
+    if isinstance(source, str):
+        stream, pages = PageStream(source), iter(())
+        # The whole text is already in memory, so every view can share one index over it
+        shared_index: Optional[PageIndex] = PageIndex(source)
+    else:
+        stream, pages = PageStream(final=False), iter(source)
+        shared_index = None
+    markers: List[Tuple[int, int, int]] = []
+    tokens: List[Token] = []
+    bounds: Deque[Tuple[str, int, int]] = deque()  # closed (qid, s, e) awaiting trailing markers
+    open_header: Optional[Tuple[str, int]] = None
+    seen: set = set()
+    emitted = 0
+    pos = 0  # document offset the next lex resumes from
+
+    def ready(e: int) -> bool:
+        # page_span needs the first marker at or after e, fingerprint the one after that
+        return len(markers) >= 2 and markers[-2][0] >= e
+
+    def emit(qid: str, s: int, e: int) -> Optional[BlockView]:
+        nonlocal markers, tokens
+        # Buffered tokens start at or after s, so the block's own are a prefix
+        cut = next((i for i, t in enumerate(tokens) if t.start >= e), len(tokens))
+        view = None
+        # A repeated QID is dropped, so only the first block for it gets a view
+        if qid not in seen:
+            # Share the unreleased text rather than copying the block out; offsets only move once pages are released
+            base = stream.base
+            block_tokens = tokens[:cut] if not base else [
+                Token(t.kind, t.start - base, t.end - base, t.value, t.anchor - base if t.kind in ("answer", "correct") else t.anchor, t.header) for t in tokens[:cut]]
+            page_index = shared_index
+            if page_index is None:
+                lo = bisect_left(markers, (s,))
+                window = markers[max(lo - 1, 0):]
+                hi = bisect_left(window, (e,))
+                # The block's markers plus the two after it: page_span and fingerprint read no further
+                page_index = PageIndex(stream.text, [(ms - base, me - base, pno) for ms, me, pno in window[:hi + 2]])
+            view = BlockView(qid, s - base, e - base, block_tokens, page_index)
+        # Later blocks start at or after e: keep the last marker before e and everything after
+        keep = max(bisect_left(markers, (e,)) - 1, 0)
+        markers = markers[keep:]
+        tokens = tokens[cut:]
+        return view
+
+    def drain(final: bool) -> Iterator[BlockView]:
+        nonlocal emitted
+        while bounds and (final or ready(bounds[0][2])):
+            qid, s, e = bounds.popleft()
+            view = emit(qid, s, e)
+            if view is None:
+                continue
+            seen.add(qid)
+            emitted += 1
+            yield view
+
+    def lex() -> Iterator[Tuple[Token, List[Tuple[int, int, int]]]]:
+        nonlocal pos
+        for tok, carried in lex_tokens(stream.text, pos - stream.base, stream.base):
+            if tok.start >= stream.safe:
+                break
+            pos = tok.end
+            yield tok, carried
+        # Nothing matches before safe, whatever pages come next
+        pos = max(pos, stream.safe)
+
+    def release() -> None:
+        # Keep the text and the marker before the earliest block still to be emitted (or the lex position)
+        nonlocal markers
+        needed = bounds[0][1] if bounds else open_header[1] if open_header is not None else pos
+        markers = markers[max(bisect_left(markers, (needed,)) - 1, 0):]
+        stream.release(min(needed, markers[0][0] if markers else needed) - _LOOKBEHIND)
+
+    def scan() -> Iterator[Tuple[Token, List[Tuple[int, int, int]]]]:
+        for pno, txt in pages:
+            stream.add_page(pno, txt)
+            yield from lex()
+            release()
+        stream.finish()
+        yield from lex()
+
+    for tok, carried in scan():
+        markers.extend(carried)
+        if tok.header:
+            if open_header is not None:
+                bounds.append((open_header[0], open_header[1], tok.start))
+            open_header = (tok.value, tok.start)
+        if open_header is not None:
+            tokens.append(tok)
+        if not bounds:
+            continue
+        for view in drain(False):
+            yield view
+            if limit is not None and emitted >= limit:
+                return
+    if open_header is not None:
+        bounds.append((open_header[0], open_header[1], stream.end))
+    for view in drain(True):
+        yield view
+        if limit is not None and emitted >= limit:
+            return
+
+
 def slice_until(next_idx: int, items: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
     return items[:next_idx]
 
@@ -395,191 +1065,1184 @@ def extract_answer_and_rationale(qid: str, block_text: str) -> Tuple[Optional[st
     return answer, rationale
 
 
-def export_images_for_pages(math_path: str, rw_path: str, imgdir: str, qid: str, page_range: List[int], test_name: str) -> List[str]:
-    saved: List[str] = []
-    os.makedirs(imgdir, exist_ok=True)
-    qdir = os.path.join(imgdir, qid)
-    os.makedirs(qdir, exist_ok=True)
-    src_path = math_path if test_name == "Math" else rw_path
-
-    if fitz is None:  # fallback: no images
-        return saved
-    try:
-        doc = fitz.open(src_path)
-        fig_idx = 1
+def _write_atomic(out_path: str, data: bytes) -> None:
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, out_path)
+
+
+def encode_image(samples: bytes, width: int, height: int, mode: str, outputs: List[Tuple[str, int, str]]) -> None:
+    """Encode raw pixmap samples into each (out_path, max_width, fmt) output; runs as a process-pool task."""
+    img = Image.frombytes(mode, (width, height), samples)
+    if mode == "CMYK":
+        img = img.convert("RGB")
+    for out_path, max_width, fmt in outputs:
+        out = img
+        if 0 < max_width < img.width:
+            out = img.resize((max_width, max(1, round(img.height * max_width / img.width))), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == "webp":
+            if out.mode not in ("RGB", "RGBA"):
+                out = out.convert("RGBA" if "A" in out.mode else "RGB")
+            out.save(buf, format="WEBP", quality=80, method=4)
+        else:
+            out.save(buf, format="PNG", optimize=True)
+        _write_atomic(out_path, buf.getvalue())
+
+
+class ImageExporter:
+    """Exports embedded images once per PDF and shares them across questions by content hash."""
+
+    def __init__(self, imgdir: str, fmt: str = "png", max_width: int = 0, thumb_width: int = 0, workers: int = 1):
+        self.imgdir = imgdir
+        self.shared_dir = os.path.join(imgdir, "shared")
+        self.fmt = fmt
+        self.max_width = max_width
+        self.thumb_width = thumb_width
+        if Image is None:
+            self.fmt, self.max_width, self.thumb_width = "png", 0, 0
+        elif fmt == "webp" and not pil_features.check("webp"):
+            print("[warn] Pillow was built without WebP support; writing PNG", file=sys.stderr)
+            self.fmt = "png"
+        self.manifest: Dict[str, List[str]] = {}
+        self.thumbnails: Dict[str, List[str]] = {}
+        self.written = 0
+        self.reused = 0
+        self.failed = 0
+        self._docs: Dict[str, Any] = {}
+        self._by_xref: Dict[Tuple[str, int], Optional[Tuple[str, Optional[str], List[str]]]] = {}
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and Image is not None else None
+        # Output path -> the encode writing it, until export() settles it
+        self._encodes: Dict[str, Future] = {}
+        self._broken: set = set()
+        # Files kept for carried-over questions, each counted once in reused
+        self._carried: set = set()
+
+    def __enter__(self) -> "ImageExporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._settle(list(self._encodes))
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for doc in self._docs.values():
+            doc.close()
+        self._docs.clear()
+
+    def _doc(self, pdf_path: str):
+        if pdf_path not in self._docs:
+            self._docs[pdf_path] = fitz.open(pdf_path)
+        return self._docs[pdf_path]
+
+    def _variant(self, digest: str, width: int, src_width: int) -> Tuple[str, str]:
+        # Images are only scaled down, so one no wider than width keeps its full size and the bare name
+        name = f"{digest}-{width}w.{self.fmt}" if 0 < width < src_width else f"{digest}.{self.fmt}"
+        return os.path.join(self.shared_dir, name), f"/qmedia/shared/{name}"
+
+    def _export_xref(self, pdf_path: str, doc, xref: int) -> Optional[Tuple[str, Optional[str], List[str]]]:
+        # (web path, thumbnail web path, output paths) for one image, its encode queued if needed
+        key = (pdf_path, xref)
+        if key in self._by_xref:
+            return self._by_xref[key]
+        result = None
+        try:
+            pix = fitz.Pixmap(doc, xref)
+            if pix.n >= 5:  # CMYK or with alpha
+                pix = fitz.Pixmap(fitz.csRGB, pix)
+            h = hashlib.sha256(f"{pix.width}x{pix.height}x{pix.n}:".encode())
+            h.update(pix.samples)
+            digest = h.hexdigest()[:20]
+
+            out_path, web_path = self._variant(digest, self.max_width, pix.width)
+            outputs = [(out_path, self.max_width, self.fmt)]
+            thumb_web = None
+            if self.thumb_width > 0:
+                thumb_path, thumb_web = self._variant(digest, self.thumb_width, pix.width)
+                if thumb_path != out_path:
+                    outputs.append((thumb_path, self.thumb_width, self.fmt))
+            missing = [o for o in outputs if o[0] not in self._encodes and not os.path.exists(o[0])]
+            self.reused += len(outputs) - len(missing)
+            if missing:
+                os.makedirs(self.shared_dir, exist_ok=True)
+                fut = self._encode(pix, missing)
+                self._encodes.update((o[0], fut) for o in missing)
+            result = (web_path, thumb_web, [o[0] for o in outputs])
+        except Exception:
+            result = None
+        self._by_xref[key] = result
+        return result
+
+    def _encode(self, pix, outputs: List[Tuple[str, int, str]]) -> Future:
+        if self._pool is not None and Image is not None:
+            mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA" if pix.alpha else "CMYK"}.get(pix.n, "RGB")
+            return self._pool.submit(encode_image, pix.samples, pix.width, pix.height, mode, outputs)
+        fut: Future = Future()
+        try:
+            if Image is None:
+                _write_atomic(outputs[0][0], pix.tobytes("png"))
+            else:
+                mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA" if pix.alpha else "CMYK"}.get(pix.n, "RGB")
+                encode_image(pix.samples, pix.width, pix.height, mode, outputs)
+            fut.set_result(None)
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def _settle(self, paths: List[str]) -> bool:
+        # Wait for the encodes writing paths; False if any of them failed
+        for path in paths:
+            fut = self._encodes.pop(path, None)
+            if fut is None:
+                continue
+            try:
+                fut.result()
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                self._broken.add(path)
+        return not any(path in self._broken for path in paths)
+
+    def export(self, qid: str, pdf_path: str, page_range: List[int]) -> List[str]:
+        saved: List[str] = []
+        thumbs: List[str] = []
+        if fitz is None:  # fallback: no images
+            return saved
+        try:
+            doc = self._doc(pdf_path)
+        except Exception:
+            return saved
+        found: List[Tuple[int, Tuple[str, Optional[str], List[str]]]] = []
         for pno in page_range:
             if pno - 1 < 0 or pno - 1 >= len(doc):
                 continue
-            page = doc[pno - 1]
-            for img in page.get_images(full=True):
-                xref = img[0]
-                pix = fitz.Pixmap(doc, xref)
-                if pix.n >= 5:  # CMYK or with alpha
-                    pix = fitz.Pixmap(fitz.csRGB, pix)
-                out_path = os.path.join(qdir, f"fig{fig_idx}.png")
-                pix.save(out_path)
-                saved.append(os.path.join("/qmedia", qid, f"fig{fig_idx}.png"))
-                fig_idx += 1
-        doc.close()
-    except Exception:
+            for img in doc[pno - 1].get_images(full=True):
+                exported = self._export_xref(pdf_path, doc, img[0])
+                if exported:
+                    found.append((img[0], exported))
+        # Every encode is queued before waiting, so a question's images still encode in parallel
+        for xref, (web_path, thumb_web, paths) in found:
+            if not self._settle(paths):
+                self._by_xref[(pdf_path, xref)] = None
+                continue
+            if web_path not in saved:
+                saved.append(web_path)
+                if thumb_web:
+                    thumbs.append(thumb_web)
+        self.manifest[qid] = saved
+        self.thumbnails[qid] = thumbs
         return saved
-    return saved
 
+    def carry(self, qid: str, pdf_path: str, q: "CBQuestion") -> None:
+        # A carried-over question keeps its image paths while every file is still on disk; else export again
+        paths = q.images + q.thumbnails
+        files = [os.path.join(self.shared_dir, p[len("/qmedia/shared/"):]) for p in paths if p.startswith("/qmedia/shared/")]
+        if len(files) == len(paths) and all(os.path.exists(f) for f in files):
+            self.reused += len(set(files) - self._carried)
+            self._carried.update(files)
+            self.manifest[qid] = list(q.images)
+            self.thumbnails[qid] = list(q.thumbnails)
+            return
+        q.images = self.export(qid, pdf_path, q.pages)
+        q.thumbnails = self.thumbnails.get(qid, [])
+
+
+def peak_rss_kb() -> int:
+    # Peak resident set size of this process so far, in KiB (0 where unavailable)
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class Profiler:
+    """Wall time, CPU time and peak RSS growth per stage and per question for --profile."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.questions: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, float]] = []
+        self._current: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        frame = {"child_wall": 0.0, "child_cpu": 0.0}
+        self._stack.append(frame)
+        wall, cpu, rss = time.perf_counter(), time.process_time(), peak_rss_kb()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            st = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "self_wall": 0.0, "self_cpu": 0.0, "rss_growth_kb": 0})
+            st["calls"] += 1
+            st["wall"] += wall
+            st["cpu"] += cpu
+            st["self_wall"] += wall - frame["child_wall"]
+            st["self_cpu"] += cpu - frame["child_cpu"]
+            # The process peak only ever rises, so each call is charged with how far it raised it
+            st["rss_growth_kb"] += peak_rss_kb() - rss
+            if self._stack:
+                self._stack[-1]["child_wall"] += wall
+                self._stack[-1]["child_cpu"] += cpu
+            if self._current is not None and name != "parse":
+                self._current[name] = self._current.get(name, 0.0) + wall
+
+    @contextmanager
+    def question(self, qid: str, test: str) -> Iterator[Dict[str, Any]]:
+        record: Dict[str, Any] = {"qid": qid, "test": test}
+        self._current = record
+        wall, cpu, rss = time.perf_counter(), time.process_time(), peak_rss_kb()
+        try:
+            with self.stage("parse"):
+                yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            record["rss_growth_kb"] = peak_rss_kb() - rss
+            self._current = None
+            self.questions.append(record)
+
+    def slowest(self, n: int = 5) -> List[Dict[str, Any]]:
+        return sorted(self.questions, key=lambda r: r["wall"], reverse=True)[:n]
+
+    def table(self) -> List[str]:
+        lines = [f"{'stage':<12}{'calls':>7}{'wall s':>10}{'self s':>10}{'self cpu s':>12}{'RSS growth MB':>15}"]
+        for name, st in self.stages.items():
+            lines.append(f"{name:<12}{st['calls']:>7}{st['wall']:>10.3f}{st['self_wall']:>10.3f}{st['self_cpu']:>12.3f}{st['rss_growth_kb'] / 1024:>15.1f}")
+        lines.append(f"Process peak RSS: {peak_rss_kb() / 1024:.1f} MB")
+        if self.questions:
+            walls = sorted(r["wall"] for r in self.questions)
+            lines.append(f"Per question: median {1000 * walls[len(walls) // 2]:.1f} ms, max {1000 * walls[-1]:.1f} ms over {len(walls)} parsed")
+            for r in self.slowest():
+                pages = "-".join(str(p) for p in (r["pages"][:1] + r["pages"][-1:])) if r.get("pages") else "?"
+                lines.append(f"  slow: {r['qid']} ({r['test']} p{pages}) {1000 * r['wall']:.1f} ms, images {1000 * r.get('images', 0.0):.1f} ms")
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stages": self.stages, "questions": self.questions, "slowest": [r["qid"] for r in self.slowest()], "peak_rss_kb": peak_rss_kb()}
+
+
+class ProfiledExporter:
+    """ImageExporter wrapper that times export() as the "images" stage."""
+
+    def __init__(self, exporter: "ImageExporter", profiler: Profiler):
+        self.exporter = exporter
+        self.profiler = profiler
+
+    def export(self, qid: str, pdf_path: str, page_range: List[int]) -> List[str]:
+        with self.profiler.stage("images"):
+            return self.exporter.export(qid, pdf_path, page_range)
+
+    def carry(self, qid: str, pdf_path: str, q: "CBQuestion") -> None:
+        with self.profiler.stage("images"):
+            self.exporter.carry(qid, pdf_path, q)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.exporter, name)
+
+
+def select_blocks(doc_text: str, limit: Optional[int] = None, matches: Optional[List[Tuple[int, str]]] = None) -> List[Tuple[str, int, int]]:
+    """(qid, start, end) for each question block, first occurrence per QID."""
+    if matches is None:
+        # Find all QID headers across the entire document
+        matches = list(find_qid_matches(doc_text))
+    # Build blocks between QIDs
+    blocks: List[Tuple[str, int, int]] = []  # (qid, start, end)
+    for i, (start, qid) in enumerate(matches):
+        end = matches[i + 1][0] if i + 1 < len(matches) else len(doc_text)
+        blocks.append((qid, start, end))
+
+    # Deduplicate by QID, keep first occurrence
+    seen = set()
+    selected: List[Tuple[str, int, int]] = []
+    for qid, s, e in blocks:
+        if qid in seen:
+            continue
+        seen.add(qid)
+        selected.append((qid, s, e))
+        if limit is not None and len(selected) >= limit:
+            break
+    return selected
 
-def parse_pdf(math_path: str, rw_path: str, out_path: str, imgdir: str, debug: bool = False) -> List[CBQuestion]:
-    if pdfplumber is None:
-        raise RuntimeError("pdfplumber is required. Please install via: pip install pdfplumber pillow PyMuPDF")
 
-    docs = build_document_text(math_path, rw_path)
-    results: List[CBQuestion] = []
-    debug_bounds: Dict[str, List[Dict[str, Any]]] = {"Math": [], "Reading and Writing": []}
+def parse_block(qid: str, s: int, e: int, test_name: str, pdf_path: str, page_index: PageIndex, exporter: ImageExporter, debug: bool = False, lexed: Optional[BlockView] = None) -> CBQuestion:
+    # Pages spanned; only the regex path builds the whole marker-stripped block,
+    # the token path works on offsets and copies just the label head
+    page_range = page_index.page_span(s, e)
+    clean_block = page_index.strip_markers(s, e) if lexed is None else None
+    head = clean_block[:1000] if clean_block is not None else page_index.clean_head(s, e, 1000)
 
-    for test_name in ("Math", "Reading and Writing"):
-        doc_text = docs[test_name]["text"]
-        pdf_path = docs[test_name]["pdf_path"]
-        # Find all QID headers across the entire document
-        matches = list(find_qid_matches(doc_text))
-        if not matches:
-            print(f"[warn] No headers found in {pdf_path}", file=sys.stderr)
+    if debug:
+        dbg_dir = os.path.join("scripts", "data", "debug")
+        os.makedirs(dbg_dir, exist_ok=True)
+        with open(os.path.join(dbg_dir, f"block_{qid}.txt"), "w", encoding="utf-8") as f:
+            f.write(head[:600])
+
+    tokens = lexed.between(s, e) if lexed is not None else None
+
+    # Extract metadata and remove the composite rows from stem region
+    if tokens is not None and not LABEL_HINT_RE.search(head):
+        meta, to_strip = {}, []
+    else:
+        # extract_labels only reads the first 1000 characters
+        meta, to_strip = extract_labels(head)
+    assessment = meta.get("assessment", "SAT") or "SAT"
+    test_val = meta.get("test", test_name) or test_name
+    domain = meta.get("domain") or "Unknown"
+    skill = meta.get("skill") or "Unknown"
+    difficulty = map_difficulty(meta.get("difficulty", "") or "")
+
+    # Number near header line
+    if tokens is not None:
+        header_line = page_index.first_line(s, e)
+    else:
+        header_line = clean_block.splitlines()[0] if clean_block else ""
+    number = None
+    mm = re.search(r"(Question\s+)?(\d{1,2})[\.)]", header_line, re.I)
+    if mm:
+        try:
+            number = int(mm.group(2))
+        except Exception:
+            number = None
+
+    answer = None
+    rationale = None
+    if tokens is not None:
+        # Same as ANS_RE: first answer header followed by "Correct Answer" within 300 block characters
+        corrects = [t for t in tokens if t.kind == "correct"]
+        cut = None
+        matched = False
+        for t in tokens:
+            if t.kind != "answer":
+                continue
+            if cut is None and t.value.lower() == qid.lower():
+                cut = t.anchor
+            if not matched:
+                hit = next((c for c in corrects if c.start >= t.end), None)
+                if hit is not None and page_index.clean_len(t.end, hit.start) <= 300:
+                    matched = True
+                    if t.value.lower() == qid.lower():
+                        answer = hit.value.strip().upper()
+                        rationale = normalize_text(page_index.strip_markers(hit.anchor, e))
+        # Truncate block before answer section for stem/choices parsing
+        until_answer = page_index.strip_markers(s, cut if cut is not None else e)
+        has_choice_tokens = CHOICE_HINT_RE.search(page_index.text, s, cut if cut is not None else e) is not None
+    else:
+        # Answer and rationale via strict regex
+        ans_match = re.search(ANS_RE, clean_block)
+        if ans_match and ans_match.group(1).lower() == qid.lower():
+            answer = ans_match.group(2).strip().upper()
+            rationale = normalize_text(clean_block[ans_match.end():])
+
+        # Truncate block before answer section for stem/choices parsing
+        until_answer = re.split(re.compile(rf"ID\s*:\s*{re.escape(qid)}\s*Answer", re.I), clean_block, maxsplit=1)[0]
+        has_choice_tokens = True
+    # Remove composite label rows from the top to avoid polluting stem
+    if to_strip:
+        # The row is replaced by a newline, which can put a choice marker at a line start
+        has_choice_tokens = True
+    for row in to_strip:
+        until_answer = until_answer.replace(row, "\n")
+    # Build stem and choices: remove captions, parse choices by block regex
+    pre = "\n".join([l for l in until_answer.splitlines() if l.strip() and not re.match(r"^(Figure|Table)\b", l, re.I)])
+    choices = None
+    # Without a single choice marker before the answer section neither parser can match
+    if has_choice_tokens:
+        choices = parse_choices_block(pre)
+        if not choices:
+            choices = parse_choices_inline(qid, pre, debug)
+    if choices:
+        # Identify where the first choice starts by locating label A (robust start)
+        mA = re.search(r'(?m)^\(?A\)?[\.)]\s+', pre)
+        stem_text = pre[: mA.start()] if mA else pre
+        stem = normalize_text(stem_text)
+    else:
+        stem = normalize_text(pre)
+
+    if not stem:
+        # Fallback to skill text as stem if nothing extracted
+        stem = skill or "Problem"
+
+    # Validation constraints
+    if len(stem) > 2000:
+        stem = stem[:2000].rstrip()
+    # fill required fields if missing
+    assessment = assessment or "SAT"
+    test_val = test_val or test_name
+    difficulty = difficulty or "Medium"
+    if not stem:
+        stem = "Problem"
+    # normalize choices/answer
+    if choices is not None and len(choices) != 4:
+        # discard malformed MCQ
+        choices = None
+    if choices is not None and answer and answer not in {"A", "B", "C", "D"}:
+        # try to coerce numeric answers to None for MCQ
+        answer = None
+
+    # Export images
+    images = exporter.export(qid, pdf_path, page_range)
+    thumbnails = exporter.thumbnails.get(qid, [])
+
+    return CBQuestion(
+        id=qid,
+        assessment=intern_or_none(assessment),
+        test=intern_or_none(test_val),
+        domain=intern_or_none(domain),
+        skill=intern_or_none(skill),
+        difficulty=intern_or_none(difficulty),
+        number=number,
+        stem=stem,
+        choices=choices,
+        answer=answer,
+        rationale=rationale,
+        images=images,
+        pages=page_range or [],
+        thumbnails=thumbnails,
+    )
+
+
+def parse_document(test_name: str, doc_text: Union[str, Iterable[Tuple[int, str]]], pdf_path: str, exporter: ImageExporter, debug: bool = False, limit: Optional[int] = None, state: Optional["IncrementalState"] = None, use_lexer: bool = True, profiler: Optional[Profiler] = None) -> Iterator[CBQuestion]:
+    # doc_text is the joined document text or its (page, text) pairs, e.g. from stream_texts
+    if use_lexer:
+        # Blocks stream out of one lexer pass as pages arrive; each view indexes only its own pages
+        blocks: Iterable[Tuple[str, int, int, PageIndex, Optional[BlockView]]] = (
+            (v.qid, v.s, v.e, v.page_index, v) for v in iter_block_views(doc_text, limit))
+    else:
+        # Original per-block regex path, kept for benchmarking the lexer against
+        if not isinstance(doc_text, str):
+            doc_text = join_pages(doc_text)
+        page_index = PageIndex(doc_text)
+        blocks = [(qid, s, e, page_index, None) for qid, s, e in select_blocks(doc_text, limit)]
+    found = False
+    for qid, s, e, page_index, view in blocks:
+        found = True
+        if state is not None:
+            # Carry the previous question over when none of its pages changed
+            fp = page_index.fingerprint(page_index.page_span(s, e))
+            previous = state.reuse(qid, fp)
+            state.record(qid, fp)
+            if previous is not None:
+                # Its image paths still hold (the state is keyed on the image options); the exporter
+                # records them in the manifest and re-exports only if a file has gone missing
+                exporter.carry(qid, pdf_path, previous)
+                yield previous
+                continue
+        if profiler is None:
+            yield parse_block(qid, s, e, test_name, pdf_path, page_index, exporter, debug, view)
             continue
-        # Build blocks between QIDs
-        blocks: List[Tuple[str, int, int]] = []  # (qid, start, end)
-        for i, (start, qid) in enumerate(matches):
-            end = matches[i + 1][0] if i + 1 < len(matches) else len(doc_text)
-            blocks.append((qid, start, end))
-
-        # Deduplicate by QID, keep first occurrence, limit to 50
-        seen = set()
-        selected: List[Tuple[str, int, int]] = []
-        for qid, s, e in blocks:
-            if qid in seen:
+        with profiler.question(qid, test_name) as record:
+            q = parse_block(qid, s, e, test_name, pdf_path, page_index, exporter, debug, view)
+            record["pages"] = q.pages
+        yield q
+    if not found:
+        print(f"[warn] No headers found in {pdf_path}", file=sys.stderr)
+
+
+def profiled_pages(pages: Iterable[Tuple[int, str]], profiler: Profiler) -> Iterator[Tuple[int, str]]:
+    # Time pulling each page (extraction or a cache read) as the "text" stage
+    it = iter(pages)
+    while True:
+        with profiler.stage("text"):
+            page = next(it, None)
+        if page is None:
+            return
+        yield page
+
+
+def parse_pdf(math_path: str, rw_path: str, out_path: str, imgdir: str, debug: bool = False, workers: int = 1, chunk_pages: int = 16, docs: Optional[Dict[str, Dict[str, Any]]] = None, exporter: Optional[ImageExporter] = None, expected: Optional[Dict[str, int]] = None, state: Optional["IncrementalState"] = None, use_lexer: bool = True, backend: str = "auto", profiler: Optional[Profiler] = None, cache: Optional[PageTextCache] = None, texts: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[CBQuestion]:
+    """Yield questions from the Math and R&W PDFs in document order."""
+    sources = [("Math", math_path), ("Reading and Writing", rw_path)]
+    if docs is not None:
+        documents: Iterable[Tuple[str, Union[str, Iterable[Tuple[int, str]]]]] = ((name, docs[name]["text"]) for name, _ in sources)
+        paths = {name: docs[name]["pdf_path"] for name, _ in sources}
+    else:
+        if not text_backends(backend):
+            raise RuntimeError("A text backend is required. Please install via: pip install PyMuPDF pdfplumber pillow")
+        documents = stream_texts(sources, workers=workers, chunk_pages=chunk_pages, cache=cache, backend=backend, docs=texts)
+        if profiler is not None:
+            documents = ((name, profiled_pages(pages, profiler)) for name, pages in documents)
+        paths = dict(sources)
+    if expected is None:
+        expected = {"Math": 50, "Reading and Writing": 50}
+
+    own_exporter = exporter is None
+    if exporter is None:
+        exporter = ImageExporter(imgdir)
+    try:
+        for test_name, doc_text in documents:
+            limit = expected.get(test_name) or None
+            yield from parse_document(test_name, doc_text, paths[test_name], exporter, debug, limit, state, use_lexer, profiler)
+    finally:
+        if own_exporter:
+            exporter.close()
+
+
+# Items a pipeline stage may hold in its output queue before the stage upstream waits
+DEFAULT_QUEUE_SIZE = 8
+PIPELINE_STAGES = ("text", "parse", "images", "serialize", "write")
+_END = object()
+
+
+class PipelineClosed(Exception):
+    """The consumer stopped reading before the pipeline finished."""
+
+
+class PageFeed:
+    """Bounded hand-off of one document's (page, text) pairs from the text stage's thread to the parse stage's."""
+
+    def __init__(self, size: int):
+        self._queue: "queue.Queue[Any]" = queue.Queue(max(1, size))
+        self._closed = threading.Event()
+        # Seconds the reader spent waiting for pages
+        self.waited = 0.0
+
+    def put(self, item: Any) -> None:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
                 continue
-            seen.add(qid)
-            selected.append((qid, s, e))
-            if len(selected) >= 50:
-                break
+        raise PipelineClosed()
 
-        for qid, s, e in selected:
-            raw_block = doc_text[s:e]
-            # Pages spanned
-            pgs = [int(m.group(1)) for m in re.finditer(r"\[\[PAGE:(\d+)\]\]", raw_block)]
-            if not pgs:
-                # derive from nearest markers around block bounds
-                before = doc_text[:s]
-                after = doc_text[e:]
-                prev = re.findall(r"\[\[PAGE:(\d+)\]\]", before)
-                nxt = re.findall(r"\[\[PAGE:(\d+)\]\]", after)
-                if prev:
-                    pgs.append(int(prev[-1]))
-                if nxt:
-                    pgs.append(int(nxt[0]))
-            page_range = sorted(set(pgs))
-
-            # Clean block text (remove page markers)
-            clean_block = re.sub(r"\[\[PAGE:\d+\]\]", "\n", raw_block)
-
-            if debug:
-                debug_bounds[test_name].append({"id": qid, "start": s, "end": e, "pages": page_range})
-                dbg_dir = os.path.join("scripts", "data", "debug")
-                os.makedirs(dbg_dir, exist_ok=True)
-                with open(os.path.join(dbg_dir, f"block_{qid}.txt"), "w", encoding="utf-8") as f:
-                    f.write(clean_block[:600])
-
-            # Extract metadata and remove the composite rows from stem region
-            meta, to_strip = extract_labels(clean_block)
-            assessment = meta.get("assessment", "SAT") or "SAT"
-            test_val = meta.get("test", test_name) or test_name
-            domain = meta.get("domain") or "Unknown"
-            skill = meta.get("skill") or "Unknown"
-            difficulty = map_difficulty(meta.get("difficulty", "") or "")
-
-            # Number near header line
-            header_line = clean_block.splitlines()[0] if clean_block else ""
-            number = None
-            mm = re.search(r"(Question\s+)?(\d{1,2})[\.)]", header_line, re.I)
-            if mm:
-                try:
-                    number = int(mm.group(2))
-                except Exception:
-                    number = None
-
-            # Answer and rationale via strict regex
-            ans_match = re.search(ANS_RE, clean_block)
-            answer = None
-            rationale = None
-            if ans_match and ans_match.group(1).lower() == qid.lower():
-                answer = ans_match.group(2).strip().upper()
-                rationale = normalize_text(clean_block[ans_match.end():])
-
-            # Truncate block before answer section for stem/choices parsing
-            until_answer = re.split(re.compile(rf"ID\s*:\s*{re.escape(qid)}\s*Answer", re.I), clean_block, maxsplit=1)[0]
-            # Remove composite label rows from the top to avoid polluting stem
-            for row in to_strip:
-                until_answer = until_answer.replace(row, "\n")
-            # Build stem and choices: remove captions, parse choices by block regex
-            pre = "\n".join([l for l in until_answer.splitlines() if l.strip() and not re.match(r"^(Figure|Table)\b", l, re.I)])
-            choices = parse_choices_block(pre)
-            if not choices:
-                choices = parse_choices_inline(qid, pre, debug)
-            if choices:
-                # Identify where the first choice starts by locating label A (robust start)
-                mA = re.search(r'(?m)^\(?A\)?[\.)]\s+', pre)
-                stem_text = pre[: mA.start()] if mA else pre
-                stem = normalize_text(stem_text)
-            else:
-                stem = normalize_text(pre)
-
-            if not stem:
-                # Fallback to skill text as stem if nothing extracted
-                stem = skill or "Problem"
-
-            # Validation constraints
-            if len(stem) > 2000:
-                stem = stem[:2000].rstrip()
-            # fill required fields if missing
-            assessment = assessment or "SAT"
-            test_val = test_val or test_name
-            difficulty = difficulty or "Medium"
-            if not stem:
-                stem = "Problem"
-            # normalize choices/answer
-            if choices is not None and len(choices) != 4:
-                # discard malformed MCQ
-                choices = None
-            if choices is not None and answer and answer not in {"A", "B", "C", "D"}:
-                # try to coerce numeric answers to None for MCQ
-                answer = None
-
-            # Export images
-            images = export_images_for_pages(math_path, rw_path, imgdir, qid, page_range, test_val)
-
-            results.append(CBQuestion(
-                id=qid,
-                assessment=assessment,
-                test=test_val,
-                domain=domain,
-                skill=skill,
-                difficulty=difficulty,
-                number=number,
-                stem=stem,
-                choices=choices,
-                answer=answer,
-                rationale=rationale,
-                images=images,
-                pages=page_range or [],
+    def close(self) -> None:
+        self._closed.set()
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        while True:
+            t = time.perf_counter()
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    raise PipelineClosed()
+                continue
+            finally:
+                self.waited += time.perf_counter() - t
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class DeferredExporter:
+    """Stands in for ImageExporter while blocks are parsed; records each export for the images stage."""
+
+    def __init__(self):
+        # qid -> (pdf path, pages, carried over from the previous run)
+        self.requests: Dict[str, Tuple[str, List[int], bool]] = {}
+        self.thumbnails: Dict[str, List[str]] = {}
+
+    def export(self, qid: str, pdf_path: str, page_range: List[int]) -> List[str]:
+        self.requests[qid] = (pdf_path, list(page_range), False)
+        return []
+
+    def carry(self, qid: str, pdf_path: str, q: "CBQuestion") -> None:
+        self.requests[qid] = (pdf_path, list(q.pages), True)
+
+
+class StageStats:
+    """Counters for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    def sample(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_total += depth
+        self._depth_samples += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy": round(self.busy, 4),
+            "starved": round(self.starved, 4),
+            "blocked": round(self.blocked, 4),
+            "items_per_busy_second": round(self.items / self.busy, 1) if self.busy else None,
+            "mean_depth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+            "max_depth": self.max_depth,
+        }
+
+
+class PdfPipeline:
+    """Extract questions as an asyncio pipeline: text -> parse -> images -> serialize -> write."""
+
+    def __init__(self, exporter: ImageExporter, queue_size: int = DEFAULT_QUEUE_SIZE, workers: int = 1, chunk_pages: int = 16, cache: Optional[PageTextCache] = None, backend: str = "auto", debug: bool = False, use_lexer: bool = True, state: Optional["IncrementalState"] = None, docs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.exporter = exporter
+        self.queue_size = max(1, queue_size)
+        self.workers = workers
+        self.chunk_pages = chunk_pages
+        self.cache = cache
+        self.backend = backend
+        self.debug = debug
+        self.use_lexer = use_lexer
+        self.state = state
+        # Filled by the text stage unless documents are passed in already extracted
+        self.docs: Dict[str, Dict[str, Any]] = dict(docs or {})
+        self._prebuilt = set(self.docs)
+        self._feeds: List[PageFeed] = []
+        self.stats = {name: StageStats(name) for name in PIPELINE_STAGES}
+        self.wall = 0.0
+
+    def run(self, sources: List[Tuple[str, str]], expected: Optional[Dict[str, int]] = None) -> Iterator[Tuple[CBQuestion, Dict[str, Any]]]:
+        """Yield (question, question_to_dict(question)) for each (test name, pdf path) source in order."""
+        out: "queue.Queue[Any]" = queue.Queue(self.queue_size)
+        closed = threading.Event()
+        thread = threading.Thread(target=self._run_loop, args=(sources, expected or {}, out, closed), name="pdf-pipeline", daemon=True)
+        write = self.stats["write"]
+        started = time.perf_counter()
+        thread.start()
+        try:
+            while True:
+                write.sample(out.qsize())
+                t = time.perf_counter()
+                item = out.get()
+                write.starved += time.perf_counter() - t
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                t = time.perf_counter()
+                yield item
+                write.busy += time.perf_counter() - t
+                write.items += 1
+        finally:
+            closed.set()
+            thread.join()
+            self.wall = time.perf_counter() - started
+
+    def table(self) -> List[str]:
+        lines = [f"{'stage':<10}{'items':>7}{'busy s':>9}{'starved s':>11}{'blocked s':>11}{'items/s':>9}{'depth avg':>11}{'max':>5}"]
+        for name, st in self.stats.items():
+            d = st.to_dict()
+            rate = f"{d['items_per_busy_second']:.0f}" if d["items_per_busy_second"] else "-"
+            lines.append(f"{name:<10}{d['items']:>7}{d['busy']:>9.3f}{d['starved']:>11.3f}{d['blocked']:>11.3f}{rate:>9}{d['mean_depth']:>11.2f}{d['max_depth']:>5}")
+        lines.append(f"Pipeline wall {self.wall:.3f}s, queue size {self.queue_size}")
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"wall": round(self.wall, 4), "queue_size": self.queue_size, "stages": {name: st.to_dict() for name, st in self.stats.items()}}
+
+    def _run_loop(self, sources: List[Tuple[str, str]], expected: Dict[str, int], out: "queue.Queue[Any]", closed: threading.Event) -> None:
+        try:
+            asyncio.run(self._main(sources, expected, out, closed))
+        except PipelineClosed:
+            pass
+        except BaseException as e:
+            try:
+                self._handoff(out, closed, e)
+            except PipelineClosed:
+                pass
+
+    @staticmethod
+    def _handoff(out: "queue.Queue[Any]", closed: threading.Event, item: Any) -> None:
+        # Blocking put that gives up once the consumer has gone away
+        while not closed.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineClosed()
+
+    async def _main(self, sources: List[Tuple[str, str]], expected: Dict[str, int], out: "queue.Queue[Any]", closed: threading.Event) -> None:
+        texts: asyncio.Queue = asyncio.Queue(1)
+        parsed: asyncio.Queue = asyncio.Queue(self.queue_size)
+        imaged: asyncio.Queue = asyncio.Queue(self.queue_size)
+        serialized: asyncio.Queue = asyncio.Queue(self.queue_size)
+        pools = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pipeline-{name}") for name in PIPELINE_STAGES}
+        tasks = [
+            asyncio.ensure_future(self._text_stage(sources, texts, pools["text"])),
+            asyncio.ensure_future(self._parse_stage(texts, parsed, pools["parse"], expected)),
+            asyncio.ensure_future(self._map_stage("images", parsed, imaged, pools["images"], self._export_images)),
+            asyncio.ensure_future(self._map_stage("serialize", imaged, serialized, pools["serialize"], lambda q: (q, question_to_dict(q)))),
+            asyncio.ensure_future(self._write_stage(serialized, out, closed, pools["write"])),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            for feed in self._feeds:
+                feed.close()
+            for pool in pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _put(self, st: StageStats, outq: asyncio.Queue, item: Any) -> None:
+        t = time.perf_counter()
+        await outq.put(item)
+        st.blocked += time.perf_counter() - t
+
+    async def _text_stage(self, sources: List[Tuple[str, str]], outq: asyncio.Queue, pool: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        st = self.stats["text"]
+        for test_name, pdf_path in sources:
+            if test_name in self._prebuilt:
+                st.items += 1
+                await self._put(st, outq, (test_name, pdf_path, self.docs[test_name]["text"]))
+                continue
+            # Pages go to the parse stage as they are extracted, at most chunk_pages ahead of it
+            feed = PageFeed(self.chunk_pages)
+            self._feeds.append(feed)
+            await self._put(st, outq, (test_name, pdf_path, feed))
+            await loop.run_in_executor(pool, self._extract, test_name, pdf_path, feed, st)
+            st.items += 1
+        await outq.put(_END)
+
+    def _extract(self, test_name: str, pdf_path: str, feed: PageFeed, st: StageStats) -> None:
+        started = time.perf_counter()
+        blocked = 0.0
+        try:
+            for _, pages in stream_texts([(test_name, pdf_path)], self.workers, self.chunk_pages, self.cache, self.backend, self.docs):
+                for page in pages:
+                    t = time.perf_counter()
+                    feed.put(page)
+                    blocked += time.perf_counter() - t
+            feed.put(_END)
+        except PipelineClosed:
+            # The parse stage has every page it wants, or the pipeline is shutting down
+            pass
+        except BaseException as e:
+            try:
+                feed.put(e)
+            except PipelineClosed:
+                pass
+            raise
+        finally:
+            st.blocked += blocked
+            st.busy += time.perf_counter() - started - blocked
+
+    async def _parse_stage(self, inq: asyncio.Queue, outq: asyncio.Queue, pool: ThreadPoolExecutor, expected: Dict[str, int]) -> None:
+        loop = asyncio.get_running_loop()
+        st = self.stats["parse"]
+        while True:
+            st.sample(inq.qsize())
+            t = time.perf_counter()
+            item = await inq.get()
+            st.starved += time.perf_counter() - t
+            if item is _END:
+                await outq.put(_END)
+                return
+            test_name, pdf_path, doc_text = item
+            deferred = DeferredExporter()
+            feed = doc_text if isinstance(doc_text, PageFeed) else None
+            questions = parse_document(test_name, doc_text, pdf_path, deferred, self.debug, expected.get(test_name) or None, self.state, self.use_lexer)
+
+            def step() -> Any:
+                q = next(questions, None)
+                return _END if q is None else (q, deferred.requests.pop(q.id, None))
+
+            while True:
+                t = time.perf_counter()
+                waited = feed.waited if feed is not None else 0.0
+                item = await loop.run_in_executor(pool, step)
+                # Time the parser sat waiting for the next page counts as starved, not busy
+                waited = feed.waited - waited if feed is not None else 0.0
+                st.busy += time.perf_counter() - t - waited
+                st.starved += waited
+                if item is _END:
+                    break
+                st.items += 1
+                await self._put(st, outq, item)
+            if feed is not None:
+                # The document reached its expected count; the text stage stops extracting it
+                feed.close()
+
+    def _export_images(self, item: Tuple[CBQuestion, Optional[Tuple[str, List[int], bool]]]) -> CBQuestion:
+        q, request = item
+        if request is None:
+            return q
+        pdf_path, pages, carried = request
+        if carried:
+            self.exporter.carry(q.id, pdf_path, q)
+        else:
+            q.images = self.exporter.export(q.id, pdf_path, pages)
+            q.thumbnails = self.exporter.thumbnails.get(q.id, [])
+        return q
+
+    async def _map_stage(self, name: str, inq: asyncio.Queue, outq: asyncio.Queue, pool: ThreadPoolExecutor, fn) -> None:
+        loop = asyncio.get_running_loop()
+        st = self.stats[name]
+        while True:
+            st.sample(inq.qsize())
+            t = time.perf_counter()
+            item = await inq.get()
+            st.starved += time.perf_counter() - t
+            if item is _END:
+                await outq.put(_END)
+                return
+            t = time.perf_counter()
+            result = await loop.run_in_executor(pool, fn, item)
+            st.busy += time.perf_counter() - t
+            st.items += 1
+            await self._put(st, outq, result)
+
+    async def _write_stage(self, inq: asyncio.Queue, out: "queue.Queue[Any]", closed: threading.Event, pool: ThreadPoolExecutor) -> None:
+        # Moves results onto the consumer's thread-safe queue; the consumer's own time is measured in run()
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inq.get()
+            await loop.run_in_executor(pool, self._handoff, out, closed, item)
+            if item is _END:
+                return
+
+
+def question_to_dict(q: CBQuestion) -> Dict[str, Any]:
+    """The question's output row, read straight off its slots."""
+    item = {name: getattr(q, name) for name in CB_ROW_FIELDS}
+    if q.choices is not None:
+        item["choices"] = [{"label": c.label, "text": c.text} for c in q.choices]
+    if not q.thumbnails:
+        # Only written with --thumb-width, so rows keep the importer's original shape by default
+        del item["thumbnails"]
+    return item
+
+
+def finalize_ndjson(ndjson_path: str, json_path: str) -> int:
+    """Assemble an NDJSON question stream into the JSON array the importer expects."""
+    tmp = f"{json_path}.{os.getpid()}.tmp"
+    with open(ndjson_path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+        count = write_questions(dst, (json.loads(line) for line in src if line.strip()), "json")
+    os.replace(tmp, json_path)
+    return count
+
+
+def parsed_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Keys added after parsing (e.g. canonical_id from --near-dupes) are not CBQuestion fields
+    return {k: v for k, v in item.items() if k in CB_QUESTION_FIELDS}
+
+
+def question_from_dict(item: Dict[str, Any]) -> CBQuestion:
+    values = parsed_fields(item)
+    for key in ("assessment", "test", "domain", "skill", "difficulty"):
+        if isinstance(values.get(key), str):
+            values[key] = sys.intern(values[key])
+    if values.get("choices") is not None:
+        values["choices"] = [Choice(**c) for c in values["choices"]]
+    return CBQuestion(**values)
+
+
+class IncrementalState:
+    """Page fingerprints and previous output for incremental runs."""
+
+    def __init__(self, state_path: str, previous_path: str, image_options: Optional[Dict[str, Any]] = None):
+        self.state_path = state_path
+        self.image_options = image_options or {}
+        self.fingerprints: Dict[str, str] = {}
+        self.previous: Dict[str, Dict[str, Any]] = {}
+        self.new_fingerprints: Dict[str, str] = {}
+        self.reused = 0
+        self.added: List[str] = []
+        self.changed: List[str] = []
+        self._seen: set = set()
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (data.get("extractor_version") == EXTRACTOR_VERSION and data.get("parser_version") == PARSER_VERSION
+                    and data.get("image_options", {}) == self.image_options):
+                self.fingerprints = data.get("fingerprints", {})
+        except (OSError, ValueError):
+            pass
+        try:
+            self.previous = {item["id"]: item for item in read_questions(previous_path)}
+        except (OSError, ValueError):
+            self.previous = {}
+
+    def reuse(self, qid: str, fp: str) -> Optional[CBQuestion]:
+        if qid in self.previous and self.fingerprints.get(qid) == fp:
+            self.reused += 1
+            return question_from_dict(self.previous[qid])
+        return None
+
+    def record(self, qid: str, fp: str) -> None:
+        self.new_fingerprints[qid] = fp
+
+    def observe(self, item: Dict[str, Any]) -> None:
+        # Classify an emitted question against the previous output
+        qid = item["id"]
+        self._seen.add(qid)
+        if qid not in self.previous:
+            self.added.append(qid)
+        elif parsed_fields(self.previous[qid]) != parsed_fields(item):
+            self.changed.append(qid)
+
+    def diff(self) -> Dict[str, List[str]]:
+        removed = [qid for qid in self.previous if qid not in self._seen]
+        return {"added": self.added, "changed": self.changed, "removed": removed}
+
+    def save(self) -> None:
+        data = {
+            "extractor_version": EXTRACTOR_VERSION,
+            "parser_version": PARSER_VERSION,
+            "image_options": self.image_options,
+            "fingerprints": self.new_fingerprints,
+        }
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+@dataclass
+class BatchDocument:
+    name: str
+    pdf: str
+    test: str
+    expected: Optional[int] = None
+
+
+def infer_test(filename: str) -> str:
+    return "Reading and Writing" if re.search(r"rw\b|reading|writing", filename, re.I) else "Math"
+
+
+def load_batch(spec: str) -> List[BatchDocument]:
+    """Documents to extract from a JSON manifest ({"documents": [{"pdf", "test", "expected", "name"}]} or a bare list) or a directory of PDFs."""
+    docs: List[BatchDocument] = []
+    if os.path.isdir(spec):
+        for fname in sorted(os.listdir(spec)):
+            if not fname.lower().endswith(".pdf"):
+                continue
+            stem = os.path.splitext(fname)[0]
+            mcount = re.search(r"(\d+)\s*(?:M|RW)$", stem, re.I)
+            docs.append(BatchDocument(
+                name=stem,
+                pdf=os.path.abspath(os.path.join(spec, fname)),
+                test=infer_test(stem),
+                expected=int(mcount.group(1)) if mcount else None,
             ))
+        return docs
+
+    with open(spec, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("documents", []) if isinstance(data, dict) else data
+    base = os.path.dirname(os.path.abspath(spec))
+    for entry in entries:
+        pdf = os.path.abspath(os.path.join(base, entry["pdf"]))
+        stem = os.path.splitext(os.path.basename(pdf))[0]
+        docs.append(BatchDocument(
+            name=entry.get("name") or stem,
+            pdf=pdf,
+            test=entry.get("test") or infer_test(stem),
+            expected=entry.get("expected"),
+        ))
+    return docs
+
 
-    return results
+def near_duplicate_index(threshold: float):
+    """MinHash/LSH index for --near-dupes (imported lazily; needs numpy)."""
+    from question_dedupe import NearDuplicateIndex
+    return NearDuplicateIndex(threshold=threshold)
+
+
+def index_near_duplicate(index, qid: str, item: Dict[str, Any]) -> str:
+    """Add a serialized question's stem and choices to the index; returns its canonical id."""
+    from question_dedupe import question_text
+    return index.add(qid, question_text(item.get("stem"), item.get("choices")))
+
+
+def store_questions(spec: str, items: Iterable[Dict[str, Any]]) -> Tuple[str, int]:
+    """Upsert serialized questions into the --store target; returns (store path, questions upserted)."""
+    from question_store import open_store
+    with open_store(spec) as store:
+        store.upsert_many(items)
+    return store.path, store.upserted
+
+
+def run_batch_document(doc: BatchDocument, outdir: str, imgdir: str, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract one batch document to <outdir>/<name>.<format> and return its summary."""
+    started = time.perf_counter()
+    fmt = opts["format"]
+    out_path = os.path.join(outdir, f"{doc.name}.{OUTPUT_EXTENSIONS[fmt]}")
+    summary: Dict[str, Any] = {"name": doc.name, "pdf": doc.pdf, "test": doc.test, "expected": doc.expected, "output": out_path}
+    try:
+        cache = PageTextCache(opts["cache_dir"], opts["cache_max_bytes"]) if opts["cache_dir"] else None
+        texts: Dict[str, Dict[str, Any]] = {}
+        count = mcq = 0
+        with ImageExporter(imgdir, fmt=opts["image_format"], max_width=opts["max_width"], thumb_width=opts["thumb_width"]) as exporter, \
+                open_output(out_path, fmt) as f:
+            writer = None if fmt == "ndjson" else open_writer(f, fmt, CB_SHARED_FIELDS)
+            for _, pages in stream_texts([(doc.name, doc.pdf)], chunk_pages=opts["chunk_pages"], cache=cache, backend=opts["backend"], docs=texts):
+                for q in parse_document(doc.test, pages, doc.pdf, exporter, opts["debug"], doc.expected, use_lexer=opts["parser"] == "lexer"):
+                    count += 1
+                    mcq += q.choices is not None and len(q.choices) == 4
+                    if writer is None:
+                        f.write(json.dumps(question_to_dict(q), ensure_ascii=False) + "\n")
+                    else:
+                        writer.write(question_to_dict(q))
+            if writer is not None:
+                writer.close()
+        summary["text"] = summarize_timings(texts)
+        summary.update(count=count, mcq=mcq, ok=count > 0 and (doc.expected is None or count == doc.expected))
+    except Exception as e:
+        # Reported, not raised, so one bad PDF does not stop the batch
+        summary.update(count=0, mcq=0, ok=False, error=f"{type(e).__name__}: {e}")
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def run_batch(docs: List[BatchDocument], outdir: str, imgdir: str, workers: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    os.makedirs(outdir, exist_ok=True)
+    args = (list(docs), [outdir] * len(docs), [imgdir] * len(docs), [opts] * len(docs))
+    if workers > 1 and len(docs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_batch_document, *args))
+    else:
+        results = list(map(run_batch_document, *args))
+    summary = {
+        "documents": results,
+        "total_questions": sum(r["count"] for r in results),
+        "failed": [r["name"] for r in results if not r["ok"]],
+    }
+    if opts.get("near_dupes"):
+        # Documents are extracted in separate processes, so clustering runs here over their
+        # outputs; ids are "<document>/<qid>" since the same QID may appear in several PDFs
+        index = near_duplicate_index(opts["near_dupe_threshold"])
+        for r in results:
+            if r["count"]:
+                for item in read_questions(r["output"]):
+                    index_near_duplicate(index, f"{r['name']}/{item['id']}", item)
+        summary["near_duplicates"] = index.clusters()
+
+    def write_summary() -> None:
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        with open(os.path.join(outdir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    # Written before the store step so a store failure cannot lose the batch's results
+    write_summary()
+    if opts.get("store"):
+        # One writer: workers only produce files, the parent upserts them in document order,
+        # keyed "<document>/<qid>" like the near-duplicate ids
+        items = (dict(item, id=f"{r['name']}/{item['id']}") for r in results if r["count"] for item in read_questions(r["output"]))
+        try:
+            path, count = store_questions(opts["store"], items)
+            summary["store"] = {"path": path, "questions": count}
+        except Exception as e:
+            summary["store"] = {"error": f"{type(e).__name__}: {e}"}
+        write_summary()
+    return summary
 
 
 def main():
     parser = argparse.ArgumentParser(description="Extract structured SAT questions from College Board PDFs")
-    parser.add_argument("--math", required=True, help="Absolute path to 50M PDF")
-    parser.add_argument("--rw", required=True, help="Absolute path to 50RW PDF")
-    parser.add_argument("--out", required=True, help="Output JSON path")
+    parser.add_argument("--math", help="Absolute path to 50M PDF")
+    parser.add_argument("--rw", help="Absolute path to 50RW PDF")
+    parser.add_argument("--out", help="Output path, written in --format (JSON array by default)")
+    parser.add_argument("--expected-math", type=int, default=50, help="Questions expected in the Math PDF (0 disables the cap and count check)")
+    parser.add_argument("--expected-rw", type=int, default=50, help="Questions expected in the R&W PDF (0 disables the cap and count check)")
+    parser.add_argument("--parser", choices=["lexer", "regex"], default="lexer", help="Block parser: single-pass token lexer, or the original per-block regex cascade")
+    parser.add_argument("--incremental", action="store_true", help="Only re-parse questions whose pages changed since the previous run")
+    parser.add_argument("--state", help="Incremental state file (default: <out>.state.json)")
+    parser.add_argument("--previous", help="Previous output to carry unchanged questions from (default: --out)")
+    parser.add_argument("--diff-out", help="Where to write the added/changed/removed QID diff (default: <out>.diff.json)")
+    parser.add_argument("--batch", help="JSON manifest or directory of PDFs to extract in one run (replaces --math/--rw/--out)")
+    parser.add_argument("--outdir", help="With --batch, directory for per-document outputs and summary.json")
+    parser.add_argument("--format", choices=list(OUTPUT_EXTENSIONS), default="json",
+                        help="json: one indented array written at the end; json-compact: the same array without whitespace; "
+                             "qbin: length-prefixed binary records (see question_codec.py); ndjson: one question per line as it is parsed")
+    parser.add_argument("--json-out", help="With --format ndjson, also assemble the JSON array the importer reads at this path")
     parser.add_argument("--imgdir", required=True, help="Directory under public/ to write images (e.g., public/qmedia)")
     parser.add_argument("--debug", action="store_true", help="Write debug bounds and block snippets")
+    parser.add_argument("--workers", type=int, default=1, help="Extract documents and page ranges in a process pool of N workers")
+    parser.add_argument("--chunk-pages", type=int, default=16, help="Pages per pdftotext/extraction shard")
+    parser.add_argument("--backend", choices=["auto"] + list(TEXT_BACKENDS), default="auto", help="Text backend; auto tries pdftotext, then PyMuPDF, then pdfplumber")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for the per-page extracted text cache")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="Evict least recently used cache entries above this size")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-extract text from the PDFs")
+    parser.add_argument("--image-format", choices=["png", "webp"], default="png", help="Encoding for exported images; webp needs Pillow (PNG otherwise)")
+    parser.add_argument("--max-width", type=int, default=0, help="Downscale exported images wider than this many pixels, e.g. 1200 (0 keeps full size)")
+    parser.add_argument("--thumb-width", type=int, default=0, help="Also write a thumbnail derivative this many pixels wide (0 disables)")
+    parser.add_argument("--image-manifest", help="Optional JSON path for the qid -> shared image paths manifest")
+    parser.add_argument("--near-dupes", action="store_true", help="Cluster near-duplicate questions (MinHash/LSH over stem and choices) and record each one's canonical_id")
+    parser.add_argument("--near-dupe-threshold", type=float, default=0.8, help="Estimated Jaccard similarity at which two questions are near-duplicates")
+    parser.add_argument("--store", metavar="sqlite:PATH", help="Also upsert questions, choices and image references into an indexed SQLite store (see question_store.py); with --batch, ids are <document>/<qid>")
+    parser.add_argument("--pipeline", action="store_true", help="Run text, parse, images and serialize as overlapping asyncio stages joined by bounded queues; print per-stage stats")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="With --pipeline, questions each stage may queue ahead of the next")
+    parser.add_argument("--pipeline-stats", help="With --pipeline, also write per-stage queue depth and throughput as JSON here")
+    parser.add_argument("--profile", action="store_true", help="Record wall/CPU time and peak RSS growth per stage and per question; print a summary and write <out>.profile.json")
+    parser.add_argument("--profile-out", help="With --profile, where to write per-stage and per-question timings (default: <out>.profile.json)")
+    parser.add_argument("--profile-dump", help="Also run under cProfile and dump stats here (read with python -m pstats)")
     args = parser.parse_args()
+    if args.backend != "auto" and not TEXT_BACKENDS[args.backend].available():
+        parser.error(f"--backend {args.backend} is not available in this environment")
+    if args.profile and args.batch:
+        parser.error("--profile applies to a single --math/--rw run, not --batch")
+    if args.pipeline and (args.profile or args.batch):
+        parser.error("--pipeline applies to a single --math/--rw run and reports its own per-stage stats instead of --profile")
+
+    if not args.profile_dump:
+        run(args, parser)
+        return
+    import cProfile
+    prof = cProfile.Profile()
+    try:
+        prof.runcall(run, args, parser)
+    finally:
+        prof.dump_stats(os.path.abspath(args.profile_dump))
+        print(f"cProfile stats written to {os.path.abspath(args.profile_dump)}")
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    if args.store:
+        from question_store import parse_store_spec
+        try:
+            parse_store_spec(args.store)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.batch:
+        if not args.outdir:
+            parser.error("--batch requires --outdir")
+        opts = {
+            "format": args.format,
+            "chunk_pages": args.chunk_pages,
+            "cache_dir": None if args.no_cache else os.path.abspath(args.cache_dir),
+            "cache_max_bytes": args.cache_max_mb * 1024 * 1024,
+            "image_format": args.image_format,
+            "max_width": args.max_width,
+            "thumb_width": args.thumb_width,
+            "debug": args.debug,
+            "parser": args.parser,
+            "backend": args.backend,
+            "near_dupes": args.near_dupes,
+            "near_dupe_threshold": args.near_dupe_threshold,
+            "store": args.store,
+        }
+        docs_to_run = load_batch(args.batch)
+        summary = run_batch(docs_to_run, os.path.abspath(args.outdir), os.path.abspath(args.imgdir), args.workers, opts)
+        for r in summary["documents"]:
+            status = "ok" if r["ok"] else f"FAILED {r.get('error', '')}".rstrip()
+            print(f"{r['name']}: {r['test']} {r['count']}/{r['expected'] or '-'} questions, MCQ={r['mcq']} ({r['seconds']}s) {status}")
+        print(f"Batch: {len(docs_to_run)} documents, {summary['total_questions']} questions in {summary['seconds']}s")
+        if "near_duplicates" in summary:
+            clusters = summary["near_duplicates"]
+            print(f"Near-duplicates: {sum(len(m) - 1 for m in clusters.values())} questions in {len(clusters)} clusters (see summary.json)")
+        if "store" in summary and "error" in summary["store"]:
+            print(f"[error] Store not updated: {summary['store']['error']}", file=sys.stderr)
+        elif "store" in summary:
+            print(f"Stored {summary['store']['questions']} questions in {summary['store']['path']}")
+        if summary["failed"] or "error" in summary.get("store", {}):
+            print(f"[error] Failed documents: {summary['failed']}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if not (args.math and args.rw and args.out):
+        parser.error("--math, --rw and --out are required unless --batch is given")
 
     math_pdf = os.path.abspath(args.math)
     rw_pdf = os.path.abspath(args.rw)
@@ -589,36 +2252,154 @@ def main():
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     os.makedirs(imgdir, exist_ok=True)
 
-    questions = parse_pdf(math_pdf, rw_pdf, out_path, imgdir, debug=args.debug)
+    profiler = Profiler() if args.profile else None
+    near_dupes = near_duplicate_index(args.near_dupe_threshold) if args.near_dupes else None
+
+    def stage(name: str):
+        return profiler.stage(name) if profiler is not None else nullcontext()
+
+    def report_profile() -> None:
+        if profiler is None:
+            return
+        for line in profiler.table():
+            print(line)
+        profile_path = os.path.abspath(args.profile_out or f"{out_path}.profile.json")
+        with open(profile_path, "w", encoding="utf-8") as f:
+            json.dump(profiler.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Profile written to {profile_path}")
+
+    def report_text(docs: Dict[str, Dict[str, Any]]) -> None:
+        if cache is not None:
+            print(f"Text cache: {cache.hits} page ranges reused, {cache.misses} extracted")
+        for name, st in summarize_timings(docs).items():
+            slow = st["slowest"]
+            print(f"Text backend {name}: {st['pages']} pages in {st['seconds']:.2f}s "
+                  f"({1000 * st['seconds'] / st['pages']:.1f} ms/page, slowest {slow['document']} p{slow['page']} {1000 * slow['seconds']:.1f} ms)")
+
+    def first_qids(name: str, pdf_path: str, n: int = 5) -> List[str]:
+        # QID headers never cross a page marker, so each page can be searched on its own
+        ids: List[str] = []
+        for _, pages in stream_texts([(name, pdf_path)], cache=cache, backend=args.backend):
+            for _, txt in pages:
+                ids.extend(m.group(1) for m in QID_RE.finditer(txt))
+                if len(ids) >= n:
+                    return ids[:n]
+        return ids
+
+    cache = None if args.no_cache else PageTextCache(os.path.abspath(args.cache_dir), args.cache_max_mb * 1024 * 1024)
+    pipeline = None
+    # Filled with each document's page timings as its pages are extracted
+    docs: Dict[str, Dict[str, Any]] = {}
+    if not text_backends(args.backend):
+        raise RuntimeError("A text backend is required. Please install via: pip install PyMuPDF pdfplumber pillow")
+    state = None
+    if args.incremental:
+        # Load the previous output before it is overwritten below
+        image_options = {"format": args.image_format, "max_width": args.max_width, "thumb_width": args.thumb_width}
+        state = IncrementalState(os.path.abspath(args.state or f"{out_path}.state.json"), os.path.abspath(args.previous or out_path), image_options)
+
+    # ndjson: write each question as soon as parse_pdf yields it, to a temp file promoted after validation.
+    # A crash or Ctrl-C leaves the temp file with every question parsed so far.
+    stream = open(f"{out_path}.{os.getpid()}.tmp", "w", encoding="utf-8") if args.format == "ndjson" else None
+    # json format holds every question until validation passes; columns keep that compact
+    serializable = ColumnarBatch(CB_BATCH_SCHEMA)
+    math_count = rw_count = has_choices = total = 0
+    try:
+        with ImageExporter(imgdir, fmt=args.image_format, max_width=args.max_width, thumb_width=args.thumb_width, workers=args.workers) as exporter:
+            expected = {"Math": args.expected_math, "Reading and Writing": args.expected_rw}
+            if args.pipeline:
+                # Serialized inside the pipeline; this loop is its "write" stage
+                pipeline = PdfPipeline(exporter, queue_size=args.queue_size, workers=args.workers, chunk_pages=args.chunk_pages, cache=cache,
+                                       backend=args.backend, debug=args.debug, use_lexer=args.parser == "lexer", state=state)
+                produced: Iterable[Tuple[CBQuestion, Optional[Dict[str, Any]]]] = pipeline.run([("Math", math_pdf), ("Reading and Writing", rw_pdf)], expected)
+            else:
+                export_with = ProfiledExporter(exporter, profiler) if profiler is not None else exporter
+                produced = ((q, None) for q in parse_pdf(math_pdf, rw_pdf, out_path, imgdir, debug=args.debug, workers=args.workers, chunk_pages=args.chunk_pages, exporter=export_with, expected=expected,
+                                                         state=state, use_lexer=args.parser == "lexer", backend=args.backend, profiler=profiler, cache=cache, texts=docs))
+            for q, item in produced:
+                total += 1
+                math_count += q.test == "Math"
+                rw_count += q.test == "Reading and Writing"
+                has_choices += q.choices is not None and len(q.choices) == 4
+                with stage("serialize"):
+                    if item is None:
+                        item = question_to_dict(q)
+                    if near_dupes is not None:
+                        item["canonical_id"] = index_near_duplicate(near_dupes, q.id, item)
+                    if state is not None:
+                        state.observe(item)
+                    if stream is not None:
+                        stream.write(json.dumps(item, ensure_ascii=False) + "\n")
+                        stream.flush()
+                    else:
+                        serializable.append(item)
+            # Shut the encode pool down here so it is timed with the images stage
+            with stage("images"):
+                exporter.close()
+    except BaseException:
+        if stream is not None:
+            stream.close()
+            print(f"[error] Run stopped after {total} questions; partial output kept in {stream.name}", file=sys.stderr)
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+    report_text(docs if pipeline is None else pipeline.docs)
+    if pipeline is not None:
+        for line in pipeline.table():
+            print(line)
+        if args.pipeline_stats:
+            with open(os.path.abspath(args.pipeline_stats), "w", encoding="utf-8") as f:
+                json.dump(pipeline.to_dict(), f, ensure_ascii=False, indent=2)
+    if args.image_manifest:
+        with open(os.path.abspath(args.image_manifest), "w", encoding="utf-8") as f:
+            json.dump(exporter.manifest, f, ensure_ascii=False, indent=2)
 
     # Validation (fail fast)
-    math_count = len([q for q in questions if q.test == "Math"]) 
-    rw_count = len([q for q in questions if q.test == "Reading and Writing"]) 
-    has_choices = sum(1 for q in questions if q.choices is not None and len(q.choices) == 4)
-    if math_count != 50 or rw_count != 50 or len(questions) != 100 or has_choices < 90:
+    min_mcq = int(0.9 * total)
+    counts_ok = (not args.expected_math or math_count == args.expected_math) and (not args.expected_rw or rw_count == args.expected_rw)
+    if not counts_ok or total == 0 or has_choices < min_mcq:
         # Print first 5 QIDs per doc for debugging
-        docs = build_document_text(math_pdf, rw_pdf)
-        math_ids = [m[1] for m in find_qid_matches(docs['Math']['text'])][:5]
-        rw_ids = [m[1] for m in find_qid_matches(docs['Reading and Writing']['text'])][:5]
-        print(f"[error] Parsed counts Math={math_count}, RW={rw_count}, Total={len(questions)}, MCQ>=4={has_choices} (expected 50/50/100 and MCQ>=90)", file=sys.stderr)
+        math_ids = first_qids("Math", math_pdf)
+        rw_ids = first_qids("Reading and Writing", rw_pdf)
+        print(f"[error] Parsed counts Math={math_count}, RW={rw_count}, Total={total}, MCQ>=4={has_choices} (expected {args.expected_math}/{args.expected_rw}/{args.expected_math + args.expected_rw} and MCQ>={min_mcq})", file=sys.stderr)
         print(f"First 5 Math QIDs: {math_ids}", file=sys.stderr)
         print(f"First 5 R&W QIDs: {rw_ids}", file=sys.stderr)
+        report_profile()
+        if stream is not None:
+            # Not promoted over --out; kept for inspection
+            print(f"[error] {out_path} left unchanged; parsed questions are in {stream.name}", file=sys.stderr)
         sys.exit(1)
 
-    # Serialize with required schema
-    serializable = []
-    for q in questions:
-        item = asdict(q)
-        # Convert Choice dataclass
-        if q.choices is not None:
-            item["choices"] = [asdict(c) for c in q.choices]
-        serializable.append(item)
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(serializable, f, ensure_ascii=False, indent=2)
-
-    print(f"Math: {math_count}, R&W: {rw_count}, Total: {len(serializable)}")
-    print(f"Wrote {len(serializable)} questions to {out_path}")
+    if stream is None:
+        # Serialize with required schema
+        with stage("serialize"), open_output(out_path, args.format) as f:
+            write_questions(f, serializable, args.format, CB_SHARED_FIELDS)
+    else:
+        os.replace(stream.name, out_path)
+
+    print(f"Math: {math_count}, R&W: {rw_count}, Total: {total}")
+    if near_dupes is not None:
+        print(f"Near-duplicates: {near_dupes.duplicates} questions in {len(near_dupes.clusters())} clusters")
+    report_profile()
+    print(f"Images: {exporter.written} written, {exporter.reused} already on disk, {exporter.failed} failed")
+    print(f"Wrote {total} questions to {out_path}")
+    if args.store:
+        with stage("store"):
+            path, count = store_questions(args.store, serializable if stream is None else read_questions(out_path))
+        print(f"Stored {count} questions in {path}")
+    if stream is not None and args.json_out:
+        json_out = os.path.abspath(args.json_out)
+        count = finalize_ndjson(out_path, json_out)
+        print(f"Assembled {count} questions into {json_out}")
+    if state is not None:
+        state.save()
+        diff = state.diff()
+        diff_path = os.path.abspath(args.diff_out or f"{out_path}.diff.json")
+        with open(diff_path, "w", encoding="utf-8") as f:
+            json.dump(diff, f, ensure_ascii=False, indent=2)
+        print(f"Incremental: {state.reused} carried over, {total - state.reused} re-parsed; "
+              f"+{len(diff['added'])} ~{len(diff['changed'])} -{len(diff['removed'])} written to {diff_path}")
 
 
 if __name__ == "__main__":
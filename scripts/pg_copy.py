@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""PostgreSQL COPY streams for Prepify question rows.
+
+convert_to_prepify_format / to_prepify produce the rows our JS importers
+upsert into Supabase's `questions` table in batches of 1000. CopyWriter
+writes the same rows as one `COPY ... FROM STDIN` data stream per target
+table (text or CSV format), so a bank loads in a single COPY:
+
+  <dir>/questions.copy   (or questions.csv)   COPY data, one row per line
+  <dir>/load.sql         psql script: COPY into a temporary staging table,
+                         then INSERT ... ON CONFLICT (question_id) DO UPDATE,
+                         matching the importers' upsert
+
+  psql "$DATABASE_URL" -f <dir>/load.sql      (run from <dir>)
+
+Columns follow supabase-schema.sql; content is written as JSONB text and
+keys that are not table columns (e.g. canonical_id) are not exported.
+NUL characters, which PostgreSQL text and JSONB reject, are dropped.
+
+read_copy() decodes a stream back into rows, so a file can be checked
+without a database:
+
+  python3 scripts/pg_copy.py check out/questions.copy --json scripts/data/parsed-questions.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+COPY_FORMATS = ("text", "csv")
+# Target table -> (column, type) in COPY order; types drive encoding and decoding
+COPY_TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "questions": [
+        ("question_id", "text"),
+        ("external_id", "text"),
+        ("skill_cd", "text"),
+        ("skill_desc", "text"),
+        ("primary_class_cd", "text"),
+        ("primary_class_cd_desc", "text"),
+        ("difficulty", "text"),
+        ("module", "text"),
+        ("content", "jsonb"),
+        ("program", "text"),
+        ("score_band_range_cd", "integer"),
+        ("active", "boolean"),
+    ],
+}
+# Conflict target of each table's upsert in load.sql
+CONFLICT_KEYS = {"questions": "question_id"}
+
+_TEXT_ESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+_TEXT_UNESCAPES = {"\\": "\\", "n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "v": "\v"}
+
+
+def _strip_nul(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, dict):
+        return {_strip_nul(k): _strip_nul(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_nul(v) for v in value]
+    return value
+
+
+def encode_value(value: Any, kind: str) -> Optional[str]:
+    """A column value as PostgreSQL input text, or None for NULL."""
+    if value is None:
+        return None
+    if kind == "jsonb":
+        encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        # JSONB rejects \u0000; re-encode without NULs only when one is present
+        return json.dumps(_strip_nul(value), ensure_ascii=False, separators=(",", ":")) if "\\u0000" in encoded else encoded
+    if kind == "boolean":
+        return "t" if value else "f"
+    if kind == "integer":
+        return str(int(value))
+    return str(value).replace("\x00", "")
+
+
+def decode_value(text: Optional[str], kind: str) -> Any:
+    if text is None:
+        return None
+    if kind == "jsonb":
+        return json.loads(text)
+    if kind == "boolean":
+        return text in ("t", "true")
+    if kind == "integer":
+        return int(text)
+    return text
+
+
+def _csv_field(value: Optional[str]) -> str:
+    # Quote every non-NULL value so an empty string stays distinct from an unquoted NULL
+    return "" if value is None else '"' + value.replace('"', '""') + '"'
+
+
+def _text_field(value: str) -> str:
+    # Chained str.replace beats str.translate here; NULs were already dropped by encode_value
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+
+
+def format_row(values: List[Optional[str]], fmt: str) -> str:
+    """One COPY data line (with newline) for already-encoded values."""
+    if fmt == "csv":
+        return ",".join(_csv_field(v) for v in values) + "\n"
+    return "\t".join("\\N" if v is None else _text_field(v) for v in values) + "\n"
+
+
+def copy_statement(table: str, fmt: str, source: str = "STDIN", into: Optional[str] = None) -> str:
+    """COPY <into or table> (<table's columns>) FROM <source> for a stream of `table` rows."""
+    columns = ", ".join(name for name, _ in COPY_TABLES[table])
+    options = " WITH (FORMAT csv)" if fmt == "csv" else ""
+    return f"COPY {into or table} ({columns}) FROM {source}{options}"
+
+
+class CopyWriter:
+    """Write Prepify rows as one COPY data stream per table plus a load.sql.
+
+    Rows are encoded and appended as they arrive, so memory does not grow
+    with the bank beyond a set of conflict keys: a repeated key is a
+    ValueError, since loading it would keep only one of the rows. Streams
+    go to temporary files that replace the outputs on close(); nothing is
+    replaced if the with block raises.
+    """
+
+    def __init__(self, outdir: str, fmt: str = "text", tables: Iterable[str] = ("questions",)):
+        if fmt not in COPY_FORMATS:
+            raise ValueError(f"Unknown COPY format {fmt!r}; choose from {', '.join(COPY_FORMATS)}")
+        self.outdir = outdir
+        self.fmt = fmt
+        self.tables = list(tables)
+        self.counts = {table: 0 for table in self.tables}
+        # Conflict keys written so far, and where each table's key sits in its columns
+        self._keys: Dict[str, set] = {table: set() for table in self.tables}
+        self._key_index = {table: [name for name, _ in COPY_TABLES[table]].index(CONFLICT_KEYS[table]) for table in self.tables}
+        self.paths = {table: os.path.join(outdir, f"{table}.{'csv' if fmt == 'csv' else 'copy'}") for table in self.tables}
+        os.makedirs(outdir, exist_ok=True)
+        self._tmp = {table: f"{path}.{os.getpid()}.tmp" for table, path in self.paths.items()}
+        self._files = {table: open(tmp, "w", encoding="utf-8", newline="") for table, tmp in self._tmp.items()}
+
+    def __enter__(self) -> "CopyWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(commit=exc_type is None)
+
+    def write(self, row: Dict[str, Any], table: str = "questions") -> None:
+        values = [encode_value(row.get(name), kind) for name, kind in COPY_TABLES[table]]
+        key = values[self._key_index[table]]
+        if key in self._keys[table]:
+            raise ValueError(f"Duplicate {CONFLICT_KEYS[table]} {key!r} in {table}: each row must have its own key")
+        self._keys[table].add(key)
+        self._files[table].write(format_row(values, self.fmt))
+        self.counts[table] += 1
+
+    def write_many(self, rows: Iterable[Dict[str, Any]], table: str = "questions") -> int:
+        before = self.counts[table]
+        for row in rows:
+            self.write(row, table)
+        return self.counts[table] - before
+
+    def load_sql(self) -> str:
+        """psql script loading every stream through a staging table and upserting on the conflict key.
+
+        A key repeated in a stream makes the INSERT fail ("cannot affect row
+        a second time") and the whole load roll back.
+        """
+        lines = ["\\set ON_ERROR_STOP on", "BEGIN;"]
+        for table in self.tables:
+            columns = ", ".join(name for name, _ in COPY_TABLES[table])
+            key = CONFLICT_KEYS[table]
+            staging = f"{table}_copy_staging"
+            updates = ", ".join(f"{name} = EXCLUDED.{name}" for name, _ in COPY_TABLES[table] if name != key)
+            lines += [
+                f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP;",
+                # psql's client-side \copy reads the file relative to psql's working directory
+                "\\copy" + copy_statement(table, self.fmt, f"'{os.path.basename(self.paths[table])}'", into=staging)[len("COPY"):],
+                f"INSERT INTO {table} ({columns})",
+                f"  SELECT {columns} FROM {staging}",
+                f"  ON CONFLICT ({key}) DO UPDATE SET {updates}, updated_at = NOW();",
+            ]
+        lines.append("COMMIT;")
+        return "\n".join(lines) + "\n"
+
+    def close(self, commit: bool = True) -> None:
+        if not self._files:
+            return
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        if not commit:
+            for tmp in self._tmp.values():
+                os.remove(tmp)
+            return
+        for table, tmp in self._tmp.items():
+            os.replace(tmp, self.paths[table])
+        with open(os.path.join(self.outdir, "load.sql"), "w", encoding="utf-8") as f:
+            f.write(self.load_sql())
+
+
+def _split_text_line(line: str) -> List[Optional[str]]:
+    unescape = lambda m: _TEXT_UNESCAPES.get(m.group(1), m.group(1))  # noqa: E731
+    return [None if raw == "\\N" else _TEXT_ESCAPE_RE.sub(unescape, raw) if "\\" in raw else raw
+            for raw in line.split("\t")]
+
+
+def _iter_csv_records(f) -> Iterator[List[Optional[str]]]:
+    # csv.reader cannot tell a quoted empty string from an unquoted NULL, so parse by hand
+    fields: List[Optional[str]] = []
+    buf: List[str] = []
+    quoted = in_quotes = False
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        i = 0
+        while i < len(line):
+            ch = line[i]
+            if in_quotes:
+                if ch == '"':
+                    if line[i + 1:i + 2] == '"':
+                        buf.append('"')
+                        i += 1
+                    else:
+                        in_quotes = False
+                else:
+                    buf.append(ch)
+            elif ch == '"':
+                in_quotes = quoted = True
+            elif ch == ",":
+                fields.append("".join(buf) if quoted or buf else None)
+                buf, quoted = [], False
+            elif ch == "\n":
+                fields.append("".join(buf) if quoted or buf else None)
+                yield fields
+                fields, buf, quoted = [], [], False
+            else:
+                buf.append(ch)
+            i += 1
+
+
+def read_copy(path: str, table: str = "questions", fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Decode a COPY data stream written by CopyWriter back into row dicts (format from the extension by default)."""
+    fmt = fmt or ("csv" if path.endswith(".csv") else "text")
+    columns = COPY_TABLES[table]
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        records = _iter_csv_records(f) if fmt == "csv" else (_split_text_line(line[:-1]) for line in f)
+        for values in records:
+            if len(values) != len(columns):
+                raise ValueError(f"{path}: expected {len(columns)} columns, got {len(values)}")
+            yield {name: decode_value(v, kind) for (name, kind), v in zip(columns, values)}
+
+
+def table_row(row: Dict[str, Any], table: str = "questions") -> Dict[str, Any]:
+    """The row as it would load: table columns only, NULs dropped, values normalised like the COPY round trip."""
+    return {name: decode_value(encode_value(row.get(name), kind), kind) for name, kind in COPY_TABLES[table]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check a Prepify COPY stream by decoding it")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("check", help="Decode every row; with --json, compare with the Prepify JSON it came from")
+    p.add_argument("copy_file")
+    p.add_argument("--table", default="questions", choices=sorted(COPY_TABLES))
+    p.add_argument("--format", choices=COPY_FORMATS, help="Default: csv for .csv files, text otherwise")
+    p.add_argument("--json", help="Prepify JSON array written for the same questions")
+    args = ap.parse_args()
+
+    rows = read_copy(args.copy_file, args.table, args.format)
+    if not args.json:
+        print(f"{sum(1 for _ in rows)} rows decoded from {args.copy_file}")
+        return
+    with open(args.json, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    count = mismatched = 0
+    for got, want in zip(rows, expected):
+        if got != table_row(want, args.table):
+            mismatched += 1
+            if mismatched <= 5:
+                print(f"[mismatch] row {count}: {got.get('question_id')!r}", file=sys.stderr)
+        count += 1
+    extra = sum(1 for _ in rows)
+    if mismatched or extra or count != len(expected):
+        print(f"[error] {mismatched} mismatched rows; {count + extra} rows in COPY vs {len(expected)} in JSON", file=sys.stderr)
+        sys.exit(1)
+    print(f"{count} rows match {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Columnar storage for large batches of extracted questions.
+
+A list of per-question dicts repeats the same categorical strings ("SAT",
+"Math", a few dozen skills, three difficulties) in every row, and Prepify
+rows repeat a dozen constant keys and values. ColumnarBatch keeps one
+column per field instead:
+
+  category  integer codes into the column's table of (interned) values;
+            1 byte per row until a column has more than 256 distinct values
+  value     the value itself (ids, stems, rationales)
+  list      lists stored as tuples
+  record    a dict with fixed keys (Prepify "content") stored as a tuple of
+            its values; the keys are kept once for the column
+  records   a list of such dicts (CB choices) stored as a tuple of tuples
+
+Rows keep their key order: a row whose keys are the schema's (or a
+prefix of them, e.g. without an optional trailing canonical_id) is split
+into the columns; any other row, and any value a column cannot represent,
+is kept as given. row(i) and iteration rebuild dicts on demand, and
+write_json streams the same text json.dump(rows, ensure_ascii=False,
+indent=2) writes, so serializers read the batch directly.
+"""
+import array
+import json
+import sys
+from typing import Any, Dict, IO, Iterator, List, Optional, Sequence, Tuple
+
+_MISSING = object()
+
+
+class _Raw:
+    """A value kept as given because its column cannot encode it."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class CategoryColumn:
+    __slots__ = ("codes", "values", "_index")
+
+    def __init__(self):
+        self.codes = array.array("B")
+        self.values: List[Any] = []
+        # Keyed by type as well, so True and 1 (equal and same hash) stay distinct
+        self._index: Dict[Tuple[type, Any], int] = {}
+
+    def append(self, value: Any) -> None:
+        try:
+            key = (type(value), value)
+            code = self._index.get(key)
+        except TypeError:  # unhashable, e.g. a list in an unexpected place
+            key, code = None, None
+            value = _Raw(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value) if type(value) is str else value)
+            if key is not None:
+                self._index[key] = code
+            if code == 256 or code == 65536:
+                self.codes = array.array("H" if code == 256 else "I", self.codes)
+        self.codes.append(code)
+
+    def get(self, i: int) -> Any:
+        value = self.values[self.codes[i]]
+        return value.value if type(value) is _Raw else value
+
+    def iter_values(self) -> Iterator[Any]:
+        values = self.values
+        if any(type(v) is _Raw for v in values):
+            return (v.value if type(v) is _Raw else v for v in map(values.__getitem__, self.codes))
+        return map(values.__getitem__, self.codes)
+
+
+class ValueColumn:
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values: List[Any] = []
+
+    def append(self, value: Any) -> None:
+        self.values.append(value)
+
+    def get(self, i: int) -> Any:
+        return self.values[i]
+
+    def iter_values(self) -> Iterator[Any]:
+        return iter(self.values)
+
+
+class ListColumn(ValueColumn):
+    __slots__ = ()
+
+    def append(self, value: Any) -> None:
+        self.values.append(tuple(value) if type(value) is list else _Raw(value))
+
+    def get(self, i: int) -> Any:
+        value = self.values[i]
+        return list(value) if type(value) is tuple else value.value
+
+    def iter_values(self) -> Iterator[Any]:
+        return (list(v) if type(v) is tuple else v.value for v in self.values)
+
+
+class RecordColumn(ValueColumn):
+    __slots__ = ("keys",)
+
+    def __init__(self, keys: Sequence[str]):
+        super().__init__()
+        self.keys = tuple(keys)
+
+    def append(self, value: Any) -> None:
+        self.values.append(tuple(value.values()) if type(value) is dict and tuple(value) == self.keys else _Raw(value))
+
+    def get(self, i: int) -> Any:
+        value = self.values[i]
+        return dict(zip(self.keys, value)) if type(value) is tuple else value.value
+
+    def iter_values(self) -> Iterator[Any]:
+        keys = self.keys
+        return (dict(zip(keys, v)) if type(v) is tuple else v.value for v in self.values)
+
+
+class RecordsColumn(RecordColumn):
+    __slots__ = ()
+
+    def append(self, value: Any) -> None:
+        if type(value) is list and all(type(v) is dict and tuple(v) == self.keys for v in value):
+            self.values.append(tuple(tuple(v.values()) for v in value))
+        else:
+            self.values.append(_Raw(value))
+
+    def get(self, i: int) -> Any:
+        value = self.values[i]
+        return [dict(zip(self.keys, v)) for v in value] if type(value) is tuple else value.value
+
+    def iter_values(self) -> Iterator[Any]:
+        keys = self.keys
+        return ([dict(zip(keys, r)) for r in v] if type(v) is tuple else v.value for v in self.values)
+
+
+COLUMN_KINDS = {"category": CategoryColumn, "value": ValueColumn, "list": ListColumn, "record": RecordColumn, "records": RecordsColumn}
+
+
+class ColumnarBatch:
+    """Rows of question dicts stored column by column.
+
+    schema is a sequence of (field, kind) or (field, kind, keys) entries,
+    keys naming the fields of a record/records column. Supports len(),
+    indexing, iteration (rebuilt dicts) and write_json.
+    """
+
+    def __init__(self, schema: Sequence[Tuple[Any, ...]]):
+        self.schema = [tuple(entry) for entry in schema]
+        self.names = tuple(entry[0] for entry in self.schema)
+        self.columns = [COLUMN_KINDS[kind](*args) for _, kind, *args in self.schema]
+        # Rows that do not fit the schema's key order, by position
+        self._raw: Dict[int, Dict[str, Any]] = {}
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append(self, row: Dict[str, Any]) -> None:
+        keys = tuple(row)
+        if keys == self.names[:len(keys)]:
+            values = list(row.values())
+            values += [_MISSING] * (len(self.names) - len(values))
+        else:
+            self._raw[self._len] = dict(row)
+            values = [_MISSING] * len(self.names)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self._len += 1
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.append(row)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        raw = self._raw.get(i)
+        if raw is not None:
+            return dict(raw)
+        row = {}
+        for name, column in zip(self.names, self.columns):
+            value = column.get(i)
+            if value is _MISSING:
+                break
+            row[name] = value
+        return row
+
+    __getitem__ = row
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Column by column rather than row(i) per row: one pass over each column's storage
+        names, raw = self.names, self._raw
+        for i, values in enumerate(zip(*(column.iter_values() for column in self.columns))):
+            if raw and i in raw:
+                yield dict(raw[i])
+                continue
+            n = len(values)
+            while n and values[n - 1] is _MISSING:
+                n -= 1
+            yield dict(zip(names[:n], values))
+
+    def write_json(self, f: IO[str], indent: Optional[int] = 2) -> int:
+        """Write the rows as a JSON array in json.dump(rows, ensure_ascii=False, indent=indent) layout."""
+        if not self._len:
+            f.write("[]")
+            return 0
+        # One encoder for all rows; json.dumps with options builds a new one per call
+        encode = json.JSONEncoder(ensure_ascii=False, indent=indent).encode
+        if indent is None:
+            f.write("[")
+            for i, row in enumerate(self):
+                f.write((", " if i else "") + encode(row))
+            f.write("]")
+            return self._len
+        pad = "\n" + " " * indent
+        for i, row in enumerate(self):
+            f.write(("," if i else "[") + pad + encode(row).replace("\n", pad))
+        f.write("\n]")
+        return self._len
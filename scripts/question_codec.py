@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Output formats for extracted question rows.
+
+  json          the JSON array the importers read, indent=2 (the default)
+  json-compact  the same array on one line, no whitespace between tokens;
+                written with the C JSON encoder, which indent disables
+  qbin          length-prefixed binary records (below); the smallest, and
+                as fast to write as json-compact, but its pure-Python
+                decoder reads slower than json.load. For Python consumers
+                (--store, --incremental); convert to JSON for the importers
+                with `question_codec.py convert`
+
+Writers take row dicts (question_to_dict / to_prepify) or a
+question_batch.ColumnarBatch, one row at a time, so they work for
+streamed output too.
+
+qbin version 1. All integers are little-endian.
+
+  file    := "QBIN" version:u8 record* end
+  record  := length:u32 value            one question; length counts the value's bytes
+  end     := u32 0                       a missing end marker means a truncated file
+  value   := tag:u8 payload
+    0x00  null
+    0x01  false
+    0x02  true
+    0x03  integer        i64
+    0x04  float          f64
+    0x05  string         length:u32 UTF-8 bytes
+    0x06  list           count:u32 value*
+    0x07  map            count:u32 (key value)*; a key is a 0x08 or 0x09 value
+    0x08  shared string  length:u32 UTF-8 bytes; also appended to the string table
+    0x09  string ref     index:u32 into the string table
+
+The string table starts empty and grows through the file, so a record can
+only be decoded after the ones before it. Map keys are always shared, as
+are string values of the writer's shared fields (the "category" columns
+of a batch schema: test, domain, skill, difficulty, ...), so each
+distinct key or category value is stored once per file.
+
+  python3 scripts/question_codec.py convert out.qbin out.json --to json
+  python3 scripts/question_codec.py count out.qbin
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from typing import IO, Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from question_batch import ColumnarBatch
+
+FORMATS = ("json", "json-compact", "qbin")
+QBIN_MAGIC = b"QBIN"
+QBIN_VERSION = 1
+
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_NULL, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _MAP, _SHARED, _REF = range(10)
+_I64_MIN, _I64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def shared_fields(schema: Sequence[Tuple[Any, ...]]) -> Tuple[str, ...]:
+    """Fields of a ColumnarBatch schema whose string values qbin stores once per file."""
+    return tuple(entry[0] for entry in schema if entry[1] == "category")
+
+
+def open_output(path: str, fmt: str) -> IO:
+    """path opened for writing fmt: binary for qbin, UTF-8 text for JSON."""
+    return open(path, "wb") if fmt == "qbin" else open(path, "w", encoding="utf-8")
+
+
+class JsonArrayWriter:
+    """Write rows as one JSON array, indent=2 (json.dump layout) or compact."""
+
+    def __init__(self, f: IO[str], compact: bool = False):
+        self.f = f
+        self.count = 0
+        if compact:
+            self._encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+            self._sep, self._pad = ",", None
+        else:
+            self._encode = json.JSONEncoder(ensure_ascii=False, indent=2).encode
+            self._sep, self._pad = ",\n  ", "\n  "
+
+    def write(self, row: Dict[str, Any]) -> None:
+        body = self._encode(row)
+        if self._pad is not None:
+            body = body.replace("\n", self._pad)
+        self.f.write((self._sep if self.count else "[" if self._pad is None else "[\n  ") + body)
+        self.count += 1
+
+    def close(self) -> int:
+        self.f.write("[]" if not self.count else "]" if self._pad is None else "\n]")
+        return self.count
+
+
+class QbinWriter:
+    """Write rows as qbin records (see the module docstring)."""
+
+    def __init__(self, f: IO[bytes], shared: Iterable[str] = ()):
+        self.f = f
+        self.shared = frozenset(shared)
+        self.count = 0
+        # Shared string -> its encoded ref, so a repeat costs one dict lookup
+        self._refs: Dict[str, bytes] = {}
+        f.write(QBIN_MAGIC + bytes([QBIN_VERSION]))
+
+    def _shared(self, s: str, out: List[bytes]) -> None:
+        ref = self._refs.get(s)
+        if ref is None:
+            self._refs[s] = bytes([_REF]) + _U32.pack(len(self._refs))
+            data = s.encode("utf-8")
+            out.append(bytes([_SHARED]) + _U32.pack(len(data)) + data)
+        else:
+            out.append(ref)
+
+    def _value(self, v: Any, out: List[bytes]) -> None:
+        t = type(v)
+        if t is str:
+            data = v.encode("utf-8")
+            out.append(b"\x05" + _U32.pack(len(data)) + data)
+        elif v is None:
+            out.append(b"\x00")
+        elif t is bool:
+            out.append(b"\x02" if v else b"\x01")
+        elif t is int:
+            if not _I64_MIN <= v <= _I64_MAX:
+                raise ValueError(f"qbin integers are 64-bit; {v} does not fit")
+            out.append(b"\x03" + _I64.pack(v))
+        elif t is float:
+            out.append(b"\x04" + _F64.pack(v))
+        elif t is list or t is tuple:
+            out.append(b"\x06" + _U32.pack(len(v)))
+            for x in v:
+                self._value(x, out)
+        elif t is dict:
+            self._map(v, out)
+        else:
+            raise TypeError(f"Object of type {t.__name__} is not qbin serializable")
+
+    def _map(self, d: Dict[str, Any], out: List[bytes]) -> None:
+        out.append(b"\x07" + _U32.pack(len(d)))
+        shared = self.shared
+        for k, v in d.items():
+            if type(k) is not str:
+                raise TypeError(f"qbin map keys must be str, not {type(k).__name__}")
+            self._shared(k, out)
+            if type(v) is str and k in shared:
+                self._shared(v, out)
+            else:
+                self._value(v, out)
+
+    def write(self, row: Dict[str, Any]) -> None:
+        out: List[bytes] = []
+        self._map(row, out)
+        body = b"".join(out)
+        self.f.write(_U32.pack(len(body)) + body)
+        self.count += 1
+
+    def close(self) -> int:
+        self.f.write(_U32.pack(0))
+        return self.count
+
+
+def open_writer(f: IO, fmt: str, shared: Iterable[str] = ()):
+    """A JsonArrayWriter or QbinWriter for fmt on an open file (binary mode for qbin)."""
+    if fmt == "qbin":
+        return QbinWriter(f, shared)
+    if fmt in ("json", "json-compact"):
+        return JsonArrayWriter(f, compact=fmt == "json-compact")
+    raise ValueError(f"Unknown output format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+
+def write_questions(f: IO, rows: Iterable[Dict[str, Any]], fmt: str, shared: Iterable[str] = ()) -> int:
+    """Write rows (a list, iterator or ColumnarBatch) in fmt; returns the number written."""
+    if fmt == "json" and isinstance(rows, ColumnarBatch):
+        return rows.write_json(f)
+    writer = open_writer(f, fmt, shared)
+    for row in rows:
+        writer.write(row)
+    return writer.close()
+
+
+class _QbinReader:
+    __slots__ = ("table",)
+
+    def __init__(self):
+        self.table: List[str] = []
+
+    def value(self, buf: bytes, pos: int) -> Tuple[Any, int]:
+        unpack_u32 = _U32.unpack_from
+        tag = buf[pos]
+        pos += 1
+        if tag == _STR or tag == _SHARED:
+            end = pos + 4 + unpack_u32(buf, pos)[0]
+            s = buf[pos + 4:end].decode("utf-8")
+            if tag == _SHARED:
+                s = sys.intern(s)
+                self.table.append(s)
+            return s, end
+        if tag == _REF:
+            return self.table[unpack_u32(buf, pos)[0]], pos + 4
+        if tag == _MAP:
+            table = self.table
+            d = {}
+            n = unpack_u32(buf, pos)[0]
+            pos += 4
+            for _ in range(n):
+                # Keys are almost always refs, and values plain strings or refs: decode those inline
+                if buf[pos] == _REF:
+                    k = table[unpack_u32(buf, pos + 1)[0]]
+                    pos += 5
+                else:
+                    k, pos = self.value(buf, pos)
+                tag = buf[pos]
+                if tag == _STR:
+                    end = pos + 5 + unpack_u32(buf, pos + 1)[0]
+                    d[k] = buf[pos + 5:end].decode("utf-8")
+                    pos = end
+                elif tag == _REF:
+                    d[k] = table[unpack_u32(buf, pos + 1)[0]]
+                    pos += 5
+                else:
+                    d[k], pos = self.value(buf, pos)
+            return d, pos
+        if tag == _LIST:
+            n = unpack_u32(buf, pos)[0]
+            pos += 4
+            items = []
+            for _ in range(n):
+                v, pos = self.value(buf, pos)
+                items.append(v)
+            return items, pos
+        if tag == _NULL:
+            return None, pos
+        if tag == _TRUE or tag == _FALSE:
+            return tag == _TRUE, pos
+        if tag == _INT:
+            return _I64.unpack_from(buf, pos)[0], pos + 8
+        if tag == _FLOAT:
+            return _F64.unpack_from(buf, pos)[0], pos + 8
+        raise ValueError(f"Unknown qbin tag 0x{tag:02x}")
+
+
+def iter_qbin(f: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    """Rows from an open qbin file, one record at a time."""
+    header = f.read(len(QBIN_MAGIC) + 1)
+    if header[:len(QBIN_MAGIC)] != QBIN_MAGIC:
+        raise ValueError("Not a qbin file")
+    if header[-1] != QBIN_VERSION:
+        raise ValueError(f"Unsupported qbin version {header[-1]}")
+    reader = _QbinReader()
+    while True:
+        head = f.read(4)
+        if len(head) < 4:
+            raise ValueError("Truncated qbin file (no end marker)")
+        n = _U32.unpack(head)[0]
+        if not n:
+            return
+        body = f.read(n)
+        if len(body) < n:
+            raise ValueError("Truncated qbin record")
+        row, end = reader.value(body, 0)
+        if end != n:
+            raise ValueError(f"qbin record length {n} does not match its value ({end} bytes)")
+        yield row
+
+
+def is_qbin(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(QBIN_MAGIC)) == QBIN_MAGIC
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows from a qbin file, a JSON array (pretty or compact) or NDJSON."""
+    if is_qbin(path):
+        with open(path, "rb") as f:
+            yield from iter_qbin(f)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert or count question files (JSON array, NDJSON, qbin)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("convert", help="Rewrite a question file in another format")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--to", choices=FORMATS, default="json")
+    p.add_argument("--shared", default="", help="Comma-separated fields whose values qbin stores once (e.g. test,domain,skill,difficulty)")
+    p = sub.add_parser("count", help="Decode every row and print the count")
+    p.add_argument("input")
+    args = ap.parse_args()
+
+    if args.command == "count":
+        print(f"{sum(1 for _ in read_questions(args.input))} questions in {args.input}")
+        return
+    shared = [s.strip() for s in args.shared.split(",") if s.strip()]
+    tmp = f"{args.output}.{os.getpid()}.tmp"
+    try:
+        with open_output(tmp, args.to) as f:
+            count = write_questions(f, read_questions(args.input), args.to, shared)
+        os.replace(tmp, args.output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"Wrote {count} questions to {args.output} ({args.to})")
+
+
+if __name__ == "__main__":
+    main()
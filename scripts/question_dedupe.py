@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Near-duplicate question detection with MinHash signatures and LSH banding.
+
+The same question often arrives from several sources (CB PDFs, OnePrep
+dumps, partner CSVs) with small differences: re-wrapped lines, smart
+quotes, PDF extraction splitting words ("r epresented"), a changed
+choice. Each question's text is reduced to lowercase word characters,
+cut into overlapping 5-byte shingles and summarised by a MinHash
+signature. Signatures are split into bands; questions sharing any band
+bucket are candidates, and a candidate whose estimated Jaccard
+similarity reaches the threshold joins that question's cluster. Each
+question is compared only with its bucket mates, so indexing n questions
+is roughly linear instead of the n^2 / 2 pairwise comparisons.
+
+Clusters are built online: the first question seen in a cluster is its
+canonical id, and add() returns the canonical id immediately, so the
+index works on streamed output.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+NORMALIZE_RE = re.compile(r"\W+")
+# Shingle length in bytes (at most 8, so a shingle packs into one uint64). Shorter shingles
+# keep one edited word from knocking out too much of a short stem's shingle set.
+SHINGLE_BYTES = 5
+# Bucket members kept per band key; bounds the candidates per question when many
+# questions share boilerplate, at the cost of missing some matches inside very large clusters
+MAX_BUCKET = 64
+
+
+def question_text(*parts: Any) -> str:
+    """Join a stem and its choices (strings, lists of strings or choice dicts) into one text."""
+    out: List[str] = []
+    for part in parts:
+        if part is None:
+            continue
+        if isinstance(part, (list, tuple)):
+            out.extend(str(p.get("text", "")) if isinstance(p, dict) else str(p) for p in part)
+        else:
+            out.append(str(part))
+    return " ".join(out)
+
+
+class NearDuplicateIndex:
+    """Online MinHash/LSH clustering of questions by text similarity.
+
+    threshold is the estimated Jaccard similarity of shingle sets at which
+    two questions count as duplicates. num_perm hash functions are split
+    into `bands` bands of num_perm // bands rows; with the defaults a pair
+    at similarity 0.8 shares at least one bucket with probability ~0.95.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, seed: int = 1):
+        if np is None:
+            raise RuntimeError("numpy is required for near-duplicate detection. Please install via: pip install numpy")
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd multipliers, keep the high 32 bits
+        self._a = rng.integers(0, 2 ** 64 - 1, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64 - 1, size=num_perm, dtype=np.uint64, endpoint=True)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint64)
+        self.ids: List[str] = []
+        self._canonical: List[int] = []
+        self.duplicates = 0
+        self.comparisons = 0
+
+    def signature(self, text: str) -> Optional["np.ndarray"]:
+        """MinHash signature of the text's shingles, or None when it has no word characters."""
+        normalized = NORMALIZE_RE.sub("", (text or "").lower()).encode("utf-8")
+        if not normalized:
+            return None
+        data = np.frombuffer(normalized.ljust(SHINGLE_BYTES, b"\0"), dtype=np.uint8).astype(np.uint64)
+        count = len(data) - SHINGLE_BYTES + 1
+        shingles = data[:count].copy()
+        for i in range(1, SHINGLE_BYTES):
+            shingles |= data[i:i + count] << np.uint64(8 * i)
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def add(self, qid: str, text: str) -> str:
+        """Index a question and return the canonical id of its cluster (its own id if it is new)."""
+        index = len(self.ids)
+        self.ids.append(qid)
+        sig = self.signature(text)
+        if sig is None:
+            self._canonical.append(index)
+            return qid
+
+        keys = [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+        candidates = set()
+        for bucket, key in zip(self._buckets, keys):
+            candidates.update(bucket.get(key, ()))
+
+        match = None
+        best = 0.0
+        if candidates:
+            ordered = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            similarity = (self._signatures[ordered] == sig).mean(axis=1)
+            self.comparisons += len(ordered)
+            pick = int(similarity.argmax())
+            best = float(similarity[pick])
+            if best >= self.threshold:
+                match = int(ordered[pick])
+
+        if index >= len(self._signatures):
+            grown = np.empty((max(2 * len(self._signatures), index + 1), self.num_perm), dtype=np.uint64)
+            grown[:len(self._signatures)] = self._signatures
+            self._signatures = grown
+        self._signatures[index] = sig
+        if match is None:
+            self._canonical.append(index)
+        else:
+            self._canonical.append(self._canonical[match])
+            self.duplicates += 1
+        # An identical signature adds nothing to the buckets its twin already fills
+        if best < 1.0:
+            for bucket, key in zip(self._buckets, keys):
+                members = bucket.setdefault(key, [])
+                if len(members) < MAX_BUCKET:
+                    members.append(index)
+        return self.ids[self._canonical[index]]
+
+    def clusters(self) -> Dict[str, List[str]]:
+        """Canonical id -> member ids (canonical first) for every cluster with more than one question."""
+        members: Dict[int, List[str]] = {}
+        for index, canonical in enumerate(self._canonical):
+            if canonical != index:
+                members.setdefault(canonical, [self.ids[canonical]]).append(self.ids[index])
+        return {self.ids[c]: ids for c, ids in members.items()}
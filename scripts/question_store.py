@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Indexed SQLite store for extracted questions.
+
+An output target shared by pdf_extract_cb.py and parse-sat-questions.py
+(--store sqlite:<path>). Questions are upserted in batches inside one
+transaction, committed when the store is closed, so an aborted run leaves
+the store as it was. Each row keeps the question exactly as it was serialized (payload) next
+to indexed columns, so partial queries and re-run upserts do not need
+the whole JSON file, and export back to JSON streams one row at a time.
+
+Schema (SCHEMA_VERSION 1):
+  questions(id PRIMARY KEY, ord, source, test, domain, skill, difficulty,
+            canonical_id, stem, answer, payload)
+      ord keeps first-insertion order across upserts; payload is the
+      question's JSON. Indexed: test, domain, skill, difficulty, canonical_id.
+  choices(question_id, position, label, text)   PRIMARY KEY (question_id, position)
+  images(question_id, kind, position, path)     kind is 'image' or 'thumbnail'
+  meta(key PRIMARY KEY, value)                  schema_version
+
+CB questions (id, test, domain, skill, stem, choices, images, ...) and
+parse-sat-questions output (raw: id, question, options, module; prepify:
+question_id, content, module, primary_class_cd_desc, skill_desc) are both
+accepted; module fills test and the Prepify descriptions fill domain and skill.
+
+Usage:
+  python3 scripts/question_store.py export store.db out.json [--test Math] [--domain Algebra]
+  python3 scripts/question_store.py count store.db [--skill "Linear functions"]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA_VERSION = "1"
+DEFAULT_BATCH = 1000
+# Columns query() and the CLI can filter on (all indexed)
+FILTERS = ("test", "domain", "skill", "difficulty", "canonical_id")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS questions (
+    id TEXT PRIMARY KEY,
+    ord INTEGER NOT NULL,
+    source TEXT,
+    test TEXT,
+    domain TEXT,
+    skill TEXT,
+    difficulty TEXT,
+    canonical_id TEXT,
+    stem TEXT,
+    answer TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_ord ON questions (ord);
+CREATE INDEX IF NOT EXISTS questions_test ON questions (test);
+CREATE INDEX IF NOT EXISTS questions_domain ON questions (domain);
+CREATE INDEX IF NOT EXISTS questions_skill ON questions (skill);
+CREATE INDEX IF NOT EXISTS questions_difficulty ON questions (difficulty);
+CREATE INDEX IF NOT EXISTS questions_canonical_id ON questions (canonical_id);
+CREATE TABLE IF NOT EXISTS choices (
+    question_id TEXT NOT NULL REFERENCES questions (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    label TEXT,
+    text TEXT,
+    PRIMARY KEY (question_id, position)
+);
+CREATE TABLE IF NOT EXISTS images (
+    question_id TEXT NOT NULL REFERENCES questions (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (question_id, kind, position)
+);
+"""
+
+UPSERT_QUESTION = """
+INSERT INTO questions (id, ord, source, test, domain, skill, difficulty, canonical_id, stem, answer, payload)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    source = excluded.source, test = excluded.test, domain = excluded.domain, skill = excluded.skill,
+    difficulty = excluded.difficulty, canonical_id = excluded.canonical_id, stem = excluded.stem,
+    answer = excluded.answer, payload = excluded.payload
+"""
+
+
+def parse_store_spec(spec: str) -> Tuple[str, str]:
+    """Split "sqlite:path" into ("sqlite", absolute path); ValueError for other schemes."""
+    scheme, sep, path = spec.partition(":")
+    if not sep or scheme != "sqlite" or not path:
+        raise ValueError(f"Unsupported store {spec!r}; expected sqlite:<path>")
+    return scheme, os.path.abspath(path)
+
+
+def question_row(item: Dict[str, Any]) -> Tuple[tuple, List[tuple], List[tuple]]:
+    """(questions row without ord, choice rows, image rows) for a CB or parse-sat question dict."""
+    content = item.get("content") if isinstance(item.get("content"), dict) else {}
+    qid = str(item.get("id") or item.get("question_id"))
+    stem = item.get("stem", content.get("question", item.get("question")))
+    answer = item.get("answer", content.get("correct_answer", item.get("correct_answer")))
+    source = item.get("source") or ("cb" if "stem" in item else "prepify" if content else None)
+
+    choices: List[tuple] = []
+    raw_choices = item.get("choices")
+    if raw_choices is None:
+        raw_choices = content.get("options", item.get("options"))
+    if isinstance(raw_choices, list):
+        for position, choice in enumerate(raw_choices):
+            if isinstance(choice, dict):
+                choices.append((qid, position, choice.get("label"), choice.get("text")))
+            else:
+                choices.append((qid, position, "ABCDEFGH"[position] if position < 8 else None, str(choice)))
+
+    images = [(qid, "image", position, path) for position, path in enumerate(item.get("images") or [])]
+    images += [(qid, "thumbnail", position, path) for position, path in enumerate(item.get("thumbnails") or [])]
+
+    domain = item.get("domain") or item.get("primary_class_cd_desc") or None
+    skill = item.get("skill") or item.get("skill_desc") or None
+    row = (qid, source, item.get("test") or item.get("module"), domain, skill,
+           item.get("difficulty"), item.get("canonical_id"), stem, None if answer is None else str(answer),
+           json.dumps(item, ensure_ascii=False))
+    return row, choices, images
+
+
+class SQLiteQuestionStore:
+    """Batched question upserts into an indexed SQLite file.
+
+    upsert() buffers questions and writes every `batch_size` of them;
+    close() (or leaving the with block without an error) flushes the rest
+    and commits, close(commit=False) rolls the whole run back. Re-upserting
+    an id from an earlier run replaces its columns, choices and images but
+    keeps its original position in exports; the same id twice in one run
+    is a ValueError, since one question would silently replace the other.
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.upserted = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if row is None:
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+            elif row[0] != SCHEMA_VERSION:
+                raise RuntimeError(f"{path} has store schema {row[0]}, expected {SCHEMA_VERSION}")
+        self._next_ord = self.conn.execute("SELECT COALESCE(MAX(ord), -1) + 1 FROM questions").fetchone()[0]
+        self._pending: List[Dict[str, Any]] = []
+        self._seen: set = set()
+
+    def __enter__(self) -> "SQLiteQuestionStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(commit=exc_type is None)
+
+    def upsert(self, item: Dict[str, Any]) -> None:
+        qid = str(item.get("id") or item.get("question_id"))
+        if qid in self._seen:
+            raise ValueError(f"Duplicate question id {qid!r}: ids must be unique within one run")
+        self._seen.add(qid)
+        self._pending.append(item)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def upsert_many(self, items: Iterable[Dict[str, Any]]) -> None:
+        for item in items:
+            self.upsert(item)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        questions, choices, images = [], [], []
+        for item in self._pending:
+            row, item_choices, item_images = question_row(item)
+            questions.append((row[0], self._next_ord) + row[1:])
+            self._next_ord += 1
+            choices.extend(item_choices)
+            images.extend(item_images)
+        ids = [(row[0],) for row in questions]
+        # Committed by close(); an upserted id's old choices and images go before its new ones are inserted
+        self.conn.executemany(UPSERT_QUESTION, questions)
+        self.conn.executemany("DELETE FROM choices WHERE question_id = ?", ids)
+        self.conn.executemany("DELETE FROM images WHERE question_id = ?", ids)
+        self.conn.executemany("INSERT INTO choices (question_id, position, label, text) VALUES (?, ?, ?, ?)", choices)
+        self.conn.executemany("INSERT INTO images (question_id, kind, position, path) VALUES (?, ?, ?, ?)", images)
+        self.upserted += len(self._pending)
+        self._pending = []
+
+    def close(self, commit: bool = True) -> None:
+        if self.conn is None:
+            return
+        if commit:
+            self.flush()
+            self.conn.commit()
+        else:
+            self._pending = []
+            self.upserted = 0
+            self.conn.rollback()
+        self.conn.close()
+        self.conn = None
+
+    def _where(self, filters: Dict[str, Optional[str]]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for name, value in filters.items():
+            if name not in FILTERS:
+                raise ValueError(f"Cannot filter on {name!r}; choose from {', '.join(FILTERS)}")
+            if value is not None:
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, **filters: Optional[str]) -> int:
+        self.flush()
+        where, params = self._where(filters)
+        return self.conn.execute(f"SELECT COUNT(*) FROM questions{where}", params).fetchone()[0]
+
+    def query(self, **filters: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """Stored questions matching every given column value, in first-insertion order."""
+        self.flush()
+        where, params = self._where(filters)
+        for (payload,) in self.conn.execute(f"SELECT payload FROM questions{where} ORDER BY ord", params):
+            yield json.loads(payload)
+
+    def export_json(self, out_path: str, **filters: Optional[str]) -> int:
+        """Write matching questions as the JSON array the importers read, one row at a time.
+
+        The file is byte-identical to json.dump(items, ensure_ascii=False, indent=2).
+        """
+        self.flush()
+        where, params = self._where(filters)
+        count = 0
+        tmp = f"{out_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("[")
+            for (payload,) in self.conn.execute(f"SELECT payload FROM questions{where} ORDER BY ord", params):
+                f.write(",\n  " if count else "\n  ")
+                f.write(json.dumps(json.loads(payload), ensure_ascii=False, indent=2).replace("\n", "\n  "))
+                count += 1
+            f.write("\n]" if count else "]")
+        os.replace(tmp, out_path)
+        return count
+
+
+def open_store(spec: str, batch_size: int = DEFAULT_BATCH) -> SQLiteQuestionStore:
+    """Open the store named by a --store spec."""
+    _, path = parse_store_spec(spec)
+    return SQLiteQuestionStore(path, batch_size)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query or export an extracted-question SQLite store")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name in ("export", "count"):
+        p = sub.add_parser(name)
+        p.add_argument("db", help="SQLite store path")
+        if name == "export":
+            p.add_argument("out", help="JSON array output path")
+        for column in FILTERS:
+            p.add_argument(f"--{column.replace('_', '-')}", dest=column)
+    args = ap.parse_args()
+    if not os.path.exists(args.db):
+        print(f"[error] No store at {args.db}", file=sys.stderr)
+        sys.exit(1)
+    filters = {column: getattr(args, column) for column in FILTERS}
+    with SQLiteQuestionStore(args.db) as store:
+        if args.command == "count":
+            print(store.count(**filters))
+        else:
+            count = store.export_json(os.path.abspath(args.out), **filters)
+            print(f"Wrote {count} questions to {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()